@@ -0,0 +1,207 @@
+import bisect
+import csv
+import re
+import threading
+
+# Words too common in airport names to be worth a search key
+NAME_STOPWORDS = {"airport", "international", "intl", "regional", "municipal", "field", "county", "the", "and"}
+# Names that mark the airports a city's flights actually use
+MAJOR_AIRPORT_WORDS = ("international", "intl", "intercontinental", "intcntl")
+MAX_CITY_AIRPORTS = 3
+# Airport sizes: listed in large_airports.txt, named international, anything else
+LARGE, MAJOR, SMALL = 2, 1, 0
+# Prefix matches examined per lookup; plenty for ten suggestions
+MAX_CANDIDATES = 400
+
+# Suggestion ranks, best first
+EXACT_CODE, METRO, CITY, NAME = range(4)
+# Metro and airport codes are separate namespaces: DFW is both Dallas (all airports) and Dallas-Fort Worth airport
+AIRPORT, METRO_AREA = "airport", "metro"
+# Metro suggestion labels end in "<city> - all airports (<code>)"
+ALL_AIRPORTS = "all airports"
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def airport_size(name, code, large_codes):
+    if code in large_codes:
+        return LARGE
+    name = normalize(name)
+    return MAJOR if any(word in name for word in MAJOR_AIRPORT_WORDS) else SMALL
+
+
+class Airport:
+    __slots__ = ("code", "name", "city", "subdivision", "country", "size")
+
+    def __init__(self, code, name, city, subdivision, country, size=SMALL):
+        self.code = code
+        self.name = name
+        self.city = city
+        self.subdivision = subdivision
+        self.country = country
+        self.size = size
+
+    @property
+    def label(self):
+        # Suggestion text; resolve() reads the code back from the parentheses
+        place = f"{self.city} - {self.name}" if self.city else self.name
+        return f"{place} ({self.code})"
+
+    def to_dict(self):
+        return {"kind": AIRPORT, "code": self.code, "name": self.name, "city": self.city or self.name,
+                "subdivision": self.subdivision, "country": self.country,
+                "label": self.label, "airports": [self.code]}
+
+
+class Place:
+    # Where a trip starts or ends: the city name and the airports to search from it
+    __slots__ = ("city", "codes")
+
+    def __init__(self, city, codes):
+        self.city = city
+        self.codes = codes
+
+
+class AirportIndex:
+    """Airport and metropolitan-area lookups over the bundled CSV files.
+
+    Nothing is read until the first lookup. Search keys (codes, city
+    names, airport names and the words in them) live in one sorted list,
+    so a prefix lookup is a bisect plus a short scan. large_path, if
+    given, lists the busiest airports; they rank first wherever airports
+    compete for a query or a city name."""
+
+    def __init__(self, airports_path, metros_path, large_path=None):
+        self.airports_path = airports_path
+        self.metros_path = metros_path
+        self.large_path = large_path
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            large_codes = set()
+            if self.large_path:
+                with open(self.large_path, encoding="utf-8") as f:
+                    large_codes = {code for line in f if not line.startswith("#") for code in line.split()}
+
+            self._airports = {}  # code -> Airport
+            self._cities = {}  # normalized city -> {(subdivision, country): [Airport]}; namesakes stay apart
+            with open(self.airports_path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    airport = Airport(row["iata"], row["name"], row["city"], row["subdivision"], row["country"],
+                                      airport_size(row["name"], row["iata"], large_codes))
+                    self._airports[airport.code] = airport
+                    if airport.city:
+                        places = self._cities.setdefault(normalize(airport.city), {})
+                        places.setdefault((airport.subdivision, airport.country), []).append(airport)
+
+            self._metros = {}  # metro code -> (city, country, [airport codes])
+            self._metro_cities = {}  # normalized city -> metro code
+            with open(self.metros_path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    codes = row["airports"].split()
+                    self._metros[row["code"]] = (row["city"], row["country"], codes)
+                    self._metro_cities.setdefault(normalize(row["city"]), row["code"])
+
+            keys = []  # (key, rank, (kind, code))
+            for code, (city, _, _) in self._metros.items():
+                keys.append((code.lower(), METRO, (METRO_AREA, code)))
+                keys.append((normalize(city), METRO, (METRO_AREA, code)))
+            for airport in self._airports.values():
+                target = (AIRPORT, airport.code)
+                keys.append((airport.code.lower(), CITY, target))
+                keys.append((normalize(airport.city), CITY, target))
+                keys.append((normalize(airport.name), NAME, target))
+                for word in normalize(airport.name).split():
+                    if len(word) > 2 and word not in NAME_STOPWORDS:
+                        keys.append((word, NAME, target))
+            keys.sort()
+            self._keys = [key for key, _, _ in keys]
+            self._targets = [(rank, target) for _, rank, target in keys]
+            self._loaded = True
+
+    def search(self, query, limit=10):
+        """Suggestions for an autocomplete box, best first: an exact code
+        (the airport before a metropolitan area with the same code), then
+        metropolitan areas, then airports by city, then by name; bigger
+        airports first within each."""
+        query = normalize(query)
+        if not query:
+            return []
+        self._ensure_loaded()
+
+        best = {}  # (kind, code) -> rank
+        start = bisect.bisect_left(self._keys, query)
+        for position in range(start, min(start + MAX_CANDIDATES, len(self._keys))):
+            if not self._keys[position].startswith(query):
+                break
+            rank, target = self._targets[position]
+            if target[1].lower() == query:
+                rank = EXACT_CODE
+            best[target] = min(rank, best.get(target, rank))
+
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0][0] != AIRPORT, -self._size(item[0]),
+                                                        self._label(item[0])))
+        return [self._suggestion(target) for target, _ in ranked[:limit]]
+
+    def resolve(self, text):
+        """The Place for a city or airport as typed or picked from the
+        suggestions ("New York", "New York (NYC)", "ORD", "Portland, Maine"),
+        or None. A bare code is the airport when one has it, else the
+        metropolitan area; a city name can be narrowed with ", <state or
+        region>" or ", <country code>"."""
+        text = (text or "").strip()
+        if not text:
+            return None
+        self._ensure_loaded()
+
+        match = re.search(r"\(([A-Za-z]{3})\)\s*$", text)
+        code = (match.group(1) if match else text).upper()
+        if match or len(text) == 3:
+            picked_metro = bool(match) and text[:match.start()].rstrip().endswith(ALL_AIRPORTS)
+            if code in self._airports and not picked_metro:
+                return Place(self._airports[code].city or self._airports[code].name, [code])
+            if code in self._metros:
+                city, _, codes = self._metros[code]
+                return Place(city, list(codes))
+
+        city, _, qualifier = (text[:match.start()] if match else text).partition(",")
+        city, qualifier = normalize(city), normalize(qualifier)
+        metro = self._metros.get(self._metro_cities.get(city))
+        if metro and (not qualifier or qualifier == metro[1].lower()):
+            return Place(metro[0], list(metro[2]))
+        places = [airports for (subdivision, country), airports in self._cities.get(city, {}).items()
+                  if not qualifier or qualifier in (normalize(subdivision), country.lower())]
+        if not places:
+            return None
+        # Namesakes (Portland, Oregon and Portland, Maine) are different places: take the one with the biggest
+        # airports, and only its biggest ones, since small airfields share the city name with the main airport
+        airports = max(places, key=lambda airports: sorted((airport.size for airport in airports), reverse=True))
+        biggest = max(airport.size for airport in airports)
+        codes = sorted(airport.code for airport in airports if airport.size == biggest)
+        return Place(airports[0].city, codes[:MAX_CITY_AIRPORTS])
+
+    def _size(self, target):
+        kind, code = target
+        return self._airports[code].size if kind == AIRPORT else LARGE
+
+    def _label(self, target):
+        kind, code = target
+        if kind == METRO_AREA:
+            return f"{self._metros[code][0]} - {ALL_AIRPORTS} ({code})"
+        return self._airports[code].label
+
+    def _suggestion(self, target):
+        kind, code = target
+        if kind == METRO_AREA:
+            city, country, codes = self._metros[code]
+            return {"kind": METRO_AREA, "code": code, "name": f"{city} ({ALL_AIRPORTS})", "city": city,
+                    "subdivision": "", "country": country, "label": self._label(target), "airports": list(codes)}
+        return self._airports[code].to_dict()
@@ -1,26 +1,116 @@
 import os
+import csv
 import json
+import uuid
+import click
 import openai
-from flask import Flask, render_template, url_for, redirect, request, flash, make_response
+from flask import Flask, render_template, url_for, redirect, request, flash, make_response, Response, stream_with_context, jsonify, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from forms import LoginForm, SignupForm
 from models import db, User
 from flask_migrate import Migrate
-from datetime import timedelta, datetime
-from fpdf import FPDF
-from serpapi import GoogleSearch
+from datetime import date, timedelta
 from dotenv import load_dotenv
+from search_cache import SearchCache
+from http_pool import HttpPool
+from resilience import CircuitBreaker, RateLimiter
+from search_providers import create_provider, HedgedProvider, CircuitBreakerProvider, flight_search_params, hotel_search_params, project_results
+from search_records import FlightOption, HotelOption, encode_records, decode_records
+from result_pages import ResultFilters, ResultIndexes, DEFAULT_SORT
+from fare_matrix import FareMatrix, date_window
+from trip_optimizer import TripOptimizer, best_hotels
+from airports import AirportIndex
+from werkzeug.datastructures import MultiDict
+from prefetch import SearchPrefetcher
+from itinerary_stream import ContentStreamParser, DayProgress, sse_event
+from pdf_cache import PdfCache, trip_fingerprint
+from itinerary_pdf import ItineraryRenderer
+from jobs import JobQueue, DONE, FAILED
+from llm import create_generator, CompactGenerator, MeteredGenerator, TokenLedger
+from compact_prompt import system_prompt
+from day_planner import DayPlanner, DayPlanError, entry_days, trip_days
+from day_plan_cache import DayPlanCache
+from trip_drafts import TripDraftStore
+from itinerary_store import ItineraryStore, itinerary_etag
+from batch import BatchRunner, read_trip_specs, pdf_filename
+import instrumentation
+import profiling
+import static_assets
+from static_assets import StaticAssets, ResponseCompressor
+from instrumentation import timer, timed
 
 load_dotenv()
 serpAPI_key = os.getenv("SERP_API_KEY")
 openai.api_key = os.getenv("OPENAI_API_KEY")
+openai.api_base = os.getenv("OPENAI_API_BASE", openai.api_base)  # e.g. benchmarks/mock_upstream.py
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/users.db'  # Adjust to use the instance folder's db
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", 'sqlite:///instance/users.db')  # Adjust to use the instance folder's db
 app.config['SECRET_KEY'] = os.urandom(24)  # Needed for sessions
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
+app.config['SEARCH_PROVIDER'] = os.getenv("SEARCH_PROVIDER", "live")  # "live", "record", "replay" or "synthetic"
+app.config['SEARCH_FIXTURES_DIR'] = os.getenv("SEARCH_FIXTURES_DIR", os.path.join(app.instance_path, "search_fixtures"))
+app.config['REPLAY_LATENCY'] = float(os.getenv("REPLAY_LATENCY", 0))  # Seconds added to each replayed search
+app.config['REPLAY_JITTER'] = float(os.getenv("REPLAY_JITTER", 0))  # Extra random delay, up to this many seconds
+app.config['SERPAPI_URL'] = os.getenv("SERPAPI_URL", "https://serpapi.com")  # Point at a mock server for tests
+app.config['HTTP_POOL_SIZE'] = int(os.getenv("HTTP_POOL_SIZE", 10))  # Keep-alive connections kept per upstream host
+app.config['HTTP_CONNECT_TIMEOUT'] = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))  # Seconds
+app.config['SEARCH_READ_TIMEOUT'] = float(os.getenv("SEARCH_READ_TIMEOUT", 30))  # Seconds to wait for SerpAPI
+app.config['LLM_READ_TIMEOUT'] = float(os.getenv("LLM_READ_TIMEOUT", 120))  # Seconds to wait for OpenAI (between chunks when streaming)
+app.config['SEARCH_CACHE_SIZE'] = int(os.getenv("SEARCH_CACHE_SIZE", 256))  # Max cached SerpAPI responses
+app.config['SEARCH_CACHE_DB'] = os.getenv("SEARCH_CACHE_DB")  # Optional SQLite file for a persistent cache tier
+app.config['FLIGHT_CACHE_TTL'] = int(os.getenv("FLIGHT_CACHE_TTL", 10 * 60))  # Seconds
+app.config['HOTEL_CACHE_TTL'] = int(os.getenv("HOTEL_CACHE_TTL", 6 * 60 * 60))  # Seconds
+app.config['SEARCH_STALE_TTL'] = int(os.getenv("SEARCH_STALE_TTL", 24 * 60 * 60))  # Seconds an expired search may still be shown while it refreshes
+app.config['SEARCH_HEDGE_PERCENTILE'] = float(os.getenv("SEARCH_HEDGE_PERCENTILE", 95))  # Duplicate searches slower than this percentile; 0 turns it off
+app.config['SEARCH_HEDGE_MIN_SAMPLES'] = int(os.getenv("SEARCH_HEDGE_MIN_SAMPLES", 20))  # Searches timed before hedging starts
+app.config['SEARCH_BREAKER_FAILURES'] = int(os.getenv("SEARCH_BREAKER_FAILURES", 5))  # Consecutive failed searches that stop calls to SerpAPI
+app.config['SEARCH_BREAKER_RESET'] = float(os.getenv("SEARCH_BREAKER_RESET", 30))  # Seconds before a trial search is let through again
+app.config['PREFETCH_ENABLED'] = os.getenv("PREFETCH_ENABLED", "1") == "1"  # Start searches on the confirmation page
+app.config['PREFETCH_WORKERS'] = int(os.getenv("PREFETCH_WORKERS", 6))
+app.config['ITINERARY_STREAMING'] = os.getenv("ITINERARY_STREAMING", "1") == "1"  # Show progress while the itinerary generates
+app.config['PDF_CACHE_DIR'] = os.getenv("PDF_CACHE_DIR", os.path.join(app.instance_path, "pdf_cache"))
+app.config['PDF_CACHE_MAX_BYTES'] = int(os.getenv("PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+app.config['PDF_FONT_DIR'] = os.getenv("PDF_FONT_DIR", os.path.join(app.root_path, "data", "fonts"))  # Unicode TTFs for itinerary PDFs
+app.config['ADMIN_EMAILS'] = {email.strip() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+app.config['PROFILING_ENABLED'] = os.getenv("PROFILING_ENABLED", "1") == "1"  # Admins can add ?profile=1 to a request
+app.config['PROFILE_DIR'] = os.getenv("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+app.config['PROFILE_MAX_FILES'] = int(os.getenv("PROFILE_MAX_FILES", 50))  # Oldest profiles are deleted past this
+app.config['ITINERARY_LLM_BACKEND'] = os.getenv("ITINERARY_LLM_BACKEND", "openai")  # "stub" for offline tests and load testing
+app.config['STUB_LLM_DELAY'] = float(os.getenv("STUB_LLM_DELAY", 0))  # Seconds the stub waits before answering
+app.config['STUB_LLM_ACTIVITIES_PER_DAY'] = int(os.getenv("STUB_LLM_ACTIVITIES_PER_DAY", 5))
+app.config['STUB_LLM_DESCRIPTION_WORDS'] = int(os.getenv("STUB_LLM_DESCRIPTION_WORDS", 25))
+app.config['ITINERARY_PROMPT_MODE'] = os.getenv("ITINERARY_PROMPT_MODE", "full")  # "compact": static system prefix, short JSON keys, capped descriptions
+app.config['COMPACT_DESCRIPTION_WORDS'] = int(os.getenv("COMPACT_DESCRIPTION_WORDS", 15))  # Longest activity description in compact mode
+app.config['ITINERARY_JOB_WORKERS'] = int(os.getenv("ITINERARY_JOB_WORKERS", 4))
+app.config['ITINERARY_LLM_CONCURRENCY'] = int(os.getenv("ITINERARY_LLM_CONCURRENCY", 2))  # Max itineraries generating at once
+app.config['ITINERARY_PER_DAY_MIN_DAYS'] = int(os.getenv("ITINERARY_PER_DAY_MIN_DAYS", 5))  # Trips this long are generated a day at a time; 0 turns it off
+app.config['ITINERARY_DAY_CONCURRENCY'] = int(os.getenv("ITINERARY_DAY_CONCURRENCY", 4))  # Concurrent per-day calls for one itinerary
+app.config['ITINERARY_DAY_ATTEMPTS'] = int(os.getenv("ITINERARY_DAY_ATTEMPTS", 3))  # Tries per day before the itinerary fails
+app.config['DAY_PLAN_CACHE_SIZE'] = int(os.getenv("DAY_PLAN_CACHE_SIZE", 1024))  # Destination/keywords/budget/party combinations whose days are reused; 0 turns it off
+app.config['DAY_PLAN_CACHE_DAYS'] = int(os.getenv("DAY_PLAN_CACHE_DAYS", 14))  # Days kept per combination
+app.config['STUB_LLM_DAY_DELAY'] = float(os.getenv("STUB_LLM_DAY_DELAY", 0))  # Extra stub seconds per day written
+app.config['AIRPORT_DATA_DIR'] = os.getenv("AIRPORT_DATA_DIR", os.path.join(app.root_path, "data"))
+app.config['MAX_AIRPORT_PAIRS'] = int(os.getenv("MAX_AIRPORT_PAIRS", 9))  # Flight searches per leg for multi-airport cities
+app.config['FARE_MATRIX_DAYS'] = int(os.getenv("FARE_MATRIX_DAYS", 3))  # Flexible dates: days either side of the trip dates
+app.config['FARE_MATRIX_MAX_PAIRS'] = int(os.getenv("FARE_MATRIX_MAX_PAIRS", 1))  # Airport pairs searched per matrix date
+app.config['FARE_MATRIX_MAX_SEARCHES'] = int(os.getenv("FARE_MATRIX_MAX_SEARCHES", 30))  # Searches one matrix may start; the window narrows to fit
+app.config['PACKAGE_COUNT'] = int(os.getenv("PACKAGE_COUNT", 5))  # Flight and hotel packages suggested for a trip
+app.config['RESULTS_PAGE_SIZE'] = int(os.getenv("RESULTS_PAGE_SIZE", 10))  # Flights or hotels per page
+app.config['TRIP_DRAFT_CACHE_SIZE'] = int(os.getenv("TRIP_DRAFT_CACHE_SIZE", 512))  # Recently used drafts kept in memory
+app.config['HISTORY_PAGE_SIZE'] = int(os.getenv("HISTORY_PAGE_SIZE", 10))  # Saved itineraries per page of /trips
+app.config['BATCH_CONCURRENCY'] = int(os.getenv("BATCH_CONCURRENCY", 4))  # Trips of a batch planned at once
+app.config['BATCH_MAX_TRIPS'] = int(os.getenv("BATCH_MAX_TRIPS", 200))  # Largest batch /api/batch accepts
+app.config['BATCH_SEARCHES_PER_MINUTE'] = float(os.getenv("BATCH_SEARCHES_PER_MINUTE", 120))  # SerpAPI calls batches may make; 0 for no limit
+app.config['BATCH_ITINERARIES_PER_MINUTE'] = float(os.getenv("BATCH_ITINERARIES_PER_MINUTE", 20))  # Itineraries batches may send to the LLM; 0 for no limit
+app.config['BATCH_OUTPUT_DIR'] = os.getenv("BATCH_OUTPUT_DIR", os.path.join(app.instance_path, "batches"))  # One folder of PDFs per /api/batch call
+app.config['STATIC_FINGERPRINT'] = os.getenv("STATIC_FINGERPRINT", "1") == "1"  # Content-hashed static URLs, cached by browsers for a year
+app.config['STATIC_BUILD_DIR'] = os.getenv("STATIC_BUILD_DIR", os.path.join(app.instance_path, "static_build"))  # Precompressed copies of static files
+app.config['COMPRESS_RESPONSES'] = os.getenv("COMPRESS_RESPONSES", "1") == "1"  # gzip (or brotli) pages and JSON for clients that accept it
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv("COMPRESS_MIN_SIZE", 1024))  # Smaller responses are sent as is
+app.config['COMPRESS_LEVEL'] = int(os.getenv("COMPRESS_LEVEL", 6))  # gzip level for responses; static files always get 9
 db.init_app(app)
 
 login_manager = LoginManager()
@@ -29,16 +119,182 @@ login_manager.login_view = 'sign_in'  # Redirect users who are not logged in
 
 migrate = Migrate(app, db)
 
-
-# Airport Codes Dictionary
-airport_codes = {
-    "New York": "LGA",
-    "Austin": "AUS",
-    "San Francisco": "SFO",
-    "Dallas": "DFW",
-    "Chicago": "ORD",
-    "Houston": "IAH"
-}
+# Shared cache for SerpAPI results, holding the projected flight and hotel records
+search_cache = SearchCache(
+    max_entries=app.config['SEARCH_CACHE_SIZE'],
+    ttls={
+        "google_flights": app.config['FLIGHT_CACHE_TTL'],
+        "google_hotels": app.config['HOTEL_CACHE_TTL'],
+    },
+    db_path=app.config['SEARCH_CACHE_DB'],
+    encode=encode_records,
+    decode=decode_records,
+    stale_ttl=app.config['SEARCH_STALE_TTL'],
+)
+
+
+# Airports and metropolitan areas from the bundled dataset, loaded on first lookup
+airports = AirportIndex(os.path.join(app.config['AIRPORT_DATA_DIR'], "airports.csv"),
+                        os.path.join(app.config['AIRPORT_DATA_DIR'], "metro_areas.csv"),
+                        os.path.join(app.config['AIRPORT_DATA_DIR'], "large_airports.txt"))
+
+# Rendered itineraries, keyed by a hash of the trip parameters
+pdf_cache = PdfCache(app.config['PDF_CACHE_DIR'], max_bytes=app.config['PDF_CACHE_MAX_BYTES'])
+# Lays out itinerary PDFs; font metrics and subsets are shared across requests
+itinerary_renderer = ItineraryRenderer(app.config['PDF_FONT_DIR'])
+
+# One keep-alive connection pool for every outbound call; openai uses it through requestssession
+http_pool = HttpPool(pool_size=app.config['HTTP_POOL_SIZE'],
+                     connect_timeout=app.config['HTTP_CONNECT_TIMEOUT'],
+                     read_timeout=app.config['SEARCH_READ_TIMEOUT'])
+openai.requestssession = http_pool.session
+
+def create_itinerary_generator():
+    # LLM backend selected through config; the stub needs no network access
+    name = app.config['ITINERARY_LLM_BACKEND']
+    if name == "openai":
+        return create_generator(name, timeout=(app.config['HTTP_CONNECT_TIMEOUT'], app.config['LLM_READ_TIMEOUT']))
+    return create_generator(name,
+                            delay=app.config['STUB_LLM_DELAY'],
+                            activities_per_day=app.config['STUB_LLM_ACTIVITIES_PER_DAY'],
+                            description_words=app.config['STUB_LLM_DESCRIPTION_WORDS'],
+                            day_delay=app.config['STUB_LLM_DAY_DELAY'])
+
+# Itinerary generation runs on a background pool with a cap on concurrent LLM calls.
+# Every LLM request's tokens and time are recorded; compact answers are expanded to the full shape.
+token_ledger = TokenLedger()
+itinerary_generator = CompactGenerator(MeteredGenerator(create_itinerary_generator(), token_ledger),
+                                       description_words=app.config['COMPACT_DESCRIPTION_WORDS'])
+job_queue = JobQueue(max_workers=app.config['ITINERARY_JOB_WORKERS'],
+                     llm_concurrency=app.config['ITINERARY_LLM_CONCURRENCY'])
+
+# Where flight and hotel data comes from: SerpAPI, SerpAPI with recording, or recorded fixtures.
+# Slow searches are hedged with a duplicate, and a failing upstream is skipped until it recovers.
+hedged_search_provider = HedgedProvider(create_provider(app.config['SEARCH_PROVIDER'],
+                                                        api_key=serpAPI_key,
+                                                        directory=app.config['SEARCH_FIXTURES_DIR'],
+                                                        latency=app.config['REPLAY_LATENCY'],
+                                                        jitter=app.config['REPLAY_JITTER'],
+                                                        http=http_pool,
+                                                        base_url=app.config['SERPAPI_URL']),
+                                        percentile=app.config['SEARCH_HEDGE_PERCENTILE'],
+                                        min_samples=app.config['SEARCH_HEDGE_MIN_SAMPLES'])
+search_breaker = CircuitBreaker(failure_threshold=app.config['SEARCH_BREAKER_FAILURES'],
+                                reset_timeout=app.config['SEARCH_BREAKER_RESET'])
+search_provider = CircuitBreakerProvider(hedged_search_provider, search_breaker)
+
+def search_records(params):
+    return project_results(params, search_provider.search(params))
+
+def refresh_search(params):
+    # Background update of an expired result that is being served stale meanwhile
+    try:
+        search_cache.set(params, search_records(params))
+    except Exception as e:
+        print(f"Error refreshing SerpAPI result: {e}")
+
+# Refreshes are deduplicated like prefetches, so a popular stale search is only fetched once
+refresher = SearchPrefetcher(refresh_search, max_workers=2)
+
+def fetch_search(params):
+    # Serve repeated searches from the cache instead of calling SerpAPI again; expired ones are served stale and refreshed
+    return search_cache.get_or_fetch(params, timed("serpapi", search_records),
+                                     refresh=lambda params: refresher.prefetch([params]))
+
+# Background searches started from the confirmation page
+prefetcher = SearchPrefetcher(fetch_search, max_workers=app.config['PREFETCH_WORKERS'])
+
+def run_search(params):
+    # Join a prefetch that is still running for these params, otherwise search now
+    return prefetcher.search(params)
+
+def search_many(params_list):
+    # Run searches in parallel on the prefetch pool, joining any already in flight; None for a failed search
+    results = []
+    for future in prefetcher.prefetch(params_list):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            print(f"Error during SerpAPI call: {e}")
+            results.append(None)
+    return results
+
+# Batches search on their own pool, so a travel-desk batch never queues ahead of the wizard's prefetches,
+# and their SerpAPI calls and itineraries are held to per-upstream rates
+batch_search_limiter = RateLimiter(app.config['BATCH_SEARCHES_PER_MINUTE'] / 60)
+batch_llm_limiter = RateLimiter(app.config['BATCH_ITINERARIES_PER_MINUTE'] / 60)
+
+def batch_search_records(params):
+    batch_search_limiter.acquire()
+    return search_records(params)
+
+def batch_fetch_search(params):
+    # fetch_search for batches; only calls that miss the cache wait for the rate limit
+    return search_cache.get_or_fetch(params, timed("serpapi", batch_search_records),
+                                     refresh=lambda params: refresher.prefetch([params]))
+
+batch_searcher = SearchPrefetcher(batch_fetch_search, max_workers=app.config['PREFETCH_WORKERS'])
+
+# Sorted orders over cached results, so paging never searches again
+result_indexes = ResultIndexes()
+
+def trip_airports(trip, side):
+    # Airport codes for the trip's "departure" or "arrival" city; drafts saved before codes were stored resolve the name
+    codes = trip.get(f'{side}_codes')
+    if codes:
+        return codes
+    place = airports.resolve(trip[f'{side}_city'])
+    return place.codes if place else []
+
+def trip_search_params(trip, leg):
+    """SerpAPI params for one of the trip's searches: "outbound", "return"
+    or "hotels". Flights between multi-airport cities fan out to one search
+    per airport pair. Empty when the cities have no known airports."""
+    if leg == "hotels":
+        return [hotel_search_params(trip['arrival_city'], trip['start_date'], trip['end_date'],
+                                    trip['num_adults'], trip['hotel_stars'] or 2)]
+    departure_codes = trip_airports(trip, "departure")
+    arrival_codes = trip_airports(trip, "arrival")
+    if leg == "outbound":
+        pairs, day = [(a, b) for a in departure_codes for b in arrival_codes], trip['start_date']
+    else:
+        pairs, day = [(b, a) for a in departure_codes for b in arrival_codes], trip['end_date']
+    return [flight_search_params(origin, destination, day, trip['num_adults'], trip['num_children'])
+            for origin, destination in pairs[:app.config['MAX_AIRPORT_PAIRS']]]
+
+def leg_records(params_list):
+    # Every record of a leg's searches (one per airport pair), from the cache when possible; failed searches add none
+    record_lists = [run_search(params_list[0])] if len(params_list) == 1 else search_many(params_list)
+    return [record for records in record_lists if records for record in records]
+
+def result_page(params_list, args):
+    # One page of the merged results of params_list, sorted and filtered as the args ask.
+    # Raises ValueError for an unknown sort or a bad cursor.
+    record_lists = [run_search(params_list[0])] if len(params_list) == 1 else search_many(params_list)
+    if all(records is None for records in record_lists):
+        raise LookupError("Every search failed")
+    sort = args.get('sort') or DEFAULT_SORT
+    filters = ResultFilters.from_args(args)
+    results, next_cursor, shown = result_indexes.get(params_list, record_lists).page(
+        sort, filters, args.get('cursor'), limit=app.config['RESULTS_PAGE_SIZE'])
+    # Expired results shown while they refresh, or because SerpAPI is failing
+    stale = any(records is not None and not search_cache.is_fresh(params)
+                for params, records in zip(params_list, record_lists))
+    return {"results": results, "next_cursor": next_cursor, "shown": shown,
+            "sort": sort, "filters": filters.to_args(), "stale": stale}
+
+def search_page(params_list, args, error_message):
+    # result_page for the wizard pages: bad sort or paging args fall back to the first page
+    try:
+        try:
+            return result_page(params_list, args)
+        except ValueError:
+            flash("Invalid sort or page. Showing the first page instead.", "warning")
+            return result_page(params_list, MultiDict())
+    except Exception as e:
+        print(f"Error during SerpAPI call: {e}")
+        flash(error_message, "warning")
+        return {"results": [], "next_cursor": None, "shown": 0, "sort": DEFAULT_SORT, "filters": {}, "stale": False}
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -47,6 +303,100 @@ def load_user(user_id):
 # Creating database tables (if not already existing)
 with app.app_context():
     db.create_all()
+    instrumentation.instrument_sqlalchemy(db.engine)
+
+# Wizard state lives server-side; pages only pass the trip_id
+trip_drafts = TripDraftStore(cache_size=app.config['TRIP_DRAFT_CACHE_SIZE'])
+
+def current_trip():
+    # The signed-in user's draft named by the trip_id argument, or None
+    return trip_drafts.get(request.values.get('trip_id'), current_user.id)
+
+# Itineraries generated while signed in, for the trip history page and later edits
+itinerary_store = ItineraryStore()
+
+# Per-request timings as Server-Timing headers, and aggregate histograms on /metrics
+render_template = timed("render", render_template, kind="stage")
+instrumentation.init_app(app)
+profiling.init_app(app)
+
+# Fingerprinted, precompressed static files and compressed pages; registered last so compression shows in Server-Timing
+asset_files = StaticAssets(app.static_folder, app.config['STATIC_BUILD_DIR'], min_size=app.config['COMPRESS_MIN_SIZE'])
+response_compressor = ResponseCompressor(min_size=app.config['COMPRESS_MIN_SIZE'], level=app.config['COMPRESS_LEVEL'])
+if app.config['STATIC_FINGERPRINT']:
+    asset_files.build()
+static_assets.init_app(app, asset_files, response_compressor)
+instrumentation.metrics.register_gauge(
+    "search_cache_lookups_total", "Search cache lookups by outcome",
+    lambda: [({"outcome": outcome}, search_cache.stats()[outcome])
+             for outcome in ("hits", "persistent_hits", "stale_hits", "misses")],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "search_hedges_total", "Duplicate searches sent for slow SerpAPI calls, and how many answered first",
+    lambda: [({"outcome": "sent"}, hedged_search_provider.stats()["hedged"]),
+             ({"outcome": "won"}, hedged_search_provider.stats()["hedge_wins"])],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "search_circuit_open", "1 while failing SerpAPI calls are being skipped",
+    lambda: 0 if search_breaker.stats()["state"] == "closed" else 1)
+instrumentation.metrics.register_gauge(
+    "search_circuit_rejected_total", "Searches failed fast by the open circuit breaker",
+    lambda: search_breaker.stats()["rejected"],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "day_plan_cache_lookups_total", "Itineraries that reused cached days (hit) or were planned without them (miss)",
+    lambda: [({"outcome": "hit"}, day_plan_cache.stats()["hits"]), ({"outcome": "miss"}, day_plan_cache.stats()["misses"])],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "itinerary_days_total", "Itinerary days taken from the day plan cache or generated by the LLM",
+    lambda: [({"source": "cache"}, day_plan_cache.stats()["days_reused"]),
+             ({"source": "llm"}, day_plan_cache.stats()["days_generated"])],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "day_plan_cache_llm_calls_saved_total", "LLM calls not made thanks to cached days, against planning without them",
+    lambda: day_plan_cache.stats()["llm_calls_saved"],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "llm_requests_total", "LLM requests by prompt mode and itinerary part",
+    lambda: [({"mode": mode, "part": part}, totals["requests"]) for (mode, part), totals in token_ledger.totals().items()],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "llm_tokens_total", "LLM prompt and completion tokens by prompt mode and itinerary part (estimated when not reported)",
+    lambda: [({"mode": mode, "part": part, "kind": kind}, totals[f"{kind}_tokens"])
+             for (mode, part), totals in token_ledger.totals().items() for kind in ("prompt", "completion")],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "llm_generation_seconds_total", "Time spent generating, by prompt mode and itinerary part",
+    lambda: [({"mode": mode, "part": part}, round(totals["seconds"], 3)) for (mode, part), totals in token_ledger.totals().items()],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "batch_rate_limit_wait_seconds_total", "Seconds batch trips waited on the per-upstream rate limits",
+    lambda: [({"upstream": "serpapi"}, batch_search_limiter.stats()["waited_seconds"]),
+             ({"upstream": "llm"}, batch_llm_limiter.stats()["waited_seconds"])],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "http_pool_requests_total", "Outbound HTTP requests per upstream host",
+    lambda: [({"host": host}, stats["requests"]) for host, stats in http_pool.stats().items()],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "http_pool_connections_opened_total", "Outbound connections opened per upstream host; the other requests reused one",
+    lambda: [({"host": host}, stats["connections_opened"]) for host, stats in http_pool.stats().items()],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "http_pool_in_flight", "Outbound HTTP requests waiting for a response, per upstream host",
+    lambda: [({"host": host}, stats["in_flight"]) for host, stats in http_pool.stats().items()])
+instrumentation.metrics.register_gauge(
+    "http_pool_peak_in_flight", "Most concurrent outbound requests per upstream host; above HTTP_POOL_SIZE the pool is too small",
+    lambda: [({"host": host}, stats["peak_in_flight"]) for host, stats in http_pool.stats().items()])
+instrumentation.metrics.register_gauge(
+    "http_pool_timeouts_total", "Outbound HTTP requests that hit the connect or read timeout",
+    lambda: [({"host": host}, stats["timeouts"]) for host, stats in http_pool.stats().items()],
+    metric_type="counter")
+instrumentation.metrics.register_gauge(
+    "compressed_response_bytes_total", "Bytes of the responses compressed on the fly, before and after compression",
+    lambda: [({"stage": "before"}, response_compressor.stats()["bytes_in"]),
+             ({"stage": "after"}, response_compressor.stats()["bytes_out"])],
+    metric_type="counter")
 
 # Flask Routes
 @app.route('/')
@@ -109,7 +459,10 @@ def trip_input():
                                 flight_needed=flight_needed, car_needed=car_needed,
                                 hotel_stars=hotel_stars, budget=budget, keywords=keywords))
 
-    return render_template('trip-input.html')
+    # Editing an existing trip starts from its saved details
+    trip_id = request.args.get('trip_id')
+    trip = trip_drafts.get(trip_id, current_user.id) or {}
+    return render_template('trip-input.html', trip=trip, trip_id=trip_id if trip else None)
 
 
 @app.route('/confirmation')
@@ -142,13 +495,52 @@ def confirmation():
     if not start_date or not end_date or not departure_city or not arrival_city:
         flash("Missing required travel details. Please start over.", "warning")
         return redirect(url_for('trip_input'))
+    try:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except ValueError:
+        start = end = None
+    if start is None or end < start:
+        flash("Invalid travel dates.", "warning")
+        return redirect(url_for('trip_input', trip_id=request.args.get('trip_id')))
+    start_date, end_date = start.isoformat(), end.isoformat()
+
+    # Match the cities to airports; car trips can go anywhere, flights need a known airport
+    departure_place = airports.resolve(departure_city)
+    arrival_place = airports.resolve(arrival_city)
+    if flight_needed == "Yes" and (departure_place is None or arrival_place is None):
+        flash("Unknown city or airport. Please pick one from the suggestions.", "warning")
+        return redirect(url_for('trip_input', trip_id=request.args.get('trip_id')))
+    if departure_place:
+        departure_city = departure_place.city
+    if arrival_place:
+        arrival_city = arrival_place.city
+
+    # Save the details as a draft, or update the draft being edited
+    fields = dict(start_date=start_date, end_date=end_date,
+                  departure_city=departure_city, arrival_city=arrival_city,
+                  departure_codes=departure_place.codes if departure_place else [],
+                  arrival_codes=arrival_place.codes if arrival_place else [],
+                  num_adults=num_adults, num_children=num_children,
+                  flight_needed=flight_needed, car_needed=car_needed,
+                  hotel_stars=hotel_stars, budget=budget, keywords=keywords,
+                  departing_flight={}, returning_flight={}, hotel={})  # Edited details invalidate earlier picks
+    trip_id = request.args.get('trip_id')
+    if not trip_drafts.get(trip_id, current_user.id):
+        trip_id = trip_drafts.create(current_user.id, **fields)
+    else:
+        trip_drafts.update(trip_id, **fields)
+
+    # Start the outbound, return and hotel searches now so the next pages don't wait on SerpAPI
+    if app.config['PREFETCH_ENABLED']:
+        legs = ["hotels", "outbound", "return"] if flight_needed == "Yes" else ["hotels"]
+        prefetcher.prefetch([params for leg in legs for params in trip_search_params(fields, leg)])
 
     return render_template('confirmation.html', start_date=start_date, end_date=end_date,
                            departure_city=departure_city, arrival_city=arrival_city,
                            num_adults=num_adults, num_children=num_children,
                            flight_needed=flight_needed, car_needed=car_needed,
                            hotel_stars=hotel_stars, budget=budget, keywords=keywords,
-                           next_route=next_route)
+                           next_route=next_route, trip_id=trip_id)
 
 
 
@@ -156,351 +548,304 @@ def confirmation():
 @app.route('/departure', methods=['GET', 'POST'])
 @login_required
 def departure():
-    # Retrieve query parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date') or "2025-05-10"  # Default if not provided
-    departure_city = request.args.get('departure_city')
-    arrival_city = request.args.get('arrival_city')
-    num_adults = request.args.get('num_adults') or 1  # Default to 1 adult if missing
-    num_children = request.args.get('num_children') or 0  # Default to 0 children if missing
-    hotel_stars = request.args.get('hotel_stars') or 2
-    budget = request.args.get('budget', "default")
-    keywords = request.args.get('keywords', "").strip()
-    flight_needed = request.args.get('flight_needed', "Yes")
-    car_needed = request.args.get('car_needed', "No")
-
-    # Map to airport codes
-    departure_code = airport_codes.get(departure_city)
-    arrival_code = airport_codes.get(arrival_city)
-
-    if not departure_code or not arrival_code:
-        flash("Invalid city selection. Please try again.", "warning")
+    trip = current_trip()
+    if trip is None:
+        flash("Missing required travel details. Please start over.", "warning")
         return redirect(url_for('trip_input'))
 
     # SerpAPI query parameters
-    params = {
-        "departure_id": departure_code,
-        "arrival_id": arrival_code,
-        "engine": "google_flights",
-        "gl": "us",
-        "hl": "en",
-        "currency": "USD",
-        "type": "2",  # One-way flight
-        "outbound_date": start_date,
-        "adults": num_adults,
-        "children": num_children,
-        "stops": 1,  # Limit to direct flights
-        "api_key": serpAPI_key
-    }
-
-    # Call SerpAPI
-    try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        flights = results.get("best_flights", [])
-       # print(f"API Response for Departure Flights: {results}")  # Debugging
-    except Exception as e:
-        print(f"Error during SerpAPI call: {e}")
-        flash("Failed to fetch departure flights. Please try again later.", "warning")
-        flights = []
+    params = trip_search_params(trip, "outbound")
+    if not params:
+        flash("Invalid city selection. Please try again.", "warning")
+        return redirect(url_for('trip_input', trip_id=request.args.get('trip_id')))
 
-    # Format flights for display
-    outbound_flights = [
-        {
-            "price": flight['price'],
-            "flight_number": flight['flights'][0]['flight_number'],
-            "departure_airport": flight['flights'][0]['departure_airport']['name'],
-            "departure_time": flight['flights'][0]['departure_airport']['time'],
-            "arrival_airport": flight['flights'][0]['arrival_airport']['name'],
-            "arrival_time": flight['flights'][0]['arrival_airport']['time']
-        }
-        for flight in flights
-    ]
+    page = search_page(params, request.args, "Failed to fetch departure flights. Please try again later.")
 
     # Render the departure page
-    return render_template(
-        'departure.html',
-        flights=outbound_flights,
-        start_date=start_date,
-        end_date=end_date,
-        departure_city=departure_city,
-        arrival_city=arrival_city,
-        num_adults=num_adults,
-        num_children=num_children,
-        hotel_stars=hotel_stars,
-        budget=budget,
-        keywords=keywords,
-        flight_needed=flight_needed,
-        car_needed=car_needed
-    )
+    return render_template('departure.html', leg="outbound", trip_id=request.args.get('trip_id'), **page)
 
 
 
 @app.route('/arrival', methods=['GET', 'POST'])
 @login_required
 def arrival():
-    # Retrieve query parameters
-    end_date = request.args.get('end_date')
-    start_date = request.args.get('start_date')  # Pass through to the next step
-    departure_city = request.args.get('arrival_city')  # Reverse mapping
-    arrival_city = request.args.get('departure_city')  # Reverse mapping
-    num_adults = request.args.get('num_adults') or 1  # Default to 1 adult if not provided
-    num_children = request.args.get('num_children') or 0  # Default to 0 children if not provided
-    hotel_stars = request.args.get('hotel_stars') or 2
-    budget = request.args.get('budget', "default")
-    flight_needed = request.args.get('flight_needed', "Yes")
-    car_needed = request.args.get('car_needed', "No")
-    keywords = request.args.get('keywords', "").strip()
+    trip = current_trip()
+    if trip is None:
+        flash("Missing required travel details. Please start over.", "warning")
+        return redirect(url_for('trip_input'))
 
-    # Map to airport codes
-    departure_code = airport_codes.get(departure_city)
-    arrival_code = airport_codes.get(arrival_city)
+    # Save the outbound flight picked on the previous page
+    if 'departing_flight' in request.args:
+        departing_flight = parse_flight_selection(request.args.get('departing_flight'), "departing")
+        trip = trip_drafts.update(request.args.get('trip_id'), departing_flight=departing_flight)
 
-    if not departure_code or not arrival_code:
+    # SerpAPI query parameters, reversed for the return leg
+    params = trip_search_params(trip, "return")
+    if not params:
         flash("Invalid city selection for return flight.", "warning")
-        return redirect(url_for('departure'))  # Redirect to departure if cities are invalid
-
-    # SerpAPI query parameters
-    params = {
-        "departure_id": departure_code,
-        "arrival_id": arrival_code,
-        "engine": "google_flights",
-        "gl": "us",
-        "hl": "en",
-        "currency": "USD",
-        "type": "2",  # One-way flight
-        "outbound_date": end_date,
-        "adults": num_adults,
-        "children": num_children,
-        "stops": 1,  # Only direct flights
-        "api_key": serpAPI_key
-    }
-
-    #print(f"Arrival Params: {params}")  # Debugging
-    try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        #print(f"Arrival API Response: {results}")  # Debugging
-        flights = results.get("best_flights", [])
-    except Exception as e:
-        print(f"Error during SerpAPI call: {e}")
-        flash("Failed to fetch return flights. Please try again.", "warning")
-        flights = []
+        return redirect(url_for('departure', trip_id=request.args.get('trip_id')))  # Redirect to departure if cities are invalid
 
-    # Format flights for display
-    inbound_flights = [
-        {
-            "price": flight['price'],
-            "flight_number": flight['flights'][0]['flight_number'],
-            "departure_airport": flight['flights'][0]['departure_airport']['name'],
-            "departure_time": flight['flights'][0]['departure_airport']['time'],
-            "arrival_airport": flight['flights'][0]['arrival_airport']['name'],
-            "arrival_time": flight['flights'][0]['arrival_airport']['time']
-        }
-        for flight in flights
-    ]
+    page = search_page(params, request.args, "Failed to fetch return flights. Please try again.")
 
     # Render the arrival page
-    return render_template(
-        'arrival.html',
-        flights=inbound_flights,
-        end_date=end_date,
-        start_date=start_date,
-        departure_city=arrival_city,
-        arrival_city=departure_city,
-        num_adults=num_adults,
-        num_children=num_children,
-        hotel_stars=hotel_stars,
-        budget=budget,
-        flight_needed=flight_needed,
-        car_needed=car_needed,
-        keywords=keywords
-    )
+    return render_template('arrival.html', leg="return", trip_id=request.args.get('trip_id'), **page)
 
 
 @app.route('/hotel', methods=['GET', 'POST'])
 @login_required
 def hotel():
-    # Retrieve parameters from query args
-    hotel_stars = request.args.get('hotel_stars', type=int) or 2  # Default to 2 stars
-    departure_city = request.args.get('departure_city')
-    arrival_city = request.args.get('arrival_city')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    num_adults = request.args.get('num_adults') or 1  # Default to 1 adult
-    num_children = request.args.get('num_children') or 0  # Default to 0 children
-    budget = request.args.get('budget', "default")
-    flight_needed = request.args.get('flight_needed', "Yes")
-    car_needed = request.args.get('car_needed', "No")
-    keywords = request.args.get('keywords', "").strip()
-    
+    trip = current_trip()
+    if trip is None:
+        flash("Missing required travel details. Please start over.", "warning")
+        return redirect(url_for('trip_input'))
 
-    # Validate and ensure `arrival_city` is used for hotel search
-    if not arrival_city or arrival_city == departure_city:
-        arrival_city = request.args.get('final_arrival_city', departure_city)
+    # Save the return flight, when coming from the arrival page
+    if 'returning_flight' in request.args:
+        returning_flight = parse_flight_selection(request.args.get('returning_flight'), "returning")
+        trip = trip_drafts.update(request.args.get('trip_id'), returning_flight=returning_flight)
 
-    # Construct the hotel query based on the `arrival_city`
-    hotel_query = f"{arrival_city} Resorts"
+    # Call SerpAPI for hotel data, querying "<arrival_city> Resorts"; only rated hotels are kept
+    params = trip_search_params(trip, "hotels")
+    page = search_page(params, request.args, "Failed to fetch hotel data. Please try again later.")
+
+    # Render the hotel selection page
+    return render_template('hotel.html', leg="hotels", trip_id=request.args.get('trip_id'), **page)
 
-    # Debugging
-    # print(f"Hotel Query: {hotel_query}")
-    # print(f"Search Parameters: Hotel Stars: {hotel_stars}, Start Date: {start_date}, End Date: {end_date}")
-
-    # Call SerpAPI for hotel data
-    params = {
-        "engine": "google_hotels",
-        "q": hotel_query,
-        "check_in_date": start_date,
-        "check_out_date": end_date,
-        "adults": num_adults,
-        "children": 0,
-        "currency": "USD",
-        "hotel_class": hotel_stars,
-        "gl": "us",
-        "hl": "en",
-        "api_key": serpAPI_key
-    }
 
+# Largest flexible-date window; each extra day adds two searches
+MAX_FARE_MATRIX_DAYS = 7
+
+@app.route('/fare-matrix')
+@login_required
+def fare_matrix():
+    trip = current_trip()
+    if trip is None:
+        flash("Missing required travel details. Please start over.", "warning")
+        return redirect(url_for('trip_input'))
+    if not trip_search_params(trip, "outbound"):
+        flash("Invalid city selection. Please try again.", "warning")
+        return redirect(url_for('trip_input', trip_id=request.args.get('trip_id')))
+
+    # One-way searches for every day in the window, run concurrently and cached like any other search
+    days = max(1, min(request.args.get('days', type=int) or app.config['FARE_MATRIX_DAYS'], MAX_FARE_MATRIX_DAYS))
+    # Every date costs a search per airport pair: only the first pairs are searched, and the window narrows
+    # until both legs fit in FARE_MATRIX_MAX_SEARCHES
+    pairs = max(app.config['FARE_MATRIX_MAX_PAIRS'], 1)
+    days = max(1, min(days, (app.config['FARE_MATRIX_MAX_SEARCHES'] // (2 * pairs) - 1) // 2))
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        hotels = results.get('properties', [])
-        # print(json.dumps(hotels, indent=4))  # Debugging the full API response
+        outbound_dates = date_window(trip['start_date'], days, earliest=date.today())
+        return_dates = date_window(trip['end_date'], days, earliest=date.today())
+    except (TypeError, ValueError):
+        flash("Invalid travel dates.", "warning")  # Drafts saved before confirmation checked them
+        return redirect(url_for('trip_input', trip_id=request.args.get('trip_id')))
+    with timer("fare_matrix", kind="stage"):
+        matrix = FareMatrix.search(
+            search_many,
+            lambda day: trip_search_params(dict(trip, start_date=day), "outbound")[:pairs],
+            lambda day: trip_search_params(dict(trip, end_date=day), "return")[:pairs],
+            outbound_dates,
+            return_dates,
+        )
+
+    return render_template('fare_matrix.html', trip_id=request.args.get('trip_id'), trip=trip, days=days,
+                           return_dates=matrix.return_dates, rows=matrix.rows(), cheapest=matrix.cheapest())
+
+
+@app.route('/fare-matrix/select')
+@login_required
+def select_fare_dates():
+    # Move the trip to the picked dates and continue with the flight search
+    trip = current_trip()
+    if trip is None:
+        flash("Missing required travel details. Please start over.", "warning")
+        return redirect(url_for('trip_input'))
+    try:
+        start_date = date.fromisoformat(request.args.get('start_date', ''))
+        end_date = date.fromisoformat(request.args.get('end_date', ''))
+    except ValueError:
+        start_date = end_date = None
+    if start_date is None or end_date < start_date:
+        flash("Invalid travel dates.", "warning")
+        return redirect(url_for('fare_matrix', trip_id=request.args.get('trip_id')))
+
+    trip_drafts.update(request.args.get('trip_id'), start_date=start_date.isoformat(), end_date=end_date.isoformat(),
+                       departing_flight={}, returning_flight={}, hotel={})
+    return redirect(url_for('departure', trip_id=request.args.get('trip_id')))
+
+
+def travelers_count(trip):
+    # Adults plus children on the draft; a missing or non-numeric count (hand-edited URL) falls back to 1 adult, 0 children
+    try:
+        adults = max(int(trip['num_adults'] or 1), 1)
+    except (TypeError, ValueError):
+        adults = 1
+    try:
+        children = max(int(trip['num_children'] or 0), 0)
+    except (TypeError, ValueError):
+        children = 0
+    return adults + children
+
+
+@app.route('/packages')
+@login_required
+def packages():
+    # The best outbound x return x hotel combinations for the trip's budget, from the cached searches
+    trip = current_trip()
+    if trip is None:
+        flash("Missing required travel details. Please start over.", "warning")
+        return redirect(url_for('trip_input'))
+    legs = {leg: trip_search_params(trip, leg) for leg in ("outbound", "return", "hotels")}
+    if trip['flight_needed'] != "Yes" or not legs["outbound"]:
+        return redirect(url_for('hotel', trip_id=request.args.get('trip_id')))
+
+    try:
+        records = {leg: leg_records(params) for leg, params in legs.items()}
+        nights = (date.fromisoformat(trip['end_date']) - date.fromisoformat(trip['start_date'])).days
     except Exception as e:
-        print(f"Error fetching hotels: {e}")
-        flash("Failed to fetch hotel data. Please try again later.", "warning")
-        hotels = []
-
-    # Extract and format hotel details
-    filtered_hotels = [
-        # {
-        #     "name": hotel.get('name'),
-        #     "overall_rating": hotel.get('overall_rating'),
-        #     "rate_per_night": hotel.get('rate_per_night', {}).get('lowest') or hotel.get('price') or "N/A",
-        #     "hotel_class": hotel.get('hotel_class', "N/A"),
-        #     "images": hotel.get('images', [{"thumbnail": ""}])
-        # }
-        hotel for hotel in hotels
-        if hotel.get('overall_rating') is not None
-    ]
+        print(f"Error during SerpAPI call: {e}")
+        records, nights = {"outbound": [], "return": [], "hotels": []}, 0
+    travelers = travelers_count(trip)
+    max_total = request.args.get('max_total', type=float)
+    with timer("optimizer", kind="stage"):
+        best = TripOptimizer(records["outbound"], records["return"], records["hotels"], nights, travelers).best(
+            app.config['PACKAGE_COUNT'], budget=trip['budget'], max_total=max_total)
 
-    # Limit to top 4 hotels
-    top_hotels = filtered_hotels[:4]
+    return render_template('packages.html', trip_id=request.args.get('trip_id'), trip=trip, packages=best,
+                           nights=max(nights, 1), travelers=travelers, max_total=max_total)
 
-    # Render the hotel selection page
-    return render_template(
-        'hotel.html',
-        hotels=top_hotels,
-        start_date=start_date,
-        end_date=end_date,
-        departure_city=departure_city,
-        arrival_city=arrival_city,
-        num_adults=num_adults,
-        num_children=num_children,
-        hotel_stars=hotel_stars,
-        budget=budget,
-        car_needed=car_needed,
-        flight_needed=flight_needed,
-        keywords=keywords
-    )
 
+@app.route('/packages/select')
+@login_required
+def select_package():
+    # Save the package's two flights and hotel, as if picked one page at a time
+    if current_trip() is None:
+        flash("Missing required travel details. Please start over.", "warning")
+        return redirect(url_for('trip_input'))
+    trip_drafts.update(request.args.get('trip_id'),
+                       departing_flight=parse_flight_selection(request.args.get('departing_flight'), "departing"),
+                       returning_flight=parse_flight_selection(request.args.get('returning_flight'), "returning"),
+                       hotel=parse_hotel_selection(request.args.get('hotel')))
+    return redirect(url_for('itinerary', trip_id=request.args.get('trip_id')))
+
+
+@app.route('/api/airports')
+def airport_suggestions():
+    # Autocomplete for the trip form: metropolitan areas and airports matching the typed prefix
+    limit = max(1, min(request.args.get('limit', 10, type=int), 25))
+    return jsonify(airports.search(request.args.get('q', ''), limit=limit))
+
+
+@app.route('/api/results/<leg>')
+@login_required
+def search_results(leg):
+    # Further pages of the outbound, return or hotel results as JSON, served from the cache
+    if leg not in ("outbound", "return", "hotels"):
+        return jsonify({"error": "Unknown search."}), 404
+    trip = current_trip()
+    params = trip_search_params(trip, leg) if trip else None
+    if not params:
+        return jsonify({"error": "Unknown trip."}), 404
+
+    try:
+        page = result_page(params, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error during SerpAPI call: {e}")
+        return jsonify({"error": "Search failed. Please try again later."}), 502
+
+    partial = '_hotel_options.html' if leg == "hotels" else '_flight_options.html'
+    return jsonify({
+        "results": [dict(record.to_dict(), token=record.token()) for record in page["results"]],
+        "next_cursor": page["next_cursor"],
+        "stale": page["stale"],
+        "html": render_template(partial, leg=leg, **page),
+    })
 
 
 @app.route('/itinerary', methods=['GET', 'POST'])
 @login_required
 def itinerary():
-    # Collect parameters passed through GET or POST
-    params = {
-        "start_date": request.args.get("start_date"),
-        "end_date": request.args.get("end_date"),
-        "departure_city": request.args.get("departure_city"),
-        "arrival_city": request.args.get("arrival_city"),
-        "flight_needed": request.args.get("flight_needed"),
-        "car_needed": request.args.get("car_needed"),
-        "hotel_stars": request.args.get("hotel_stars"),
-        "budget": request.args.get("budget"),
-        "keywords": request.args.get("keywords"),
-        "num_adults": request.args.get("num_adults"),
-        "num_children": request.args.get("num_children"),
-        "departing_flight": request.args.get("departing_flight"),
-        "returning_flight": request.args.get("returning_flight"),
-        "hotel": request.args.get("hotel"),
+    trip = current_trip()
+    if trip is None:
+        flash("Missing required travel details. Please start over.", "warning")
+        return redirect(url_for('trip_input'))
+
+    # Save the hotel picked on the previous page
+    if 'hotel' in request.args:
+        trip_drafts.update(request.args.get('trip_id'), hotel=parse_hotel_selection(request.args.get('hotel')))
+
+    return render_template('itinerary.html', streaming=app.config['ITINERARY_STREAMING'],
+                           trip_id=request.args.get('trip_id'))
+
+
+def parse_flight_selection(selection, leg):
+    # A flight radio value is a FlightOption token
+    if not selection:
+        return {}
+    try:
+        return FlightOption.from_token(selection).to_dict()
+    except ValueError:
+        flash(f"Invalid {leg} flight details.", "warning")
+        return {}
+
+
+def parse_hotel_selection(selection):
+    # A hotel radio value is a HotelOption token; the prompt only needs these fields
+    if not selection:
+        return {}
+    try:
+        hotel = HotelOption.from_token(selection)
+    except ValueError:
+        flash("Invalid hotel details.", "warning")
+        return {}
+    return hotel_choice(hotel)
+
+
+def hotel_choice(hotel):
+    # The fields of a picked HotelOption that the prompt needs
+    return {
+        "name": hotel.name,
+        "price_per_night": hotel.price_per_night or "N/A",
+        "rating": hotel.rating
     }
 
-    #print("Itinerary parameters:", json.dumps(params, indent=4))
-    return render_template('itinerary.html', **params)
 
-@app.route('/generate-itinerary', methods=['GET'])
-def generate_itinerary():
+def parse_itinerary_args(args):
+    # Saved draft when a trip_id is given, otherwise every field from the arguments.
+    # Signed-in users only see their own drafts; otherwise the unguessable id is the credential.
+    if args.get('trip_id'):
+        owner = current_user.id if current_user.is_authenticated else None
+        return trip_drafts.get(args.get('trip_id'), owner)
+
     # Standard details
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    departure_city = request.args.get('departure_city')
-    arrival_city = request.args.get('arrival_city')
-    flight_needed = request.args.get('flight_needed')
-    car_needed = request.args.get('car_needed')
-    hotel_stars = request.args.get('hotel_stars')
-    budget = request.args.get('budget')
-    keywords = request.args.get('keywords', '')
-    num_adults = request.args.get('num_adults') or 1  # Default to 1 adult if not provided
-    num_children = request.args.get('num_children') or 0  # Default to 0 children 
-
-
-    # Parse departing flight
-    departing_flight_data = request.args.get('departing_flight')
-    departing_flight = {}
-    if departing_flight_data:
-        departing_flight_details = departing_flight_data.split('|')
-        if len(departing_flight_details) >= 6:
-            departing_flight = {
-                "price": departing_flight_details[0],
-                "flight_number": departing_flight_details[1],
-                "departure_airport": departing_flight_details[2],
-                "departure_time": departing_flight_details[3],
-                "arrival_airport": departing_flight_details[4],
-                "arrival_time": departing_flight_details[5]
-            }
-        else:
-            flash("Invalid departing flight details.", "warning")
-
-    # Parse returning flight
-    returning_flight_data = request.args.get('returning_flight')
-    returning_flight = {}
-    if returning_flight_data:
-        returning_flight_details = returning_flight_data.split('|')
-        if len(returning_flight_details) >= 5:
-            returning_flight = {
-                "price": returning_flight_details[0],
-                "flight_number": returning_flight_details[1],
-                "departure_airport": returning_flight_details[2],
-                "departure_time": returning_flight_details[3],
-                "arrival_airport": returning_flight_details[4],
-                "arrival_time": returning_flight_details[5]
-            }
-        else:
-            flash("Invalid returning flight details.", "warning")
-
-    # Parse selected hotel
-    selected_hotel = request.args.get('hotel')
-    hotel = {}
-    if selected_hotel:
-        hotel_details = selected_hotel.split('|')
-        if len(hotel_details) >= 3:
-            hotel = {
-                "name": hotel_details[0],
-                "price_per_night": hotel_details[1],
-                "rating": hotel_details[2]
-            }
-        else:
-            flash("Invalid hotel details.", "warning")
+    trip = {
+        "start_date": args.get('start_date'),
+        "end_date": args.get('end_date'),
+        "departure_city": args.get('departure_city'),
+        "arrival_city": args.get('arrival_city'),
+        "flight_needed": args.get('flight_needed'),
+        "car_needed": args.get('car_needed'),
+        "hotel_stars": args.get('hotel_stars'),
+        "budget": args.get('budget'),
+        "keywords": args.get('keywords', ''),
+        "num_adults": args.get('num_adults') or 1,  # Default to 1 adult if not provided
+        "num_children": args.get('num_children') or 0,  # Default to 0 children
+    }
+    trip["departing_flight"] = parse_flight_selection(args.get('departing_flight'), "departing")
+    trip["returning_flight"] = parse_flight_selection(args.get('returning_flight'), "returning")
+    trip["hotel"] = parse_hotel_selection(args.get('hotel'))
+    return trip
 
 
+def itinerary_fields_present(trip):
     # Check if all necessary fields are present
-    if not all([start_date, end_date, departure_city, arrival_city, flight_needed, car_needed, hotel_stars, budget]):
-        flash("Missing fields for generating itinerary.", "warning")
-        return redirect(url_for('itinerary'))
-    
-    user_prompt = f"""
+    return trip is not None and all(trip[field] for field in ("start_date", "end_date", "departure_city", "arrival_city",
+                                         "flight_needed", "car_needed", "hotel_stars", "budget"))
+
+
+def build_itinerary_prompt(trip):
+    return f"""
         Generate a detailed travel itinerary in JSON format. Ensure the itinerary includes all necessary details, including timestamps, addresses, travel durations, and costs. Use the following JSON structure:
 
         {{
@@ -531,27 +876,27 @@ def generate_itinerary():
         }}
 
         Requirements:
-        1. Travel Dates: From {start_date} to {end_date}. Ensure activities & all meals are generated for each day.
-        2. Departure City: {departure_city}.
-        3. Arrival City: {arrival_city}.
+        1. Travel Dates: From {trip['start_date']} to {trip['end_date']}. Ensure activities & all meals are generated for each day.
+        2. Departure City: {trip['departure_city']}.
+        3. Arrival City: {trip['arrival_city']}.
         4. Flight Details:
-        - Required: {flight_needed}.
-        - Departure Flight Price: {departing_flight}.
-        - Return Flight Price: {returning_flight}.
+        - Required: {trip['flight_needed']}.
+        - Departure Flight Price: {trip['departing_flight']}.
+        - Return Flight Price: {trip['returning_flight']}.
         - Multiply the flight prices by total number of people.
         - If flight is not needed, assume they're driving to with a car rental starting from the departure city.
         5. Car Rental:
-        - Required: {car_needed}.
+        - Required: {trip['car_needed']}.
         - If a car rental is required, include details under "car_rental_info". If not, set "car_rental_info" as an empty object.
         - Pickup & return should be from the departure city. Factor in driving time to reach the arrival city.
-        6. Budget Level: {budget or "Not specified"}.
-        7. Travelers: {num_adults} adults, {num_children} children.
+        6. Budget Level: {trip['budget'] or "Not specified"}.
+        7. Travelers: {trip['num_adults']} adults, {trip['num_children']} children.
         8. Accommodation:
-        - Hotel: {hotel} (The given price is the rate per night. Include this rate at the end of each night).
+        - Hotel: {trip['hotel']} (The given price is the rate per night. Include this rate at the end of each night).
         - Add the hotel stay to the end of each day but label it as overnight stay in the itinerary.
         - Do not add costs for check-in and check-out.
         9. Preferences:
-        - Keywords: {keywords} (Use these to prioritize activities or destinations).
+        - Keywords: {trip['keywords']} (Use these to prioritize activities or destinations).
         - Include detailed descriptions for each activity or place to visit.
         - Provide timestamps and detailed costs for all activities and meals.
         10. Additional Considerations:
@@ -563,136 +908,752 @@ def generate_itinerary():
         Formatting Rules:
         - Use clear timestamps (e.g., "2024-12-03T09:00").
         - For price, ONLY return numbers.
-        - Avoid using the character \u2019 for apostrophes.
+        - Avoid using the character ’ for apostrophes.
         - Use a dictionary for the "content" array.
         """
 
-    # Generate response from OpenAI
-    completion = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {
-                "role": "user",
-                "content": user_prompt
-            }
-        ],
-        response_format={
-            "type": "json_object"
-        }
-    )
-
-    # Response
-    pdf_content_string = completion.choices[0].message.content
-    pdf_content = json.loads(pdf_content_string)
-    
-    # Generate PDF
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    # # Add Header Section
-    header = pdf_content['header']
-    pdf.set_font("Arial", style='B', size=14)
-    pdf.cell(0, 10, "Travel Itinerary", ln=True, align='C')
-    pdf.ln(10)
-
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, f"Departure City: {header['departure_city']}", ln=True)
-    pdf.cell(0, 10, f"Arrival City: {header['arrival_city']}", ln=True)
-    pdf.cell(0, 10, f"Number of Adults: {num_adults}", ln=True)
-    pdf.cell(0, 10, f"Number of Children: {num_children}", ln=True)
-    pdf.cell(0, 10, f"Travel Dates: From {header['start_date']} to {header['end_date']}", ln=True)
-    pdf.ln(5)
-
-    total_price = 0
-    # Add Car Rental Info
-    car_rental = header.get('car_rental_info', {})
-    if car_rental:
-        pdf.set_font("Arial", style='B', size=12)
-        pdf.cell(0, 10, "Car Rental Information:", ln=True)
-        pdf.set_font("Arial", size=12)
-        pdf.cell(0, 10, f"  Company: {car_rental.get('company', 'N/A')}", ln=True)
-        pdf.cell(0, 10, f"  Car Type: {car_rental.get('car_type', 'N/A')}", ln=True)
-        pdf.cell(0, 10, f"  Pickup Location: {car_rental.get('pick_up_location', 'N/A')}", ln=True)
-        pdf.cell(0, 10, f"  Pickup Time: {car_rental.get('pick_up_time', 'N/A')}", ln=True)
-        pdf.cell(0, 10, f"  Return Location: {car_rental.get('return_location', 'N/A')}", ln=True)
-        pdf.cell(0, 10, f"  Return Time: {car_rental.get('return_time', 'N/A')}", ln=True)
-        pdf.cell(0, 10, f"  Total Price: ${car_rental.get('total_price', 'N/A')}", ln=True)
-        pdf.ln(10)
-        price = int(car_rental.get('total_price', '0'))
-        total_price += price
-
-    content_list = pdf_content.get('content', [])
-
-    if content_list:
-        pdf.set_font("Arial", style='B', size=12)
-        pdf.cell(0, 10, "Schedule:", ln=True)
-        curr_date = ""
-        for content in content_list:
-            if isinstance(content, dict):  # Check if content is a dictionary
-                if content.get('price', '0') == "":
-                    price = 0
-                else: 
-                    price = int(content.get('price', '0'))
-                total_price += price
-                # Parse the time
-                date_obj = datetime.fromisoformat(content["time_stamp"])
-                time_formatted = date_obj.strftime("%I:%M %p")  # e.g., 10:00 AM
-                date_formatted = date_obj.strftime("%A %Y-%m-%d")  # e.g., Saturday 2024-12-14
-
-                # Add the date header if the date changes
-                if date_formatted != curr_date:
-                    if curr_date is not None:
-                        pdf.ln(5)  # Add spacing before a new date header
-                    pdf.set_font("Arial", "B", 12)  # Bold font for the date header
-                    pdf.cell(0, 10, date_formatted, border=1, ln=1, align="C")  # Full-width date header
-                    curr_date = date_formatted
-
-                # Add a row for the time and details
-                pdf.set_font("Arial", size=12)  # Regular font for time and details
-
-                # Define column widths
-                time_column_width = 40  # Fixed width for the time column
-                details_column_width = pdf.w - time_column_width - 20  # Remaining width for the details column (accounting for margins)
-
-                # Time column
-                pdf.cell(time_column_width, 10, time_formatted, border=0, ln=0, align='C')
-
-                # Details column
-                details = (
-                    f"{content.get('place', 'N/A')}\n"
-                    f"{content.get('location', 'N/A')}\n"
-                    f"{content.get('description', 'N/A')}\n"
-                    f"Price: ${content.get('price', 'N/A')}"
-                )
-                pdf.multi_cell(details_column_width, 10, details, border=1, align='L')
-
-            elif isinstance(content, str):  # Handle string content
-                pdf.set_font("Arial", size=12)
-                pdf.multi_cell(0, 10, f"  Note: {content}")
-                pdf.ln(5)
+
+def flight_summary(flight):
+    # One line per flight for compact prompts, instead of the whole dict
+    if not flight:
+        return "not chosen"
+    return (f"{flight.get('flight_number')} {flight.get('departure_airport')} {flight.get('departure_time')}"
+            f" -> {flight.get('arrival_airport')} {flight.get('arrival_time')}, ${flight.get('price')}")
+
+
+def trip_facts(trip):
+    # The trip-specific part of a compact prompt; the rules live in the static system prompt
+    hotel = trip['hotel'] or {}
+    if trip['flight_needed'] == "Yes":
+        flights = f"out {flight_summary(trip['departing_flight'])}; back {flight_summary(trip['returning_flight'])}"
     else:
-        pdf.set_font("Arial", style='B', size=12)
-        pdf.cell(0, 10, "No destination information available.", ln=True)
+        flights = "none, driving"
+    return "\n".join([
+        f"Trip: {trip['departure_city']} to {trip['arrival_city']}, {trip['start_date']} to {trip['end_date']}",
+        f"Travelers: {trip['num_adults']} adults, {trip['num_children']} children",
+        f"Budget: {trip['budget'] or 'any'}",
+        f"Interests: {trip['keywords'] or 'any'}",
+        f"Flights: {flights}",
+        f"Car rental: {'yes' if trip['car_needed'] == 'Yes' else 'no'}",
+        f"Hotel: {hotel['name']}, {hotel.get('price_per_night')} per night" if hotel.get('name') else "Hotel: your choice",
+    ])
+
+
+def compact_mode():
+    return app.config['ITINERARY_PROMPT_MODE'] == "compact"
+
+
+def compact_messages(request_text):
+    return [
+        {"role": "system", "content": system_prompt(app.config['COMPACT_DESCRIPTION_WORDS'])},
+        {"role": "user", "content": request_text},
+    ]
 
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, f"  Total Price: ${total_price}", ln=True, align='C')
-    pdf.ln(10)
 
+def itinerary_messages(trip):
+    if compact_mode():
+        return compact_messages(f"{trip_facts(trip)}\nWrite: the whole trip, header and every day.")
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {
+            "role": "user",
+            "content": build_itinerary_prompt(trip)
+        }
+    ]
+
+
+def build_skeleton_prompt(trip):
+    return f"""
+        Plan the outline of a travel itinerary in JSON format. The activities for each day will be planned separately, so only return the header and a short theme for every day. Use the following JSON structure:
+
+        {{
+            "header": {{
+                "departure_city": "",
+                "arrival_city": "",
+                "start_date": "",
+                "end_date": "",
+                "car_rental_info": {{
+                    "company": "",
+                    "car_type": "",
+                    "pick_up_location": "",
+                    "pick_up_time": "",
+                    "return_location": "",
+                    "return_time": "",
+                    "total_price": ""
+                }}
+            }},
+            "days": [
+                {{
+                    "date": "",
+                    "theme": ""
+                }}
+            ]
+        }}
+
+        Requirements:
+        1. Travel Dates: From {trip['start_date']} to {trip['end_date']}. Include one entry in "days" for every date.
+        2. Departure City: {trip['departure_city']}.
+        3. Arrival City: {trip['arrival_city']}.
+        4. Car Rental:
+        - Required: {trip['car_needed']}.
+        - If a car rental is required, include details under "car_rental_info". If not, set "car_rental_info" as an empty object.
+        - Pickup & return should be from the departure city.
+        5. Budget Level: {trip['budget'] or "Not specified"}.
+        6. Travelers: {trip['num_adults']} adults, {trip['num_children']} children.
+        7. Preferences: {trip['keywords']} (Use these to choose the day themes, and don't repeat a theme).
+
+        Formatting Rules:
+        - Use ISO dates (e.g., "2024-12-03") and timestamps (e.g., "2024-12-03T09:00").
+        - For price, ONLY return numbers.
+        """
+
+
+def day_travel(trip, days, number, flight_details=True):
+    # What the number'th (from 0) of days involves in the way of long-distance travel
+    if number == 0 and trip['flight_needed'] == "Yes":
+        flight = f" ({trip['departing_flight']})" if flight_details else ""
+        return f"This is the first day: start with the departing flight{flight}, counting travel time from the airport."
+    if number == len(days) - 1 and trip['flight_needed'] == "Yes":
+        flight = f" ({trip['returning_flight']})" if flight_details else ""
+        return f"This is the last day: end with the return flight{flight}, leaving time to reach the airport."
+    if number in (0, len(days) - 1):
+        return "This is a travel day: include the drive between the departure city and the arrival city."
+    return "There is no long-distance travel on this day."
+
+
+def build_day_prompt(trip, skeleton, day):
+    days = skeleton["days"]
+    number = next(i for i, plan in enumerate(days) if plan["date"] == day)
+    other_themes = ", ".join(plan["theme"] for plan in days if plan["date"] != day and plan["theme"]) or "None"
+    travel = day_travel(trip, days, number)
+    return f"""
+        Plan day {number + 1} of {len(days)} of a trip from {trip['departure_city']} to {trip['arrival_city']} in JSON format. Use the following JSON structure:
+
+        {{
+            "content": [
+                {{
+                    "place": "",
+                    "location": "",
+                    "time_stamp": "",
+                    "description": "",
+                    "price": ""
+                }}
+            ]
+        }}
+
+        Requirements:
+        1. Date: {day}. Every time_stamp must be on this date.
+        2. Theme for the day: {days[number]['theme'] or "Your choice"}. Themes of the other days: {other_themes}.
+        3. {travel}
+        4. Include breakfast, lunch and dinner, with detailed descriptions of each activity or place to visit.
+        5. Budget Level: {trip['budget'] or "Not specified"}.
+        6. Travelers: {trip['num_adults']} adults, {trip['num_children']} children. Multiply flight prices by the number of people.
+        7. Accommodation: {trip['hotel']} (The given price is the rate per night). Add the hotel stay to the end of the day, labeled as overnight stay, unless this is the last day. Do not add costs for check-in and check-out.
+        8. Preferences: {trip['keywords']} (Use these to prioritize activities).
+        9. Add necessary transportation for each activity.
+
+        Formatting Rules:
+        - Use clear timestamps (e.g., "{day}T09:00").
+        - For price, ONLY return numbers.
+        - Avoid using the character ’ for apostrophes.
+        """
+
+
+def skeleton_messages(trip):
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": build_skeleton_prompt(trip)},
+    ]
+
+
+def compact_day_request(trip, skeleton, day):
+    days = skeleton["days"]
+    number = next(i for i, plan in enumerate(days) if plan["date"] == day)
+    other_themes = ", ".join(plan["theme"] for plan in days if plan["date"] != day and plan["theme"]) or "none"
+    return (f"{trip_facts(trip)}\nWrite: day {number + 1} of {len(days)} ({day}) only. "
+            f"Theme: {days[number]['theme'] or 'your choice'}; other days: {other_themes}. "
+            f"{day_travel(trip, days, number, flight_details=False)}")
+
+
+def day_messages(trip, skeleton, day):
+    if compact_mode():
+        return compact_messages(compact_day_request(trip, skeleton, day))
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": build_day_prompt(trip, skeleton, day)},
+    ]
+
+
+def build_activity_prompt(trip, itinerary, day, entry):
+    planned = ", ".join(other["place"] for other in itinerary["content"]
+                        if isinstance(other, dict) and other is not entry and other.get("place")) or "None"
+    return f"""
+        Suggest one replacement activity for a trip from {trip['departure_city']} to {trip['arrival_city']} in JSON format. Use the following JSON structure:
+
+        {{
+            "content": [
+                {{
+                    "place": "",
+                    "location": "",
+                    "time_stamp": "",
+                    "description": "",
+                    "price": ""
+                }}
+            ]
+        }}
+
+        Requirements:
+        1. It replaces {entry.get('place')} at {entry.get('time_stamp')}. Use the same time_stamp and suggest a different place.
+        2. Keep it the same kind of activity (a meal stays a meal, an overnight stay stays an overnight stay).
+        3. Do not repeat anything already planned: {planned}.
+        4. Budget Level: {trip['budget'] or "Not specified"}.
+        5. Travelers: {trip['num_adults']} adults, {trip['num_children']} children.
+        6. Preferences: {trip['keywords']} (Use these to prioritize activities).
+        7. Date: {day}. Give a detailed description and the transportation needed.
+
+        Formatting Rules:
+        - For price, ONLY return numbers.
+        - Avoid using the character ’ for apostrophes.
+        """
+
+
+def activity_messages(trip, itinerary, day, entry):
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": build_activity_prompt(trip, itinerary, day, entry)},
+    ]
+
+
+# Long trips: a skeleton call, then concurrent per-day calls
+day_planner = DayPlanner(itinerary_generator, skeleton_messages, day_messages, activity_messages,
+                         max_concurrency=app.config['ITINERARY_DAY_CONCURRENCY'],
+                         max_attempts=app.config['ITINERARY_DAY_ATTEMPTS'])
+
+
+# Sightseeing days of earlier itineraries, reused for similar trips
+day_plan_cache = DayPlanCache(max_keys=app.config['DAY_PLAN_CACHE_SIZE'], days_per_key=app.config['DAY_PLAN_CACHE_DAYS'])
+
+
+def plans_per_day(trip):
+    min_days = app.config['ITINERARY_PER_DAY_MIN_DAYS']
+    try:
+        return min_days > 0 and len(trip_days(trip)) >= min_days
+    except (TypeError, ValueError):
+        return False  # Unparseable dates; leave them to the single prompt
+
+
+def itinerary_llm_calls(trip, cached=None):
+    # LLM calls an itinerary takes: one prompt, or a skeleton (unless cached days make it unneeded) and each uncached day
+    if not cached and not plans_per_day(trip):
+        return 1
+    return day_planner.outline_needed(trip, cached) + len(trip_days(trip)) - len(cached or {})
+
+
+def cached_days(trip):
+    # Days the day plan cache covers for the trip, if planning around them takes fewer LLM calls than the trip's
+    # usual path; a short trip's single prompt beats a skeleton and its travel days. Only the rest go to the LLM.
+    try:
+        cached = day_plan_cache.lookup(trip)
+        if cached and itinerary_llm_calls(trip, cached) >= itinerary_llm_calls(trip):
+            return {}
+        return cached
+    except (TypeError, ValueError):
+        return {}  # Unparseable dates or party size
+
+
+def remember_days(trip, pdf_content, cached):
+    # Pool the freshly generated days for the next similar trip
+    try:
+        calls_saved = itinerary_llm_calls(trip) - itinerary_llm_calls(trip, cached) if cached else 0
+        day_plan_cache.store(trip, pdf_content, reused=cached, calls_saved=calls_saved)
+    except (TypeError, ValueError, AttributeError) as e:
+        print(f"Error caching itinerary days: {e}")
+
+
+def build_itinerary_pdf(pdf_content, num_adults, num_children):
+    # PDF bytes for the LLM's itinerary JSON
+    return itinerary_renderer.render(pdf_content, num_adults, num_children)
+
+
+def pdf_response(pdf_bytes, action, etag=None):
     # Determine if the PDF should be downloaded or displayed inline
-    disposition = "inline" if request.args.get("action") == "view" else "attachment"
+    disposition = "inline" if action == "view" else "attachment"
 
     # Create a response with the PDF
-    response = make_response(pdf.output(dest='S').encode('latin1'))
-    # response = make_response(pdf.output(dest='S').encode('utf-8'))
+    response = make_response(pdf_bytes)
     response.headers['Content-Type'] = 'application/pdf'
     response.headers['Content-Disposition'] = f'{disposition}; filename=itinerary.pdf'
+    if etag:
+        # The view and download variants share the same bytes, so they share the ETag too
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
 
+
+def not_modified(etag):
+    response = make_response("", 304)
+    response.set_etag(etag)
     return response
 
 
+def itinerary_content(trip):
+    # The itinerary JSON: one LLM call, or for long trips (and trips cached days save calls for) a skeleton and a call per day.
+    # Either way the itinerary holds one LLM slot; per-day calls share it.
+    cached = cached_days(trip)
+    if cached or plans_per_day(trip):
+        with job_queue.llm_slot(), timer("llm"):
+            pdf_content = day_planner.generate(trip, cached)
+    else:
+        with job_queue.llm_slot(), timer("llm"):
+            pdf_content_string = itinerary_generator.complete(itinerary_messages(trip), trip)
+        with timer("json_parse", kind="stage"):
+            pdf_content = json.loads(pdf_content_string)
+    remember_days(trip, pdf_content, cached)
+    return pdf_content
+
+
+def save_itinerary(user_id, trip_id, trip, trip_key, pdf_content, pdf_bytes):
+    # Keep a signed-in user's itinerary and return its id; losing it only costs the history entry
+    if not user_id:
+        return
+    if not has_app_context():  # Job threads
+        with app.app_context():
+            return save_itinerary(user_id, trip_id, trip, trip_key, pdf_content, pdf_bytes)
+    try:
+        return itinerary_store.save(user_id, trip_id, trip_key, trip, pdf_content, pdf_bytes).id
+    except Exception as e:
+        print(f"Error saving itinerary: {e}")
+
+
+def saved_pdf(user_id, trip_key):
+    # The PDF a signed-in user already has for the trip, edits included; None if there is none
+    if not user_id:
+        return None
+    if not has_app_context():  # Job threads
+        with app.app_context():
+            return saved_pdf(user_id, trip_key)
+    saved = itinerary_store.find(user_id, trip_key)
+    return saved.pdf if saved is not None else None
+
+
+def render_itinerary(trip, trip_key, user_id=None, trip_id=None):
+    # LLM generation and PDF build for one trip; the result lands in the PDF cache and the user's history.
+    # A trip the user already saved is served from there, so its regenerated days aren't thrown away.
+    pdf_bytes = saved_pdf(user_id, trip_key)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    pdf_content = itinerary_content(trip)
+
+    with timer("pdf_build", kind="stage"):
+        pdf_bytes = build_itinerary_pdf(pdf_content, trip['num_adults'], trip['num_children'])
+    pdf_cache.put(trip_key, pdf_bytes)
+    save_itinerary(user_id, trip_id, trip, trip_key, pdf_content, pdf_bytes)
+    return pdf_bytes
+
+
+def itinerary_owner():
+    # (user id, trip id) to save a generated itinerary under; no user when signed out
+    if not current_user.is_authenticated:
+        return None, None
+    args = request.get_json(silent=True) or request.values
+    return current_user.id, args.get('trip_id') or None
+
+
+@app.route('/generate-itinerary', methods=['GET'])
+def generate_itinerary():
+    trip = parse_itinerary_args(request.args)
+
+    if not itinerary_fields_present(trip):
+        flash("Missing fields for generating itinerary.", "warning")
+        return redirect(url_for('itinerary'))
+
+    # Serve an itinerary that was already rendered for the same trip, with the user's edits if any
+    trip_key = trip_fingerprint(trip)
+    user_id, trip_id = itinerary_owner()
+    saved = itinerary_store.find(user_id, trip_key) if user_id else None
+    if saved is not None:
+        return saved_itinerary_response(saved, request.args.get("action"))
+    if trip_key in request.if_none_match and trip_key in pdf_cache:
+        return not_modified(trip_key)
+    pdf_bytes = pdf_cache.get(trip_key)
+    if pdf_bytes is None:
+        pdf_bytes = render_itinerary(trip, trip_key, user_id, trip_id)
+    return pdf_response(pdf_bytes, request.args.get("action"), etag=trip_key)
+
+
+@app.route('/generate-itinerary', methods=['POST'])
+def submit_itinerary_job():
+    # Queue the itinerary in the background and let the page poll for it
+    trip = parse_itinerary_args(request.get_json(silent=True) or request.form)
+    if not itinerary_fields_present(trip):
+        return jsonify({"error": "Missing fields for generating itinerary."}), 400
+
+    # An itinerary that was already rendered or saved for the trip is done without a new LLM call
+    trip_key = trip_fingerprint(trip)
+    user_id, trip_id = itinerary_owner()
+    if trip_key in pdf_cache or (user_id and itinerary_store.find(user_id, trip_key)):
+        job = job_queue.completed(trip_key)
+    else:
+        job = job_queue.submit(trip_key, render_itinerary, trip, trip_key, user_id, trip_id)
+    body = dict(job.to_dict(), status_url=url_for('itinerary_job', job_id=job.id))
+    return jsonify(body), 200 if job.status == DONE else 202
+
+
+@app.route('/generate-itinerary/<job_id>', methods=['GET'])
+def itinerary_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    if job.status == FAILED:
+        return jsonify(job.to_dict()), 500
+    if job.status != DONE:
+        return jsonify(job.to_dict()), 202
+
+    # The user's saved copy, with their edits, wins over the cached PDF
+    saved = itinerary_store.find(current_user.id, job.key) if current_user.is_authenticated else None
+    if saved is not None:
+        return saved_itinerary_response(saved, request.args.get("action"))
+    if job.key in request.if_none_match and job.key in pdf_cache:
+        return not_modified(job.key)
+    pdf_bytes = pdf_cache.get(job.key)
+    if pdf_bytes is None:
+        return jsonify({"error": "Itinerary expired. Please generate it again."}), 410
+    return pdf_response(pdf_bytes, request.args.get("action"), etag=job.key)
+
+
+@app.route('/generate-itinerary/stream', methods=['GET'])
+def stream_itinerary():
+    trip = parse_itinerary_args(request.args)
+    if not itinerary_fields_present(trip):
+        return Response(sse_event("error", {"message": "Missing fields for generating itinerary."}),
+                        mimetype="text/event-stream")
+
+    # Once the PDF is cached the iframe can load it from the regular endpoint
+    pdf_url = url_for('generate_itinerary', **dict(request.args.to_dict(), action='view'))
+    trip_key = trip_fingerprint(trip)
+    user_id, trip_id = itinerary_owner()
+    if trip_key in pdf_cache or (user_id and itinerary_store.find(user_id, trip_key)):
+        return Response(sse_event("done", {"days": 0, "url": pdf_url}), mimetype="text/event-stream")
+
+    def generate():
+        # Stream the completion and push each schedule entry as soon as it is complete
+        parser = ContentStreamParser("content")
+        progress = DayProgress()
+        cached = cached_days(trip)
+        try:
+            if cached or plans_per_day(trip):
+                # Days arrive in whatever order they finish, cached ones first; each is sent whole
+                with job_queue.llm_slot(), timer("llm"):
+                    skeleton = day_planner.skeleton(trip, cached)
+                    days = {day: plan["content"] for day, plan in cached.items()}
+                    for number, plan in enumerate(skeleton["days"], start=1):
+                        for entry in days.get(plan["date"], []):
+                            yield sse_event("activity", {"day": number, "date": plan["date"], "entry": entry})
+                    for number, day, entries in day_planner.fill_days(trip, skeleton, skip=cached):
+                        days[day] = entries
+                        for entry in entries:
+                            yield sse_event("activity", {"day": number, "date": day, "entry": entry})
+                pdf_content = day_planner.merge(skeleton, days)
+                day_count = len(days)
+            else:
+                with job_queue.llm_slot(), timer("llm"):
+                    for delta in itinerary_generator.stream(itinerary_messages(trip), trip):
+                        for entry in parser.feed(delta):
+                            yield sse_event("activity", progress.add(entry))
+
+                with timer("json_parse", kind="stage"):
+                    pdf_content = parser.result()
+                day_count = progress.days
+            with timer("pdf_build", kind="stage"):
+                pdf_bytes = build_itinerary_pdf(pdf_content, trip['num_adults'], trip['num_children'])
+        except Exception as e:
+            print(f"Error streaming itinerary: {e}")
+            yield sse_event("error", {"message": "Unable to generate the itinerary."})
+            return
+
+        remember_days(trip, pdf_content, cached)
+        pdf_cache.put(trip_key, pdf_bytes)
+        save_itinerary(user_id, trip_id, trip, trip_key, pdf_content, pdf_bytes)
+        yield sse_event("done", {"days": day_count, "url": pdf_url})
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let a reverse proxy buffer the stream
+    return response
+
+
+def saved_itinerary_response(saved, action):
+    # The stored PDF; its ETag changes with every regenerated day or activity
+    etag = itinerary_etag(saved)
+    if etag in request.if_none_match:
+        return not_modified(etag)
+    return pdf_response(saved.pdf, action, etag=etag)
+
+
+@app.route('/trips')
+@login_required
+def trip_history():
+    try:
+        saved, next_cursor = itinerary_store.page(current_user.id, request.args.get('cursor'),
+                                                  limit=app.config['HISTORY_PAGE_SIZE'])
+    except ValueError:
+        return redirect(url_for('trip_history'))  # Malformed cursor; start from the newest
+
+    trips = []
+    for itinerary in saved:
+        try:
+            days = trip_days({"start_date": itinerary.start_date, "end_date": itinerary.end_date})
+        except (TypeError, ValueError):
+            days = []
+        trips.append({"itinerary": itinerary, "days": days})
+    return render_template('trips.html', trips=trips, next_cursor=next_cursor)
+
+
+@app.route('/itineraries/<int:itinerary_id>/pdf')
+@login_required
+def saved_itinerary_pdf(itinerary_id):
+    saved = itinerary_store.get(itinerary_id, current_user.id)
+    if saved is None:
+        return "Itinerary not found.", 404
+    return saved_itinerary_response(saved, request.args.get("action"))
+
+
+# OpenAI errors that go away by themselves; the client can retry the same request
+LLM_BUSY_ERRORS = (openai.error.RateLimitError, openai.error.Timeout, openai.error.APIConnectionError,
+                   openai.error.ServiceUnavailableError, openai.error.TryAgain)
+
+
+def regenerate_request_error(trip, itinerary, day, activity):
+    # (error message or None, activity as an int or None) for a regenerate request; messages are safe to show
+    try:
+        days = trip_days(trip)
+    except (TypeError, ValueError):
+        days = []
+    if day not in days:
+        return "day must be a date of this trip (YYYY-MM-DD).", None
+    if activity is None or activity == "":
+        return None, None
+    count = sum(1 for entry_day, entry in entry_days(itinerary.get("content") or [])
+                if entry_day == day and isinstance(entry, dict))
+    try:
+        activity = int(activity)
+    except (TypeError, ValueError):
+        activity = 0
+    if not 1 <= activity <= count:
+        return f"activity must be a whole number from 1 to {count} for {day}.", None
+    return None, activity
+
+
+@app.route('/itineraries/<int:itinerary_id>/regenerate', methods=['POST'])
+@login_required
+def regenerate_itinerary(itinerary_id):
+    # Plan one day (or one activity of a day) again; the other days are kept as they are
+    saved = itinerary_store.get(itinerary_id, current_user.id)
+    if saved is None:
+        return jsonify({"error": "Itinerary not found."}), 404
+
+    args = request.get_json(silent=True) or request.form
+    day = str(args.get('day') or '')
+    activity = args.get('activity')
+    trip = json.loads(saved.trip)
+    itinerary = json.loads(saved.data)
+    error, activity = regenerate_request_error(trip, itinerary, day, activity)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        with job_queue.llm_slot(), timer("llm"):
+            if activity is None:
+                itinerary = day_planner.regenerate_day(trip, itinerary, day)
+            else:
+                itinerary = day_planner.regenerate_activity(trip, itinerary, day, activity)
+    except LLM_BUSY_ERRORS as e:
+        print(f"Error regenerating itinerary: {e}")
+        return jsonify({"error": "The itinerary service is busy. Please try again shortly."}), 503
+    except (DayPlanError, ValueError, openai.error.OpenAIError) as e:
+        print(f"Error regenerating itinerary: {e}")
+        return jsonify({"error": "Unable to regenerate the itinerary."}), 502
+
+    # FPDF writes whole documents, so the PDF is rebuilt from the stored JSON; only the edited part cost an LLM call
+    with timer("pdf_build", kind="stage"):
+        pdf_bytes = build_itinerary_pdf(itinerary, trip['num_adults'], trip['num_children'])
+    if not itinerary_store.revise(saved, itinerary, pdf_bytes):
+        return jsonify({"error": "The itinerary was changed meanwhile. Please try again."}), 409
+
+    saved = itinerary_store.get(itinerary_id, current_user.id)
+    return jsonify({
+        "id": saved.id,
+        "revision": saved.revision,
+        "pdf_url": url_for('saved_itinerary_pdf', itinerary_id=saved.id, action='view'),
+    })
+
+
+def batch_trip(spec):
+    # A trip draft from one batch spec, its cities matched to airports like the wizard does; ValueError says what's wrong
+    missing = [field for field in ("start_date", "end_date", "departure_city", "arrival_city") if not spec.get(field)]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}.")
+    try:
+        start_date = date.fromisoformat(str(spec['start_date']))
+        end_date = date.fromisoformat(str(spec['end_date']))
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD.")
+    if end_date < start_date:
+        raise ValueError("end_date is before start_date.")
+    try:
+        num_adults = int(spec.get('num_adults') or 1)
+        num_children = int(spec.get('num_children') or 0)
+    except (TypeError, ValueError):
+        raise ValueError("num_adults and num_children must be numbers.")
+
+    transport_mode = spec.get('transport_mode', "No")
+    flight_needed = "Yes" if transport_mode == "Flight" else "No"
+    departure_place = airports.resolve(str(spec['departure_city']))
+    arrival_place = airports.resolve(str(spec['arrival_city']))
+    if flight_needed == "Yes" and (departure_place is None or arrival_place is None):
+        raise ValueError("Unknown city or airport.")
+    return dict(start_date=start_date.isoformat(), end_date=end_date.isoformat(),
+                departure_city=departure_place.city if departure_place else spec['departure_city'],
+                arrival_city=arrival_place.city if arrival_place else spec['arrival_city'],
+                departure_codes=departure_place.codes if departure_place else [],
+                arrival_codes=arrival_place.codes if arrival_place else [],
+                num_adults=str(num_adults), num_children=str(num_children),
+                flight_needed=flight_needed, car_needed="Yes" if transport_mode == "Car" else "No",
+                hotel_stars=str(spec.get('hotel_stars') or 2), budget=spec.get('budget') or "default",
+                keywords=spec.get('keywords') or "", departing_flight={}, returning_flight={}, hotel={})
+
+
+def batch_leg_records(params_list):
+    # leg_records on the batch pool; the leg fails only if every one of its searches failed
+    records, errors = [], []
+    for future in batch_searcher.prefetch(params_list):
+        try:
+            records.extend(future.result() or [])
+        except Exception as e:
+            errors.append(e)
+    if errors and len(errors) == len(params_list):
+        raise errors[0]
+    return records
+
+
+def plan_batch_trip(index, spec, progress, output_dir, user_id=None):
+    """One trip of a batch, as the wizard would plan it with the best
+    picks for its budget: the searches, the top flight and hotel package
+    (or hotel, without flights), then the itinerary, written as a PDF to
+    output_dir and saved to the user's history."""
+    trip = batch_trip(spec)
+
+    progress("search")
+    legs = ["hotels", "outbound", "return"] if trip['flight_needed'] == "Yes" else ["hotels"]
+    records = {leg: batch_leg_records(trip_search_params(trip, leg)) for leg in legs}
+
+    progress("select")
+    nights = max((date.fromisoformat(trip['end_date']) - date.fromisoformat(trip['start_date'])).days, 1)
+    travelers = int(trip['num_adults']) + int(trip['num_children'])
+    if trip['flight_needed'] == "Yes":
+        with timer("optimizer", kind="stage"):
+            best = TripOptimizer(records["outbound"], records["return"], records["hotels"], nights, travelers).best(
+                1, budget=trip['budget'])
+        if not best:
+            raise LookupError("No flight and hotel package found.")
+        trip.update(departing_flight=best[0]["outbound"].to_dict(), returning_flight=best[0]["returning"].to_dict(),
+                    hotel=hotel_choice(best[0]["hotel"]))
+        total_cost = best[0]["total_cost"]
+    else:
+        hotels = best_hotels(records["hotels"], 1, budget=trip['budget'])
+        if not hotels:
+            raise LookupError("No hotel found.")
+        trip.update(hotel=hotel_choice(hotels[0]))
+        total_cost = round(hotels[0].nightly_rate * nights, 2)
+
+    # Same trip, same PDF: reuse a saved or cached itinerary before spending an LLM call
+    progress("itinerary")
+    trip_key = trip_fingerprint(trip)
+    with app.app_context():
+        saved = itinerary_store.find(user_id, trip_key) if user_id else None
+        itinerary_id = saved.id if saved else None
+        pdf_bytes = saved.pdf if saved else pdf_cache.get(trip_key)
+        if pdf_bytes is None:
+            batch_llm_limiter.acquire()
+            pdf_content = itinerary_content(trip)
+            with timer("pdf_build", kind="stage"):
+                pdf_bytes = build_itinerary_pdf(pdf_content, trip['num_adults'], trip['num_children'])
+            pdf_cache.put(trip_key, pdf_bytes)
+            itinerary_id = save_itinerary(user_id, None, trip, trip_key, pdf_content, pdf_bytes)
+
+    progress("pdf")
+    path = os.path.join(output_dir, pdf_filename(index, spec.get('ref') or index + 1))
+    with open(path, "wb") as f:
+        f.write(pdf_bytes)
+    return {"pdf": path, "itinerary_id": itinerary_id, "trip_key": trip_key, "total_cost": total_cost,
+            "departing_flight": trip['departing_flight'], "returning_flight": trip['returning_flight'],
+            "hotel": trip['hotel']}
+
+
+def run_batch(specs, output_dir, user_id=None, concurrency=None):
+    # Events for a batch of trip specs as they happen; see BatchRunner
+    os.makedirs(output_dir, exist_ok=True)
+    runner = BatchRunner(lambda index, spec, progress: plan_batch_trip(index, spec, progress, output_dir, user_id),
+                         max_workers=concurrency or app.config['BATCH_CONCURRENCY'])
+    return runner.run(specs)
+
+
+@app.route('/api/batch', methods=['POST'])
+@login_required
+def batch_itineraries():
+    # Plan a JSON list, NDJSON or CSV of trips in one call, streaming an NDJSON line per stage and per finished trip
+    fmt = {"text/csv": "csv", "application/x-ndjson": "ndjson"}.get(request.mimetype, "json")
+    try:
+        specs = read_trip_specs(request.get_data(as_text=True), fmt)
+    except (ValueError, csv.Error) as e:
+        return jsonify({"error": f"Invalid trip list: {e}"}), 400
+    if not specs:
+        return jsonify({"error": "No trips given."}), 400
+    if len(specs) > app.config['BATCH_MAX_TRIPS']:
+        return jsonify({"error": f"At most {app.config['BATCH_MAX_TRIPS']} trips per batch."}), 400
+
+    batch_id = uuid.uuid4().hex
+    output_dir = os.path.join(app.config['BATCH_OUTPUT_DIR'], batch_id)
+    user_id = current_user.id
+
+    def generate():
+        yield json.dumps({"event": "batch", "batch_id": batch_id, "trips": len(specs)}) + "\n"
+        for event in run_batch(specs, output_dir, user_id):
+            if event.get("itinerary_id"):
+                event["pdf_url"] = url_for('saved_itinerary_pdf', itinerary_id=event["itinerary_id"])
+            yield json.dumps(event) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let a reverse proxy buffer the stream
+    return response
+
+
+@app.cli.command("plan-batch")
+@click.argument("trips", type=click.File("r"))
+@click.option("--output-dir", default="batch_output", show_default=True, help="Folder the PDFs are written to.")
+@click.option("--concurrency", type=int, help="Trips planned at once (default BATCH_CONCURRENCY).")
+@click.option("--user", "email", help="Also save the itineraries to this user's trip history.")
+def plan_batch_command(trips, output_dir, concurrency, email):
+    """Plan every trip in TRIPS, a JSON list, a .ndjson/.jsonl file or a
+    .csv file ("-" reads stdin), printing NDJSON progress. Exits 1 if any
+    trip failed."""
+    fmt = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(os.path.splitext(trips.name)[1], "json")
+    specs = read_trip_specs(trips.read(), fmt)
+    user_id = None
+    if email:
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            raise click.BadParameter(f"No user with email {email}.", param_hint="--user")
+        user_id = user.id
+
+    failed = 0
+    for event in run_batch(specs, output_dir, user_id, concurrency):
+        click.echo(json.dumps(event))
+        failed += event["event"] == "failed"
+    if failed:
+        raise SystemExit(1)
+
+
 @app.route('/logout')
 @login_required
 def logout():
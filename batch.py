@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+
+def read_trip_specs(text, fmt="json"):
+    """Trip specs from a batch body or file: a JSON list (or an object with
+    a "trips" list), NDJSON with one trip object per line, or CSV with a
+    header row. Fields are named like the trip draft (start_date,
+    departure_city, num_adults, ...) plus transport_mode and an optional
+    ref; empty CSV cells and blank NDJSON lines are left out. Raises
+    ValueError naming the first NDJSON line that isn't a trip object."""
+    if fmt == "csv":
+        rows = csv.DictReader(io.StringIO(text))
+        return [{field.strip(): value.strip() for field, value in row.items() if field and value and value.strip()}
+                for row in rows]
+    if fmt == "ndjson":
+        specs = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                spec = json.loads(line)
+            except ValueError:
+                spec = None
+            if not isinstance(spec, dict):
+                raise ValueError(f"Line {number} is not a trip object.")
+            specs.append(spec)
+        return specs
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("trips")
+    if not isinstance(data, list) or not all(isinstance(spec, dict) for spec in data):
+        raise ValueError("Expected a list of trip objects.")
+    return data
+
+
+def pdf_filename(index, ref):
+    # Numbered so trips with the same ref don't overwrite each other
+    return f"{index + 1:03d}-{secure_filename(str(ref)) or 'trip'}.pdf"
+
+
+class BatchRunner:
+    """Plans a batch of trips, max_workers at a time, and yields an event
+    dict per stage and per finished trip in the order they happen.
+
+    plan(index, spec, progress) does the work for one spec, calling
+    progress(stage) as it enters each stage, and returns the trip's result
+    fields. A trip that raises is reported as failed with the stage it
+    reached; the rest of the batch carries on."""
+
+    def __init__(self, plan, max_workers=4):
+        self._plan = plan
+        self.max_workers = max_workers
+
+    def run(self, specs):
+        events = queue.Queue()
+        started = time.perf_counter()
+
+        def work(index, spec):
+            ref = spec.get("ref") or str(index + 1)
+            stage = ["input"]
+            trip_started = time.perf_counter()
+
+            def progress(name):
+                stage[0] = name
+                events.put({"event": "progress", "index": index, "ref": ref, "stage": name})
+
+            try:
+                result = self._plan(index, spec, progress)
+            except Exception as e:
+                events.put({"event": "failed", "index": index, "ref": ref, "stage": stage[0], "error": str(e),
+                            "seconds": round(time.perf_counter() - trip_started, 3)})
+            else:
+                events.put(dict(result, event="done", index=index, ref=ref,
+                                seconds=round(time.perf_counter() - trip_started, 3)))
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch")
+        try:
+            for index, spec in enumerate(specs):
+                pool.submit(work, index, spec)
+            finished = failed = 0
+            while finished < len(specs):
+                event = events.get()
+                if event["event"] != "progress":
+                    finished += 1
+                    failed += event["event"] == "failed"
+                yield event
+            yield {"event": "summary", "trips": len(specs), "done": finished - failed, "failed": failed,
+                   "seconds": round(time.perf_counter() - started, 3)}
+        finally:
+            # A reader that stops early (client gone) cancels the trips not started yet
+            pool.shutdown(wait=False, cancel_futures=True)
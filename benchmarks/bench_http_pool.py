@@ -0,0 +1,87 @@
+"""Compare the shared keep-alive pool with a new connection per call.
+
+Sends the same SerpAPI-shaped searches to the local mock upstream through
+the app's SerpApiProvider twice, once over an HttpPool and once with a
+fresh session per search (what serpapi's GoogleSearch did), and prints
+latency percentiles, connections opened and the pool's stats as JSON.
+The mock speaks plain HTTP, so the savings shown leave out TLS handshakes.
+
+    python benchmarks/bench_http_pool.py --requests 200 --concurrency 8 --pool-size 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from http_pool import HttpPool  # noqa: E402
+from mock_upstream import MockUpstream  # noqa: E402
+from search_providers import SerpApiProvider, flight_search_params  # noqa: E402
+
+
+class FreshConnections:
+    # Stand-in for HttpPool that opens and closes a connection for every call
+    def get(self, url, **kwargs):
+        pool = HttpPool(pool_size=1)
+        try:
+            return pool.get(url, **kwargs)
+        finally:
+            pool.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def run(http, upstream, count, concurrency):
+    provider = SerpApiProvider("benchmark", http, upstream.url)
+    searches = [flight_search_params("JFK", "LAX", f"2030-01-{i % 28 + 1:02d}", 1, 0) for i in range(count)]
+    before = upstream.stats()
+
+    def search(params):
+        start = time.perf_counter()
+        provider.search(params)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(search, searches))
+    elapsed = time.perf_counter() - start
+    after = upstream.stats()
+    return {
+        "requests_per_second": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "connections": after["connections"] - before["connections"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005, help="mock upstream seconds per response")
+    args = parser.parse_args()
+
+    upstream = MockUpstream(latency=args.latency).start()
+    http_pool = HttpPool(pool_size=args.pool_size)
+    try:
+        report = {
+            "fresh_connections": run(FreshConnections(), upstream, args.requests, args.concurrency),
+            "pooled": run(http_pool, upstream, args.requests, args.concurrency),
+            "pool_stats": http_pool.stats(),
+        }
+    finally:
+        http_pool.close()
+        upstream.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
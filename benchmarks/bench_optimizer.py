@@ -0,0 +1,89 @@
+"""Time the trip package optimizer on synthetic search results.
+
+For each size, builds that many outbound flights, return flights and
+hotels with the synthetic search provider, runs TripOptimizer.best() and
+prints a JSON report with the p50 time, the candidate packages left after
+pruning and the size of the Pareto front. --verify also checks the front
+against a brute-force pass over every combination (slow past ~40 options).
+
+    python benchmarks/bench_optimizer.py --sizes 100,300,500 --repeats 20
+    python benchmarks/bench_optimizer.py --sizes 20,30 --verify
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_providers import SyntheticProvider, flight_search_params, hotel_search_params, project_results  # noqa: E402
+from trip_optimizer import TripOptimizer, pareto_front  # noqa: E402
+
+NIGHTS = 3
+TRAVELERS = 2
+
+
+def search_results(size):
+    provider = SyntheticProvider(num_flights=size, num_hotels=size)
+    outbound = flight_search_params("JFK", "ORD", "2030-06-10", TRAVELERS, 0)
+    returning = flight_search_params("ORD", "JFK", "2030-06-13", TRAVELERS, 0)
+    hotels = hotel_search_params("Chicago", "2030-06-10", "2030-06-13", TRAVELERS, 3)
+    return [project_results(params, provider.search(params)) for params in (outbound, returning, hotels)]
+
+
+def brute_force_front(outbound, returning, hotels):
+    # (cost, rating, hours) of every non-dominated package, one combination at a time
+    packages = []
+    for out in outbound:
+        for back in returning:
+            hours = (datetime.fromisoformat(back.departure_time) - datetime.fromisoformat(out.arrival_time)).total_seconds() / 3600
+            if hours <= 0:
+                continue
+            for hotel in hotels:
+                if hotel.rating is not None and hotel.nightly_rate is not None:
+                    cost = (out.price + back.price) * TRAVELERS + hotel.nightly_rate * NIGHTS
+                    packages.append((cost, hotel.rating, hours))
+    front = {package for package in packages
+             if not any(other != package and other[0] <= package[0] and other[1] >= package[1] and other[2] >= package[2]
+                        for other in packages)}
+    return {(round(cost, 2), rating, round(hours, 2)) for cost, rating, hours in front}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,300,500", help="comma-separated options per leg")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--verify", action="store_true", help="compare the front with a brute-force search")
+    args = parser.parse_args()
+
+    report = {}
+    for size in (int(size) for size in args.sizes.split(",")):
+        outbound, returning, hotels = search_results(size)
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            optimizer = TripOptimizer(outbound, returning, hotels, NIGHTS, TRAVELERS)
+            optimizer.best(5, budget="medium")
+            timings.append(time.perf_counter() - start)
+
+        _, _, _, cost, rating, hours = optimizer.candidates()
+        front = pareto_front(cost, rating, hours)
+        result = {
+            "combinations": len(outbound) * len(returning) * len(hotels),
+            "candidates_after_pruning": len(cost),
+            "pareto_front": len(front),
+            "p50_ms": round(statistics.median(timings) * 1000, 3),
+        }
+        if args.verify:
+            found = {(round(float(cost[i]), 2), float(rating[i]), round(float(hours[i]), 2)) for i in front}
+            result["matches_brute_force"] = found == brute_force_front(outbound, returning, hotels)
+        report[size] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
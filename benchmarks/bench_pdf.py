@@ -0,0 +1,183 @@
+"""Compare itinerary PDF rendering: itinerary_pdf.ItineraryRenderer (with
+the bundled Unicode fonts, and with the core-font fallback) against the
+FPDF code app.py used before it, on itineraries of several lengths.
+
+    python benchmarks/bench_pdf.py --days 3,7,21 --repeats 20 --unicode
+
+The old code path cannot encode characters outside Latin-1, so the
+Unicode sample (--unicode) is only rendered by the new one.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from fpdf import FPDF
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from itinerary_pdf import ItineraryRenderer  # noqa: E402
+from llm import StubGenerator  # noqa: E402
+
+FONT_DIR = os.path.join(ROOT, "data", "fonts")
+UNICODE_PLACES = ["Café Zürich", "Sushi Dai 築地", "Ωmega Bar", "“Le Petit” Bistro — Paris", "Ресторан Пушкин"]
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def legacy_build_itinerary_pdf(pdf_content, num_adults, num_children):
+    # The FPDF build app.py used before itinerary_pdf.py, kept as the baseline
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    # # Add Header Section
+    header = pdf_content['header']
+    pdf.set_font("Arial", style='B', size=14)
+    pdf.cell(0, 10, "Travel Itinerary", ln=True, align='C')
+    pdf.ln(10)
+
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, f"Departure City: {header['departure_city']}", ln=True)
+    pdf.cell(0, 10, f"Arrival City: {header['arrival_city']}", ln=True)
+    pdf.cell(0, 10, f"Number of Adults: {num_adults}", ln=True)
+    pdf.cell(0, 10, f"Number of Children: {num_children}", ln=True)
+    pdf.cell(0, 10, f"Travel Dates: From {header['start_date']} to {header['end_date']}", ln=True)
+    pdf.ln(5)
+
+    total_price = 0
+    # Add Car Rental Info
+    car_rental = header.get('car_rental_info', {})
+    if car_rental:
+        pdf.set_font("Arial", style='B', size=12)
+        pdf.cell(0, 10, "Car Rental Information:", ln=True)
+        pdf.set_font("Arial", size=12)
+        pdf.cell(0, 10, f"  Company: {car_rental.get('company', 'N/A')}", ln=True)
+        pdf.cell(0, 10, f"  Car Type: {car_rental.get('car_type', 'N/A')}", ln=True)
+        pdf.cell(0, 10, f"  Pickup Location: {car_rental.get('pick_up_location', 'N/A')}", ln=True)
+        pdf.cell(0, 10, f"  Pickup Time: {car_rental.get('pick_up_time', 'N/A')}", ln=True)
+        pdf.cell(0, 10, f"  Return Location: {car_rental.get('return_location', 'N/A')}", ln=True)
+        pdf.cell(0, 10, f"  Return Time: {car_rental.get('return_time', 'N/A')}", ln=True)
+        pdf.cell(0, 10, f"  Total Price: ${car_rental.get('total_price', 'N/A')}", ln=True)
+        pdf.ln(10)
+        price = int(car_rental.get('total_price', '0'))
+        total_price += price
+
+    content_list = pdf_content.get('content', [])
+
+    if content_list:
+        pdf.set_font("Arial", style='B', size=12)
+        pdf.cell(0, 10, "Schedule:", ln=True)
+        curr_date = ""
+        for content in content_list:
+            if isinstance(content, dict):  # Check if content is a dictionary
+                if content.get('price', '0') == "":
+                    price = 0
+                else: 
+                    price = int(content.get('price', '0'))
+                total_price += price
+                # Parse the time
+                date_obj = datetime.fromisoformat(content["time_stamp"])
+                time_formatted = date_obj.strftime("%I:%M %p")  # e.g., 10:00 AM
+                date_formatted = date_obj.strftime("%A %Y-%m-%d")  # e.g., Saturday 2024-12-14
+
+                # Add the date header if the date changes
+                if date_formatted != curr_date:
+                    if curr_date is not None:
+                        pdf.ln(5)  # Add spacing before a new date header
+                    pdf.set_font("Arial", "B", 12)  # Bold font for the date header
+                    pdf.cell(0, 10, date_formatted, border=1, ln=1, align="C")  # Full-width date header
+                    curr_date = date_formatted
+
+                # Add a row for the time and details
+                pdf.set_font("Arial", size=12)  # Regular font for time and details
+
+                # Define column widths
+                time_column_width = 40  # Fixed width for the time column
+                details_column_width = pdf.w - time_column_width - 20  # Remaining width for the details column (accounting for margins)
+
+                # Time column
+                pdf.cell(time_column_width, 10, time_formatted, border=0, ln=0, align='C')
+
+                # Details column
+                details = (
+                    f"{content.get('place', 'N/A')}\n"
+                    f"{content.get('location', 'N/A')}\n"
+                    f"{content.get('description', 'N/A')}\n"
+                    f"Price: ${content.get('price', 'N/A')}"
+                )
+                pdf.multi_cell(details_column_width, 10, details, border=1, align='L')
+
+            elif isinstance(content, str):  # Handle string content
+                pdf.set_font("Arial", size=12)
+                pdf.multi_cell(0, 10, f"  Note: {content}")
+                pdf.ln(5)
+    else:
+        pdf.set_font("Arial", style='B', size=12)
+        pdf.cell(0, 10, "No destination information available.", ln=True)
+
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, f"  Total Price: ${total_price}", ln=True, align='C')
+    pdf.ln(10)
+
+    return pdf.output(dest='S').encode('latin1')
+
+
+def sample_itinerary(days, unicode=False):
+    trip = {"start_date": "2025-06-01", "end_date": f"2025-06-{days:02d}",
+            "departure_city": "Austin", "arrival_city": "Chicago", "car_needed": "Yes"}
+    content = StubGenerator().build(trip)
+    if unicode:
+        for i, entry in enumerate(content["content"]):
+            entry["place"] = UNICODE_PLACES[i % len(UNICODE_PLACES)]
+    return content
+
+
+def measure(render, content, repeats):
+    render(content, 2, 1)  # Warm up: font metrics and subsets are cached after the first document
+    timings = []
+    size = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        size = len(render(content, 2, 1))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {"p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "pdf_bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", default="3,7,21", help="itinerary lengths to render")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--unicode", action="store_true", help="also render a sample with non-Latin-1 place names")
+    args = parser.parse_args()
+
+    renderers = {
+        "legacy": legacy_build_itinerary_pdf,
+        "renderer_unicode": ItineraryRenderer(FONT_DIR).render,
+        "renderer_core_font": ItineraryRenderer(os.path.join(ROOT, "no-fonts")).render,
+    }
+    report = {}
+    for days in [int(d) for d in args.days.split(",")]:
+        content = sample_itinerary(days)
+        results = {name: measure(render, content, args.repeats) for name, render in renderers.items()}
+        if args.unicode:
+            results["renderer_unicode_text"] = measure(renderers["renderer_unicode"], sample_itinerary(days, True), args.repeats)
+        results["activities"] = len(content["content"])
+        results["speedup"] = round(results["legacy"]["p50_ms"] / results["renderer_unicode"]["p50_ms"], 2)
+        report[f"{days}_days"] = results
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Compare the full and compact itinerary prompt modes on a fixed set of trips.
+
+Generates the same itineraries in both ITINERARY_PROMPT_MODE settings
+through the app's itinerary_content() and prints a JSON report per mode:
+LLM requests, prompt and completion tokens, generation time, and what
+came back (days covered, activities, description length), plus the
+compact/full ratios. Trips of ITINERARY_PER_DAY_MIN_DAYS days or more go
+through the per-day prompts, the rest through the single prompt; the day
+plan cache is off so every day is generated.
+
+By default the OpenAI code path runs against benchmarks/mock_upstream.py,
+which reports token usage and can spend --token-latency seconds per
+completion token like a model would. --backend openai uses the real API
+(OPENAI_API_KEY); --backend stub stays in process, with estimated tokens.
+
+    python benchmarks/bench_prompt_modes.py --token-latency 0.002
+    python benchmarks/bench_prompt_modes.py --backend openai --repeats 1
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compact_prompt import system_prompt  # noqa: E402
+from day_planner import entry_days, trip_days  # noqa: E402
+from llm import estimate_tokens  # noqa: E402
+from mock_upstream import MockUpstream  # noqa: E402
+
+FLIGHT_OUT = {"price": 212, "flight_number": "UA 1432", "departure_airport": "Chicago O'Hare International Airport",
+              "departure_time": "{start} 08:05", "arrival_airport": "Austin-Bergstrom International Airport",
+              "arrival_time": "{start} 11:10", "duration": 185}
+FLIGHT_BACK = {"price": 198, "flight_number": "UA 2210", "departure_airport": "Austin-Bergstrom International Airport",
+               "departure_time": "{end} 17:40", "arrival_airport": "Chicago O'Hare International Airport",
+               "arrival_time": "{end} 20:45", "duration": 185}
+
+# The benchmark set: (departure, arrival, start, end, adults, children, flight, car, budget, keywords, hotel)
+TRIPS = [
+    ("Chicago", "Austin", "2030-04-10", "2030-04-12", 2, 0, True, False, "low", "food, music",
+     {"name": "South Congress Hotel", "price_per_night": "$189", "rating": 4.5}),
+    ("New York", "Chicago", "2030-05-03", "2030-05-04", 1, 0, True, False, "high", "architecture",
+     {"name": "The Langham", "price_per_night": "$420", "rating": 4.8}),
+    ("Boston", "Montreal", "2030-06-14", "2030-06-17", 2, 2, False, True, "medium", "museums, parks",
+     {"name": "Hotel Le Germain", "price_per_night": "$230", "rating": 4.6}),
+    ("Seattle", "San Francisco", "2030-07-01", "2030-07-07", 2, 0, True, False, "medium", "food, hiking, art",
+     {"name": "Hotel Zephyr", "price_per_night": "$210", "rating": 4.3}),
+    ("Denver", "Los Angeles", "2030-08-20", "2030-08-25", 4, 0, True, False, "low", "beaches, nightlife",
+     {"name": "Freehand Los Angeles", "price_per_night": "$140", "rating": 4.2}),
+    ("Atlanta", "New Orleans", "2030-10-09", "2030-10-11", 2, 1, False, True, "high", "jazz, history",
+     {"name": "Hotel Monteleone", "price_per_night": "$310", "rating": 4.7}),
+]
+
+
+def benchmark_trips():
+    trips = []
+    for departure, arrival, start, end, adults, children, flight, car, budget, keywords, hotel in TRIPS:
+        out = {key: value.format(start=start) if isinstance(value, str) else value for key, value in FLIGHT_OUT.items()}
+        back = {key: value.format(end=end) if isinstance(value, str) else value for key, value in FLIGHT_BACK.items()}
+        trips.append({
+            "start_date": start, "end_date": end, "departure_city": departure, "arrival_city": arrival,
+            "num_adults": str(adults), "num_children": str(children),
+            "flight_needed": "Yes" if flight else "No", "car_needed": "Yes" if car else "No",
+            "hotel_stars": "3", "budget": budget, "keywords": keywords,
+            "departing_flight": out if flight else {}, "returning_flight": back if flight else {}, "hotel": hotel,
+        })
+    return trips
+
+
+def run_mode(wizard, mode, trips, repeats):
+    wizard.app.config['ITINERARY_PROMPT_MODE'] = mode
+    before = len(wizard.token_ledger.recent())
+    itinerary_seconds, days_covered, activities, description_words = [], 0, 0, []
+    for _ in range(repeats):
+        for trip in trips:
+            start = time.perf_counter()
+            content = wizard.itinerary_content(trip)
+            itinerary_seconds.append(time.perf_counter() - start)
+            days = {day for day, entry in entry_days(content["content"]) if isinstance(entry, dict)}
+            days_covered += len(days & set(trip_days(trip)))
+            entries = [entry for entry in content["content"] if isinstance(entry, dict)]
+            activities += len(entries)
+            description_words += [len(str(entry.get("description") or "").split()) for entry in entries]
+    requests = wizard.token_ledger.recent()[before:]
+    itineraries = len(trips) * repeats
+    return {
+        "itineraries": itineraries,
+        "llm_requests": len(requests),
+        "prompt_tokens": sum(request["prompt_tokens"] for request in requests),
+        "completion_tokens": sum(request["completion_tokens"] for request in requests),
+        "tokens_estimated": any(request["estimated"] for request in requests),
+        "generation_seconds": round(sum(request["seconds"] for request in requests), 3),
+        "seconds_per_itinerary": round(sum(itinerary_seconds) / itineraries, 3),
+        "days_covered": f"{days_covered}/{sum(len(trip_days(trip)) for trip in trips) * repeats}",
+        "activities": activities,
+        "mean_description_words": round(sum(description_words) / max(len(description_words), 1), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("mock", "openai", "stub"), default="mock")
+    parser.add_argument("--repeats", type=int, default=2, help="times each trip is generated per mode")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="mock seconds per completion token")
+    parser.add_argument("--description-words", type=int, default=15, help="COMPACT_DESCRIPTION_WORDS")
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time, so point it at the backend first
+    work_dir = tempfile.mkdtemp(prefix="prompt-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+    os.environ.setdefault("PDF_CACHE_DIR", os.path.join(work_dir, "pdf_cache"))
+    os.environ.setdefault("STATIC_BUILD_DIR", os.path.join(work_dir, "static_build"))
+    os.environ.setdefault("BATCH_OUTPUT_DIR", os.path.join(work_dir, "batches"))
+    os.environ.setdefault("SEARCH_PROVIDER", "synthetic")
+    os.environ["DAY_PLAN_CACHE_SIZE"] = "0"
+    os.environ["COMPACT_DESCRIPTION_WORDS"] = str(args.description_words)
+    upstream = None
+    if args.backend == "mock":
+        upstream = MockUpstream(token_latency=args.token_latency).start()
+        os.environ.update(ITINERARY_LLM_BACKEND="openai", OPENAI_API_BASE=f"{upstream.url}/v1", OPENAI_API_KEY="mock")
+    else:
+        os.environ["ITINERARY_LLM_BACKEND"] = args.backend
+
+    import app as wizard
+
+    trips = benchmark_trips()
+    try:
+        report = {mode: run_mode(wizard, mode, trips, args.repeats) for mode in ("full", "compact")}
+    finally:
+        if upstream is not None:
+            upstream.stop()
+    full, compact = report["full"], report["compact"]
+    # Sent with every compact request but identical each time, so providers with prompt caching bill it cheaply
+    compact["static_prefix_tokens"] = estimate_tokens(system_prompt(args.description_words))
+    report["compact_vs_full"] = {
+        field: round(compact[field] / full[field], 3) if full[field] else None
+        for field in ("prompt_tokens", "completion_tokens", "generation_seconds", "seconds_per_itinerary")
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
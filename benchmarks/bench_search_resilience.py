@@ -0,0 +1,156 @@
+"""Exercise the search tail-latency protection against the mock upstream.
+
+Runs three scenarios through the app's SerpApiProvider and SearchCache,
+with faults injected into benchmarks/mock_upstream.py, and prints a JSON
+report:
+
+  hedging  - latency percentiles with and without HedgedProvider when a
+             fraction of responses are slow outliers
+  breaker  - how long searches take while the upstream is down, before
+             and after the circuit breaker opens, and its recovery
+  stale    - how long an expired search takes to answer while it is
+             refreshed in the background, and while the upstream fails
+
+    python benchmarks/bench_search_resilience.py --searches 300 --slow-rate 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from http_pool import HttpPool  # noqa: E402
+from mock_upstream import MockUpstream  # noqa: E402
+from prefetch import SearchPrefetcher  # noqa: E402
+from resilience import CircuitBreaker, CircuitOpenError  # noqa: E402
+from search_cache import SearchCache  # noqa: E402
+from search_providers import CircuitBreakerProvider, HedgedProvider, SerpApiProvider, hotel_search_params  # noqa: E402
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def summary(latencies):
+    return {name: round(percentile(latencies, fraction) * 1000, 1)
+            for name, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99))}
+
+
+def search_params(i):
+    return hotel_search_params(f"City {i}", "2030-01-10", "2030-01-12", 2, 3)
+
+
+def timed_search(provider, params):
+    start = time.perf_counter()
+    provider.search(params)
+    return time.perf_counter() - start
+
+
+def hedging(upstream, http, args):
+    upstream.set_faults(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency, fail_rate=0)
+    plain = SerpApiProvider("benchmark", http, upstream.url)
+    hedged = HedgedProvider(plain, percentile=args.hedge_percentile, min_samples=20)
+    report = {}
+    for name, provider in (("plain", plain), ("hedged", hedged)):
+        before = upstream.stats()["requests"]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            latencies = list(pool.map(lambda i: timed_search(provider, search_params(i)), range(args.searches)))
+        report[name] = dict(summary(latencies), upstream_calls=upstream.stats()["requests"] - before)
+    report["hedged"].update(hedged.stats())
+    return report
+
+
+def breaker(upstream, http, args):
+    upstream.set_faults(latency=args.latency, slow_rate=0, fail_rate=1)
+    circuit = CircuitBreaker(failure_threshold=5, reset_timeout=0.5)
+    provider = CircuitBreakerProvider(SerpApiProvider("benchmark", http, upstream.url), circuit)
+    calls = []
+    for i in range(20):
+        start = time.perf_counter()
+        try:
+            provider.search(search_params(i))
+            outcome = "ok"
+        except CircuitOpenError:
+            outcome = "rejected"
+        except Exception:
+            outcome = "failed"
+        calls.append((outcome, time.perf_counter() - start))
+
+    upstream.set_faults(fail_rate=0)
+    time.sleep(circuit.reset_timeout)
+    provider.search(search_params(0))  # The trial call closes the breaker again
+    failed = [seconds for outcome, seconds in calls if outcome == "failed"]
+    rejected = [seconds for outcome, seconds in calls if outcome == "rejected"]
+    return {
+        "failed_calls": len(failed),
+        "failed_mean_ms": round(sum(failed) / len(failed) * 1000, 2) if failed else None,
+        "rejected_calls": len(rejected),
+        "rejected_mean_ms": round(sum(rejected) / len(rejected) * 1000, 3) if rejected else None,
+        "state_after_recovery": circuit.stats()["state"],
+    }
+
+
+def stale(upstream, http, args):
+    upstream.set_faults(latency=args.latency, slow_rate=0, fail_rate=0)
+    provider = SerpApiProvider("benchmark", http, upstream.url)
+    cache = SearchCache(ttls={"google_hotels": 0.2}, stale_ttl=60)
+
+    def refresh(params):
+        cache.set(params, provider.search(params))
+
+    refresher = SearchPrefetcher(refresh, max_workers=1)
+    params = search_params(0)
+    cache.get_or_fetch(params, provider.search)
+    time.sleep(0.25)
+
+    upstream.set_faults(latency=args.slow_latency)
+    start = time.perf_counter()
+    cache.get_or_fetch(params, provider.search, refresh=lambda params: refresher.prefetch([params]))
+    served_stale = time.perf_counter() - start
+    time.sleep(args.slow_latency + 0.1)
+    refreshed = cache.is_fresh(params)
+
+    time.sleep(0.25)
+    upstream.set_faults(latency=args.latency, fail_rate=1)
+    start = time.perf_counter()
+    cache.get_or_fetch(params, provider.search)
+    served_on_error = time.perf_counter() - start
+    return {
+        "stale_while_refreshing_ms": round(served_stale * 1000, 2),
+        "refreshed_in_background": refreshed,
+        "stale_on_upstream_error_ms": round(served_on_error * 1000, 2),
+        "stale_hits": cache.stats()["stale_hits"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="usual upstream seconds per search")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="fraction of searches that are slow outliers")
+    parser.add_argument("--slow-latency", type=float, default=0.5)
+    parser.add_argument("--hedge-percentile", type=float, default=90)
+    args = parser.parse_args()
+
+    upstream = MockUpstream().start()
+    http = HttpPool(pool_size=args.concurrency * 2, read_timeout=5)
+    try:
+        report = {
+            "hedging": hedging(upstream, http, args),
+            "breaker": breaker(upstream, http, args),
+            "stale": stale(upstream, http, args),
+        }
+    finally:
+        http.close()
+        upstream.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
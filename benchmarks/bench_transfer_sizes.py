@@ -0,0 +1,154 @@
+"""Measure the bytes each page of the wizard sends, with and without
+static fingerprinting and response compression.
+
+Walks sign_in -> trip_input -> confirmation -> departure -> arrival ->
+hotel -> itinerary -> generate-itinerary -> trips through Flask's test
+client twice, once with STATIC_FINGERPRINT and COMPRESS_RESPONSES off
+("before") and once with both on ("after"), as a browser that accepts
+gzip/br and keeps a cache: the stylesheets, scripts and images a page
+links to are fetched the first time, then either reused (fresh by
+Cache-Control) or revalidated. Each mode runs the flow for a first visit
+and again for a repeat visit. Bytes are response bodies as sent; headers
+are not counted.
+
+    python benchmarks/bench_transfer_sizes.py
+    python benchmarks/bench_transfer_sizes.py --output sizes.json
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_wizard import EMAIL, PASSWORD, TRIP, ensure_user, form_value, wizard  # noqa: E402
+from static_assets import brotli  # noqa: E402
+
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+ASSET_LINKS = re.compile(r'<(?:link[^>]*\bhref|script[^>]*\bsrc|img[^>]*\bsrc)="(/static/[^"]+)"')
+
+
+def decoded(response):
+    body = response.get_data()
+    encoding = response.headers.get("Content-Encoding")
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        return brotli.decompress(body)
+    return body
+
+
+def is_fresh(cache_control):
+    # Whether a cached copy can be used without asking the server
+    if "immutable" in cache_control:
+        return True
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return bool(match and int(match.group(1)) > 0 and "no-cache" not in cache_control)
+
+
+class Browser:
+    """A test client with a browser's Accept-Encoding and HTTP cache for
+    static files. Every page fetch returns its own transfer record."""
+
+    def __init__(self, client):
+        self.client = client
+        self.cache = {}  # url -> response headers
+
+    def fetch_assets(self, html):
+        sent, requests = 0, 0
+        for url in dict.fromkeys(ASSET_LINKS.findall(html)):
+            cached = self.cache.get(url)
+            if cached and is_fresh(cached.get("Cache-Control", "")):
+                continue
+            headers = {"Accept-Encoding": ACCEPT_ENCODING}
+            if cached and cached.get("ETag"):
+                headers["If-None-Match"] = cached["ETag"]
+            if cached and cached.get("Last-Modified"):
+                headers["If-Modified-Since"] = cached["Last-Modified"]
+            response = self.client.get(url, headers=headers)
+            requests += 1
+            sent += len(response.get_data())
+            if response.status_code == 200:
+                self.cache[url] = response.headers
+        return sent, requests
+
+    def page(self, method, path, **kwargs):
+        response = self.client.open(path, method=method, headers={"Accept-Encoding": ACCEPT_ENCODING}, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        body = decoded(response)
+        record = {"status": response.status_code, "encoding": response.headers.get("Content-Encoding", "identity"),
+                  "body_bytes": len(body), "sent_bytes": len(response.get_data()),
+                  "asset_bytes": 0, "asset_requests": 0}
+        text = body.decode("utf-8", "replace")
+        if response.mimetype == "text/html":
+            record["asset_bytes"], record["asset_requests"] = self.fetch_assets(text)
+        record["total_bytes"] = record["sent_bytes"] + record["asset_bytes"]
+        return record, text
+
+
+def run_flow(browser, iteration):
+    trip = dict(TRIP, keywords=f"{TRIP['keywords']}, sizes {iteration}")
+    pages = {}
+    pages["sign_in"], _ = browser.page("GET", "/sign_in")
+    browser.page("POST", "/sign_in", data={"email": EMAIL, "password": PASSWORD})
+    pages["trip_input"], _ = browser.page("GET", "/trip_input")
+    pages["confirmation"], page = browser.page("GET", "/confirmation", query_string=trip)
+    trip_id = form_value(page, "trip_id", "hidden")
+    pages["departure"], page = browser.page("GET", "/departure", query_string={"trip_id": trip_id})
+    pages["arrival"], page = browser.page("GET", "/arrival", query_string={
+        "trip_id": trip_id, "departing_flight": form_value(page, "departing_flight")})
+    pages["hotel"], page = browser.page("GET", "/hotel", query_string={
+        "trip_id": trip_id, "returning_flight": form_value(page, "returning_flight")})
+    pages["itinerary"], _ = browser.page("GET", "/itinerary", query_string={
+        "trip_id": trip_id, "hotel": form_value(page, "hotel")})
+    pages["generate-itinerary"], _ = browser.page("GET", "/generate-itinerary",
+                                                  query_string={"trip_id": trip_id, "action": "view"})
+    pages["trips"], _ = browser.page("GET", "/trips")
+    browser.page("GET", "/logout")
+    return pages
+
+
+def totals(pages):
+    return {field: sum(page[field] for page in pages.values())
+            for field in ("body_bytes", "sent_bytes", "asset_bytes", "asset_requests", "total_bytes")}
+
+
+def run_mode(enabled, label):
+    wizard.app.config["STATIC_FINGERPRINT"] = enabled
+    wizard.app.config["COMPRESS_RESPONSES"] = enabled
+    browser = Browser(wizard.app.test_client())
+    first = run_flow(browser, f"{label}-first")
+    repeat = run_flow(browser, f"{label}-repeat")
+    return {"first_visit": {"pages": first, "total": totals(first)},
+            "repeat_visit": {"pages": repeat, "total": totals(repeat)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    wizard.app.config["WTF_CSRF_ENABLED"] = False
+    ensure_user()
+    wizard.asset_files.build()
+    report = {"accept_encoding": ACCEPT_ENCODING, "compress_min_size": wizard.app.config["COMPRESS_MIN_SIZE"],
+              "before": run_mode(False, "before"), "after": run_mode(True, "after")}
+    report["after_vs_before"] = {
+        visit: {page: round(after["total_bytes"] / before["total_bytes"], 3) if before["total_bytes"] else None
+                for page, before, after in (
+                    (page, report["before"][visit]["pages"][page], report["after"][visit]["pages"][page])
+                    for page in report["before"][visit]["pages"])}
+        for visit in ("first_visit", "repeat_visit")
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
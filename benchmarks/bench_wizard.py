@@ -0,0 +1,288 @@
+"""Benchmark the booking wizard end to end with stubbed upstreams.
+
+Runs sign_in -> trip_input -> confirmation -> departure -> arrival ->
+hotel -> itinerary -> generate-itinerary through Flask's test client and
+through a concurrent HTTP load generator, then prints a JSON report with
+per-route latency percentiles, requests/second, peak RSS and PDF build
+time by itinerary length.
+
+    python benchmarks/bench_wizard.py --iterations 20 --concurrency 8 --output bench.json
+    python benchmarks/bench_wizard.py --compare bench.json
+"""
+import argparse
+import html
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="wizard-bench-")
+
+# The app reads its configuration at import time, so point it at stubs first
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}")
+os.environ.setdefault("SEARCH_PROVIDER", "synthetic")
+os.environ.setdefault("ITINERARY_LLM_BACKEND", "stub")
+os.environ.setdefault("PDF_CACHE_DIR", os.path.join(WORK_DIR, "pdf_cache"))
+os.environ.setdefault("STATIC_BUILD_DIR", os.path.join(WORK_DIR, "static_build"))
+os.environ.setdefault("BATCH_OUTPUT_DIR", os.path.join(WORK_DIR, "batches"))
+os.environ.setdefault("PREFETCH_ENABLED", "0")
+sys.path.insert(0, ROOT)
+
+import requests  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import app as wizard  # noqa: E402
+from llm import StubGenerator  # noqa: E402
+from models import User  # noqa: E402
+
+EMAIL = "bench@example.com"
+PASSWORD = "benchmark"
+TRIP = {
+    "start-date": "2025-06-02",
+    "end-date": "2025-06-05",
+    "departure-city": "Austin",
+    "arrival-city": "Chicago",
+    "adults": "2",
+    "children": "1",
+    "transport-mode": "Flight",
+    "hotel-stars": "3",
+    "budget": "medium",
+    "keywords": "food, music",
+}
+ROUTES = ["sign_in", "trip_input", "confirmation", "departure", "arrival", "hotel",
+          "itinerary", "generate-itinerary"]
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies):
+    # latencies: route -> list of seconds
+    summary = {}
+    for route in ROUTES:
+        values = sorted(latencies.get(route, []))
+        if not values:
+            continue
+        summary[route] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+        }
+    return summary
+
+
+def form_value(page, name, input_type="radio"):
+    # First value for a field on a wizard page
+    match = re.search(rf'type="{input_type}"[^>]*name="{name}" value="([^"]*)"', page)
+    return html.unescape(match.group(1)) if match else ""
+
+
+class WizardClient:
+    """One simulated user. get/post take a path and return (status, text);
+    the adapter hides whether we talk to the test client or real HTTP."""
+
+    def __init__(self, get, post, record):
+        self.get = get
+        self.post = post
+        self.record = record
+
+    def timed(self, route, call, *args, **kwargs):
+        start = time.perf_counter()
+        status, text = call(*args, **kwargs)
+        self.record(route, time.perf_counter() - start)
+        if status >= 400:
+            raise RuntimeError(f"{route} returned {status}")
+        return text
+
+    def run_flow(self, iteration):
+        trip = dict(TRIP, keywords=f"{TRIP['keywords']}, run {iteration}")  # Unique trip, so the PDF is not cached
+        self.timed("sign_in", self.post, "/sign_in", {"email": EMAIL, "password": PASSWORD})
+        self.timed("trip_input", self.get, "/trip_input", {})
+        page = self.timed("confirmation", self.get, "/confirmation", trip)
+
+        # The wizard keeps the trip server-side; later pages only pass its id and the pick
+        trip_id = form_value(page, "trip_id", "hidden")
+        page = self.timed("departure", self.get, "/departure", {"trip_id": trip_id})
+        page = self.timed("arrival", self.get, "/arrival",
+                          {"trip_id": trip_id, "departing_flight": form_value(page, "departing_flight")})
+        page = self.timed("hotel", self.get, "/hotel",
+                          {"trip_id": trip_id, "returning_flight": form_value(page, "returning_flight")})
+        self.timed("itinerary", self.get, "/itinerary", {"trip_id": trip_id, "hotel": form_value(page, "hotel")})
+        self.timed("generate-itinerary", self.get, "/generate-itinerary", {"trip_id": trip_id, "action": "view"})
+
+def ensure_user():
+    with wizard.app.app_context():
+        if not User.query.filter_by(email=EMAIL).first():
+            wizard.db.session.add(User(username="bench", email=EMAIL,
+                                       password=generate_password_hash(PASSWORD)))
+            wizard.db.session.commit()
+
+
+def bench_test_client(iterations):
+    wizard.app.config['WTF_CSRF_ENABLED'] = False
+    latencies = defaultdict(list)
+    client = wizard.app.test_client()
+
+    def get(path, params):
+        response = client.get(path, query_string=params)
+        return response.status_code, response.get_data().decode("utf-8", "replace")
+
+    def post(path, data):
+        response = client.post(path, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+    user = WizardClient(get, post, lambda route, seconds: latencies[route].append(seconds))
+    start = time.perf_counter()
+    for i in range(iterations):
+        user.run_flow(f"tc-{i}")
+    elapsed = time.perf_counter() - start
+    total = sum(len(values) for values in latencies.values())
+    return {"iterations": iterations, "requests": total,
+            "requests_per_second": round(total / elapsed, 2), "routes": summarize(latencies)}
+
+
+def bench_http(iterations, concurrency):
+    # Real sockets through a threaded WSGI server, one session per simulated user
+    wizard.app.config['WTF_CSRF_ENABLED'] = False
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # No per-request access log
+    server = make_server("127.0.0.1", 0, wizard.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    latencies = defaultdict(list)
+    errors = []
+    lock = threading.Lock()
+
+    def record(route, seconds):
+        with lock:
+            latencies[route].append(seconds)
+
+    def worker(worker_id):
+        session = requests.Session()
+
+        def get(path, params):
+            response = session.get(base + path, params=params)
+            return response.status_code, response.content.decode("utf-8", "replace")
+
+        def post(path, data):
+            response = session.post(base + path, data=data, allow_redirects=False)
+            return response.status_code, response.text
+
+        user = WizardClient(get, post, record)
+        for i in range(iterations):
+            try:
+                user.run_flow(f"http-{worker_id}-{i}")
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    total = sum(len(values) for values in latencies.values())
+    return {"iterations_per_user": iterations, "concurrency": concurrency, "requests": total,
+            "errors": len(errors), "requests_per_second": round(total / elapsed, 2),
+            "routes": summarize(latencies)}
+
+
+def bench_pdf_build(day_counts, repeats):
+    # PDF layout cost alone, by itinerary length
+    results = {}
+    generator = StubGenerator()
+    for days in day_counts:
+        trip = {"start_date": "2025-06-01", "end_date": f"2025-06-{days:02d}",
+                "departure_city": "Austin", "arrival_city": "Chicago", "car_needed": "Yes"}
+        content = generator.build(trip)
+        timings = []
+        size = 0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            size = len(wizard.build_itinerary_pdf(content, 2, 1))
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        results[f"{days}_days"] = {
+            "activities": len(content["content"]),
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "pdf_bytes": size,
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path, report):
+    # Print p95 changes per route against an earlier report
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    for mode in ("test_client", "http"):
+        old_routes = baseline.get(mode, {}).get("routes", {})
+        for route, stats in report.get(mode, {}).get("routes", {}).items():
+            old = old_routes.get(route)
+            if not old:
+                continue
+            change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0
+            print(f"{mode:12} {route:20} p95 {old['p95_ms']:9.2f} -> {stats['p95_ms']:9.2f} ms ({change:+.1f}%)",
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10, help="wizard runs (per user for HTTP)")
+    parser.add_argument("--concurrency", type=int, default=4, help="simultaneous HTTP users")
+    parser.add_argument("--pdf-days", default="3,7,14,21", help="itinerary lengths for the PDF benchmark")
+    parser.add_argument("--pdf-repeats", type=int, default=5)
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare p95 latencies against")
+    args = parser.parse_args()
+
+    ensure_user()
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "search_provider": wizard.app.config['SEARCH_PROVIDER'],
+        "llm_backend": wizard.app.config['ITINERARY_LLM_BACKEND'],
+        "test_client": bench_test_client(args.iterations),
+    }
+    if not args.skip_http:
+        report["http"] = bench_http(args.iterations, args.concurrency)
+    report["pdf_build"] = bench_pdf_build([int(d) for d in args.pdf_days.split(",")], args.pdf_repeats)
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Local stand-in for SerpAPI and the OpenAI chat API.
+
+Serves SerpAPI-shaped search results (from the synthetic provider) on
+/search and chat completions (from the stub generator, streamed or not)
+on /v1/chat/completions, over keep-alive HTTP/1.1, with optional latency,
+slow outliers, injected failures and a per-token generation delay.
+/stats reports how many connections and requests it has seen, which
+shows whether clients reuse their connections; POST /faults with any of
+latency, slow_rate, slow_latency, fail_rate and token_latency in a JSON
+body changes them while it runs.
+
+    python benchmarks/mock_upstream.py --port 8099 --latency 0.05
+    SERPAPI_URL=http://127.0.0.1:8099 OPENAI_API_BASE=http://127.0.0.1:8099/v1 \\
+        SEARCH_PROVIDER=live SERP_API_KEY=mock OPENAI_API_KEY=mock python app.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llm import StubGenerator  # noqa: E402
+from search_providers import SyntheticProvider  # noqa: E402
+
+# Query parameters the app adds for SerpAPI itself rather than for the search
+SERPAPI_ONLY_PARAMS = ("api_key", "output", "source")
+
+
+class MockUpstream:
+    """Threaded mock server; port 0 picks a free port. latency seconds are
+    added to every response, slow_rate of the responses take slow_latency
+    seconds instead, and fail_rate of the requests get a 500. Chat
+    completions also take token_latency seconds per completion token (about
+    four characters), like a model writing its answer."""
+
+    # Settable at run time through POST /faults
+    FAULTS = ("latency", "slow_rate", "slow_latency", "fail_rate", "token_latency")
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fail_rate=0.0, slow_rate=0.0, slow_latency=1.0, seed=0,
+                 token_latency=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.token_latency = token_latency
+        self.search_provider = SyntheticProvider()
+        self.generator = StubGenerator()
+        self.connections = 0
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {"connections": self.connections, "requests": self.requests}
+
+    def set_faults(self, **faults):
+        with self._lock:
+            for name, value in faults.items():
+                if name not in self.FAULTS:
+                    raise ValueError(f"Unknown fault: {name}")
+                setattr(self, name, float(value))
+
+    def _handler_class(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+            def setup(self):
+                # One handler per connection; it serves every request sent on it
+                super().setup()
+                with upstream._lock:
+                    upstream.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/stats":
+                    return self._json(200, upstream.stats())
+                if url.path in ("/search", "/search.json"):
+                    if self._delay_or_fail():
+                        params = {k: v for k, v in parse_qsl(url.query) if k not in SERPAPI_ONLY_PARAMS}
+                        self._json(200, upstream.search_provider.search(params))
+                    return
+                self._json(404, {"error": "Not found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if urlsplit(self.path).path == "/faults":
+                    try:
+                        upstream.set_faults(**json.loads(body or b"{}"))
+                    except (TypeError, ValueError) as e:
+                        return self._json(400, {"error": str(e)})
+                    return self._json(200, {name: getattr(upstream, name) for name in upstream.FAULTS})
+                if urlsplit(self.path).path != "/v1/chat/completions":
+                    return self._json(404, {"error": {"message": "Not found"}})
+                if not self._delay_or_fail():
+                    return
+                request = json.loads(body or b"{}")
+                prompt = " ".join(message.get("content", "") for message in request.get("messages", []))
+                text = upstream.generator.complete(request.get("messages"), {})  # The stub reads the trip from the prompt
+                completion_tokens = len(text) // 4
+                if request.get("stream"):
+                    self._stream(text)
+                else:
+                    if upstream.token_latency:
+                        time.sleep(upstream.token_latency * completion_tokens)
+                    self._json(200, {
+                        "id": "chatcmpl-mock", "object": "chat.completion", "model": request.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": completion_tokens},
+                    })
+
+            def _delay_or_fail(self):
+                with upstream._lock:
+                    upstream.requests += 1
+                    fail = upstream._random.random() < upstream.fail_rate
+                    slow = upstream._random.random() < upstream.slow_rate
+                    delay = upstream.slow_latency if slow else upstream.latency
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    self._json(500, {"error": "Injected failure"})
+                return not fail
+
+            def _json(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, text):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for start in range(0, len(text), 64):
+                    if upstream.token_latency:
+                        time.sleep(upstream.token_latency * 16)  # 64 characters
+                    chunk = {"choices": [{"index": 0, "delta": {"content": text[start:start + 64]}}]}
+                    self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+            def _chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of responses delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per completion token")
+    args = parser.parse_args()
+
+    upstream = MockUpstream(args.host, args.port, latency=args.latency, fail_rate=args.fail_rate,
+                            slow_rate=args.slow_rate, slow_latency=args.slow_latency, token_latency=args.token_latency)
+    print(f"Mock SerpAPI and OpenAI on {upstream.url} (OPENAI_API_BASE={upstream.url}/v1)")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
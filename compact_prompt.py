@@ -0,0 +1,84 @@
+# Short keys the compact schema asks the model for, and the itinerary fields they stand for
+HEADER_KEYS = {"dc": "departure_city", "ac": "arrival_city", "sd": "start_date", "ed": "end_date",
+               "car": "car_rental_info"}
+CAR_KEYS = {"co": "company", "ty": "car_type", "pl": "pick_up_location", "pt": "pick_up_time",
+            "rl": "return_location", "rt": "return_time", "tp": "total_price"}
+ENTRY_KEYS = {"p": "place", "l": "location", "t": "time_stamp", "d": "description", "$": "price"}
+DOCUMENT_KEYS = {"h": "header", "c": "content"}
+
+# First line of the compact system prompt; it marks a conversation as compact
+COMPACT_INTRO = "You plan travel itineraries and answer with compact JSON only."
+
+
+def system_prompt(description_words):
+    """The static system prompt of compact mode. It is the same for every
+    trip and every part of a trip, so the provider can cache it as a prompt
+    prefix; everything trip-specific goes in the user message."""
+    return f"""{COMPACT_INTRO}
+Schema, with short keys:
+{{"h":{{"dc":departure city,"ac":arrival city,"sd":"YYYY-MM-DD","ed":"YYYY-MM-DD","car":{{"co":company,"ty":car type,"pl":pick-up place,"pt":"YYYY-MM-DDTHH:MM","rl":return place,"rt":"YYYY-MM-DDTHH:MM","tp":total price}}}},
+"c":[{{"p":place,"l":address,"t":"YYYY-MM-DDTHH:MM","d":description,"$":price}}]}}
+Rules:
+- "d" is at most {description_words} words.
+- "$" is a number only: the cost for the whole party, 0 if free.
+- Every day has breakfast, lunch and dinner, and the transport to each activity.
+- With flights, the first day starts with the outbound flight and the last day ends with the return flight; allow for travel to and from the airport. Flight prices are per person.
+- Without flights, the first and last days include the drive between the two cities.
+- "car" is filled in only when a car rental is needed, picked up and returned in the departure city; otherwise "car" is {{}}.
+- Every night but the last ends with an overnight stay at the hotel, priced at its nightly rate, with no check-in or check-out costs.
+- Prefer activities that match the interests.
+- When asked for one day, answer {{"c":[...]}} for that day only, every "t" on that date.
+- Never use the character ’."""
+
+
+def is_compact(messages):
+    return bool(messages) and str(messages[0].get("content", "")).startswith(COMPACT_INTRO)
+
+
+def shorten(words, limit):
+    # The first limit words of a description
+    words = str(words or "").split()
+    return " ".join(words[:limit]) if limit and len(words) > limit else " ".join(words)
+
+
+def expand_entry(entry, description_words=None):
+    # One compact schedule entry with its full field names; notes and unknown keys pass through
+    if not isinstance(entry, dict):
+        return entry
+    expanded = {ENTRY_KEYS.get(key, key): value for key, value in entry.items()}
+    if "description" in expanded and description_words:
+        expanded["description"] = shorten(expanded["description"], description_words)
+    return expanded
+
+
+def expand_document(document, description_words=None):
+    """A compact answer (whole trip, one day or a skeleton) in the full
+    itinerary shape. Documents that already use the full keys come back
+    unchanged, apart from the description cap."""
+    expanded = {DOCUMENT_KEYS.get(key, key): value for key, value in document.items()}
+    header = expanded.get("header")
+    if isinstance(header, dict):
+        header = {HEADER_KEYS.get(key, key): value for key, value in header.items()}
+        car = header.get("car_rental_info")
+        if isinstance(car, dict):
+            header["car_rental_info"] = {CAR_KEYS.get(key, key): value for key, value in car.items()}
+        expanded["header"] = header
+    if isinstance(expanded.get("content"), list):
+        expanded["content"] = [expand_entry(entry, description_words) for entry in expanded["content"]]
+    return expanded
+
+
+def compact_document(document, description_words=None):
+    # The reverse of expand_document, for generators that build the full shape (the stub)
+    full_keys = {value: key for key, value in {**DOCUMENT_KEYS, **HEADER_KEYS, **CAR_KEYS, **ENTRY_KEYS}.items()}
+    if isinstance(document, dict):
+        compact = {}
+        for key, value in document.items():
+            if key == "description":
+                compact[full_keys[key]] = shorten(value, description_words)
+            else:
+                compact[full_keys.get(key, key)] = compact_document(value, description_words)
+        return compact
+    if isinstance(document, list):
+        return [compact_document(item, description_words) for item in document]
+    return document
@@ -0,0 +1,153 @@
+import copy
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from day_planner import entry_days, trip_days
+from pdf_cache import normalize_keywords
+
+
+def party_type(trip):
+    # Who is travelling, as far as the activities go
+    adults = int(trip.get("num_adults") or 1)
+    if int(trip.get("num_children") or 0) > 0:
+        return "family"
+    return {1: "solo", 2: "couple"}.get(adults, "group")
+
+
+def day_plan_key(trip):
+    # Trips that can share sightseeing days: same destination, interests, budget level and party
+    return ((trip.get("arrival_city") or "").strip().lower(), tuple(normalize_keywords(trip.get("keywords"))),
+            trip.get("budget") or "default", party_type(trip))
+
+
+def sightseeing_days(trip):
+    # Days without long-distance travel; the first and last depend on the flights or the drive
+    return trip_days(trip)[1:-1]
+
+
+def is_overnight(entry):
+    text = f"{entry.get('place') or ''} {entry.get('description') or ''}".lower()
+    return "overnight" in text
+
+
+def with_hotel(entries, hotel):
+    # entries with their overnight stays moved to the trip's hotel
+    if not hotel or not hotel.get("name"):
+        return entries
+    price = re.sub(r"[^\d.]", "", str(hotel.get("price_per_night") or ""))
+    return [dict(entry, place=f"Overnight stay at {hotel['name']}", location=hotel["name"], price=price)
+            if isinstance(entry, dict) and is_overnight(entry) else entry
+            for entry in entries]
+
+
+class DayPlanCache:
+    """Sightseeing days of generated itineraries, kept to plan similar trips
+    without asking the LLM for them again.
+
+    Days are pooled under day_plan_key, up to days_per_key per key and
+    max_keys keys (least recently used go first), with their times of day
+    but no dates. lookup() deals pooled days out to a new trip's
+    sightseeing days, re-dated and with overnight stays at the trip's own
+    hotel; the travel days and any days the pool can't cover are left for
+    the LLM. store() adds the days an itinerary generated fresh and counts
+    what the cache saved it."""
+
+    def __init__(self, max_keys=1024, days_per_key=14):
+        self.max_keys = max_keys
+        self.days_per_key = days_per_key
+        self._pools = OrderedDict()  # key -> [{"theme", "entries"}], entries holding "time" instead of "time_stamp"
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.days_reused = 0
+        self.days_generated = 0
+        self.llm_calls_saved = 0
+
+    def lookup(self, trip):
+        """{date: {"theme", "content"}} for as many of the trip's sightseeing
+        days as the pool covers, in date order; empty on a miss."""
+        if self.max_keys <= 0:
+            return {}
+        days = sightseeing_days(trip)
+        key = day_plan_key(trip)
+        with self._lock:
+            pool = self._pools.get(key) or []
+            if pool:
+                self._pools.move_to_end(key)
+            plans = copy.deepcopy(pool[:len(days)])
+        return {day: {"theme": plan["theme"], "content": with_hotel(self._dated(plan["entries"], day), trip.get("hotel"))}
+                for day, plan in zip(days, plans)}
+
+    def store(self, trip, itinerary, reused=(), calls_saved=0):
+        # Pool the sightseeing days of a finished itinerary that didn't come from the cache.
+        # reused are the looked-up days it was planned around; calls_saved what that saved against planning without them.
+        days = trip_days(trip)
+        themes = {plan.get("date"): plan.get("theme", "") for plan in itinerary.get("days") or []}
+        by_day = {}
+        for day, entry in entry_days(itinerary.get("content") or []):
+            by_day.setdefault(day, []).append(entry)
+
+        plans = []
+        for day in sightseeing_days(trip):
+            entries = self._undated(by_day.get(day) or [])
+            if day not in reused and entries:
+                plans.append({"theme": themes.get(day, ""), "entries": entries})
+
+        with self._lock:
+            if reused:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.days_reused += len(reused)
+            self.days_generated += len(days) - len(reused)
+            self.llm_calls_saved += calls_saved
+            if self.max_keys <= 0 or not plans:
+                return
+            key = day_plan_key(trip)
+            pool = self._pools.setdefault(key, [])
+            self._pools.move_to_end(key)
+            seen = {self._places(plan) for plan in pool}
+            for plan in plans:
+                if self._places(plan) not in seen and len(pool) < self.days_per_key:
+                    pool.append(plan)
+                    seen.add(self._places(plan))
+            while len(self._pools) > self.max_keys:
+                self._pools.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "days_reused": self.days_reused,
+                    "days_generated": self.days_generated, "llm_calls_saved": self.llm_calls_saved,
+                    "keys": len(self._pools)}
+
+    @staticmethod
+    def _undated(entries):
+        # The day's entries with "time" (HH:MM) in place of the timestamp; [] if a timestamp won't parse
+        undated = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                try:
+                    time_of_day = datetime.fromisoformat(entry.get("time_stamp") or "").strftime("%H:%M")
+                except (TypeError, ValueError):
+                    return []
+                entry = {field: value for field, value in entry.items() if field != "time_stamp"}
+                entry["time"] = time_of_day
+            undated.append(entry)
+        return undated
+
+    @staticmethod
+    def _dated(entries, day):
+        dated = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                time_of_day = entry.get("time") or "00:00"
+                entry = {field: value for field, value in entry.items() if field != "time"}
+                entry["time_stamp"] = f"{day}T{time_of_day}"
+            dated.append(entry)
+        return dated
+
+    @staticmethod
+    def _places(plan):
+        return tuple(entry.get("place") for entry in plan["entries"] if isinstance(entry, dict))
@@ -0,0 +1,192 @@
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+
+class DayPlanError(Exception):
+    # A skeleton or day that still failed validation after every attempt
+    pass
+
+
+def trip_days(trip):
+    # ISO dates from start_date to end_date inclusive
+    start = date.fromisoformat(trip['start_date'])
+    end = date.fromisoformat(trip['end_date'])
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+def parse_skeleton(text, days):
+    """The skeleton's header and one theme per trip day. Raises ValueError
+    if the text is not a skeleton; missing themes are left blank."""
+    skeleton = json.loads(text)
+    if not isinstance(skeleton, dict) or not isinstance(skeleton.get("header"), dict):
+        raise ValueError("Skeleton has no header")
+    themes = {}
+    for day in skeleton.get("days") or []:
+        if isinstance(day, dict) and day.get("date") in days:
+            themes[day["date"]] = str(day.get("theme") or "")
+    return {"header": skeleton["header"], "days": [{"date": day, "theme": themes.get(day, "")} for day in days]}
+
+
+def entry_days(content):
+    """(date, entry) for each schedule entry; a note belongs to the day of
+    the activity before it. Entries without a readable date get None."""
+    day = None
+    for entry in content:
+        if isinstance(entry, dict):
+            try:
+                day = datetime.fromisoformat(entry.get("time_stamp") or "").date().isoformat()
+            except (TypeError, ValueError):
+                pass
+        yield day, entry
+
+
+def replace_day(content, day, entries):
+    # content with day's entries swapped for entries, which go where the old ones were (or in date order)
+    result = []
+    inserted = False
+    for entry_day, entry in entry_days(content):
+        if not inserted and entry_day is not None and entry_day >= day:
+            result += entries
+            inserted = True
+        if entry_day != day:
+            result.append(entry)
+    return result if inserted else result + entries
+
+
+def parse_day(text, day):
+    """The schedule entries for one day. Raises ValueError unless the text
+    holds a non-empty "content" list whose activities all have a place and
+    a timestamp on that day."""
+    content = json.loads(text).get("content") if text else None
+    if not isinstance(content, list) or not any(isinstance(entry, dict) for entry in content):
+        raise ValueError(f"No activities for {day}")
+    for entry in content:
+        if isinstance(entry, str):
+            continue  # A note
+        if not isinstance(entry, dict) or not entry.get("place"):
+            raise ValueError(f"Malformed activity on {day}")
+        if datetime.fromisoformat(entry.get("time_stamp") or "").date().isoformat() != day:
+            raise ValueError(f"Activity outside {day}: {entry.get('time_stamp')}")
+    return content
+
+
+class DayPlanner:
+    """Generates an itinerary in pieces: one call for a skeleton (the header
+    with car rental, plus a theme per day), then one call per day, up to
+    max_concurrency at a time. A day whose answer fails validation is asked
+    for again on its own, up to max_attempts times, and the days are merged
+    back in date order into the same JSON shape a single call returns.
+
+    The same per-day calls regenerate one day, or one activity, of an
+    itinerary that was already generated, leaving the other days alone,
+    and fill in around days reused from an earlier itinerary (see
+    day_plan_cache), which keep their content and theme.
+
+    skeleton_messages(trip), day_messages(trip, skeleton, day) and
+    activity_messages(trip, itinerary, day, entry) build the prompts, which
+    say which piece is wanted; the generator gets the trip as it is and the
+    part ("skeleton", "day" or "activity") the prompt asks for."""
+
+    def __init__(self, generator, skeleton_messages, day_messages, activity_messages=None,
+                 max_concurrency=4, max_attempts=3):
+        self.generator = generator
+        self.skeleton_messages = skeleton_messages
+        self.day_messages = day_messages
+        self.activity_messages = activity_messages
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+
+    def generate(self, trip, cached=None):
+        # cached maps dates to reused {"theme", "content"} days; only the others are generated
+        cached = cached or {}
+        skeleton = self.skeleton(trip, cached)
+        days = {day: plan["content"] for day, plan in cached.items()}
+        days.update({day: content for _, day, content in self.fill_days(trip, skeleton, skip=cached)})
+        return self.merge(skeleton, days)
+
+    def outline_needed(self, trip, cached=None):
+        # With days reused and no car to rent, the header is just the trip and themes can wait for the days
+        return not cached or trip.get("car_needed") == "Yes"
+
+    def skeleton(self, trip, cached=None):
+        days = trip_days(trip)
+        if not days:
+            raise DayPlanError("The trip ends before it starts")
+        cached = cached or {}
+        if self.outline_needed(trip, cached):
+            skeleton = self._attempt("skeleton", lambda: parse_skeleton(
+                self.generator.complete(self.skeleton_messages(trip), trip, "skeleton"), days))
+        else:
+            header = {field: trip.get(field) for field in ("departure_city", "arrival_city", "start_date", "end_date")}
+            skeleton = {"header": dict(header, car_rental_info={}), "days": [{"date": day, "theme": ""} for day in days]}
+        for plan in skeleton["days"]:
+            if plan["date"] in cached:
+                plan["theme"] = cached[plan["date"]]["theme"]
+        return skeleton
+
+    def fill_days(self, trip, skeleton, skip=()):
+        """Yields (day number, date, entries) for every day not in skip as
+        it finishes, in completion order. Raises DayPlanError if a day keeps
+        failing."""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="itinerary-day") as pool:
+            futures = {pool.submit(self._day, trip, skeleton, plan): number
+                       for number, plan in enumerate(skeleton["days"], start=1) if plan["date"] not in skip}
+            try:
+                for future in as_completed(futures):
+                    day, content = future.result()
+                    yield futures[future], day, content
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def merge(self, skeleton, days):
+        # The day themes are kept so a regenerated day gets the same theme
+        header = dict(skeleton["header"])
+        dates = [plan["date"] for plan in skeleton["days"]]
+        header.setdefault("start_date", dates[0])
+        header.setdefault("end_date", dates[-1])
+        return {"header": header, "days": skeleton["days"],
+                "content": [entry for day in dates for entry in days[day]]}
+
+    def regenerate_day(self, trip, itinerary, day):
+        """A copy of itinerary with day planned again. Itineraries from a
+        single call have no day themes, so their days are replanned without
+        one. Raises ValueError for a day outside the trip."""
+        days = trip_days(trip)
+        if day not in days:
+            raise ValueError(f"{day} is not a day of this trip")
+        themes = {plan.get("date"): plan.get("theme", "") for plan in itinerary.get("days") or []}
+        skeleton = {"header": itinerary["header"], "days": [{"date": d, "theme": themes.get(d, "")} for d in days]}
+        _, content = self._day(trip, skeleton, skeleton["days"][days.index(day)])
+        return dict(itinerary, content=replace_day(itinerary["content"], day, content))
+
+    def regenerate_activity(self, trip, itinerary, day, number):
+        """A copy of itinerary with the number'th activity (from 1) of day
+        replaced by a new one at the same time. Raises ValueError if there
+        is no such activity."""
+        activities = [entry for entry_day, entry in entry_days(itinerary["content"])
+                      if entry_day == day and isinstance(entry, dict)]
+        if not 1 <= number <= len(activities):
+            raise ValueError(f"No activity {number} on {day}")
+        old = activities[number - 1]
+        new = self._attempt(f"{day} activity {number}", lambda: parse_day(
+            self.generator.complete(self.activity_messages(trip, itinerary, day, old), trip, "activity"), day))
+        replacement = next(entry for entry in new if isinstance(entry, dict))
+        return dict(itinerary, content=[replacement if entry is old else entry for entry in itinerary["content"]])
+
+    def _day(self, trip, skeleton, plan):
+        day = plan["date"]
+        content = self._attempt(day, lambda: parse_day(
+            self.generator.complete(self.day_messages(trip, skeleton, day), trip, "day"), day))
+        return day, content
+
+    def _attempt(self, name, fn):
+        error = None
+        for _ in range(self.max_attempts):
+            try:
+                return fn()
+            except (ValueError, TypeError, AttributeError) as e:  # Malformed JSON, or JSON of the wrong shape
+                error = e
+                print(f"Itinerary {name} failed validation: {e}")
+        raise DayPlanError(f"Itinerary {name} failed after {self.max_attempts} attempts: {error}")
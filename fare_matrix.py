@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+
+def date_window(center, days, earliest=None):
+    # ISO dates from center - days to center + days, skipping any before earliest
+    center = date.fromisoformat(center)
+    dates = [center + timedelta(days=offset) for offset in range(-days, days + 1)]
+    return [day.isoformat() for day in dates if earliest is None or day >= earliest]
+
+
+def cheapest_fares(records):
+    # Lowest price among one search's flight records, or NaN when there is none
+    prices = [record.price for record in records or [] if record.price is not None]
+    return min(prices) if prices else np.nan
+
+
+class FareMatrix:
+    """Round-trip prices for every outbound x return date pair.
+
+    Flights are searched one way, so the grid needs one search per
+    outbound date and one per return date; each cell is the sum of the
+    cheapest fare on its two days. Cells where the return is before the
+    outbound date, or either day has no fares, are NaN."""
+
+    def __init__(self, outbound_dates, return_dates, outbound_fares, return_fares):
+        self.outbound_dates = outbound_dates
+        self.return_dates = return_dates
+        self.outbound_fares = np.asarray(outbound_fares, dtype=float)
+        self.return_fares = np.asarray(return_fares, dtype=float)
+
+        totals = np.add.outer(self.outbound_fares, self.return_fares)
+        outbound_days = np.array(outbound_dates, dtype="datetime64[D]")
+        return_days = np.array(return_dates, dtype="datetime64[D]")
+        totals[return_days[np.newaxis, :] < outbound_days[:, np.newaxis]] = np.nan
+        self.totals = totals
+
+    @classmethod
+    def search(cls, search_many, outbound_params, return_params, outbound_dates, return_dates):
+        """Build the matrix from concurrent searches. search_many takes a
+        list of params dicts and returns their record lists in the same
+        order (None for a failed search); outbound_params/return_params
+        return the list of params to search for one date, one per airport
+        pair, and the day's fare is the cheapest across them."""
+        groups = [outbound_params(day) for day in outbound_dates] + [return_params(day) for day in return_dates]
+        results = iter(search_many([params for group in groups for params in group]))
+        fares = []
+        for group in groups:
+            records = [record for _ in group for record in (next(results) or [])]
+            fares.append(cheapest_fares(records))
+        return cls(outbound_dates, return_dates, fares[:len(outbound_dates)], fares[len(outbound_dates):])
+
+    def cheapest(self, count=3):
+        # The count cheapest (outbound date, return date, price) combinations
+        flat = np.where(np.isnan(self.totals), np.inf, self.totals).ravel()
+        best = []
+        for position in np.argsort(flat, kind="stable")[:count]:
+            if not np.isfinite(flat[position]):
+                break
+            row, column = divmod(int(position), len(self.return_dates))
+            best.append((self.outbound_dates[row], self.return_dates[column], float(flat[position])))
+        return best
+
+    def rows(self, highlight=3):
+        """Calendar rows for the template: (outbound date, [cell, ...]) where
+        each cell is a dict with return_date, price (None if unavailable)
+        and cheapest (one of the highlight cheapest combinations)."""
+        cheapest = {(outbound, inbound) for outbound, inbound, _ in self.cheapest(highlight)}
+        rows = []
+        for i, outbound in enumerate(self.outbound_dates):
+            cells = []
+            for j, inbound in enumerate(self.return_dates):
+                price = self.totals[i, j]
+                cells.append({
+                    "return_date": inbound,
+                    "price": None if np.isnan(price) else int(round(price)),
+                    "cheapest": (outbound, inbound) in cheapest,
+                })
+            rows.append((outbound, cells))
+        return rows
@@ -0,0 +1,125 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HostStats:
+    # Counters for one upstream host
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.timeouts = 0
+        self.errors = 0
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default (connect, read) timeout to requests
+    sent without one and counts requests per host for HttpPool.stats()."""
+
+    def __init__(self, http_pool, **kwargs):
+        self.http_pool = http_pool
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.http_pool.timeout
+        stats = self.http_pool._begin(urlsplit(request.url).netloc)
+        try:
+            return super().send(request, timeout=timeout, **kwargs)
+        except requests.Timeout:
+            self.http_pool._count(stats, "timeouts")
+            raise
+        except requests.RequestException:
+            self.http_pool._count(stats, "errors")
+            raise
+        finally:
+            self.http_pool._end(stats)
+
+
+class PooledSession(requests.Session):
+    # Shared by every thread, so callers that close "their" session (openai does every few minutes) must not drop the pool
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+
+class HttpPool:
+    """Shared outbound HTTP session for SerpAPI and OpenAI.
+
+    Keeps up to pool_size keep-alive connections per host, so repeated calls
+    skip the TCP and TLS handshakes, and gives every request a connect and
+    read timeout (seconds) unless the caller passes its own. A request is
+    in flight until its response headers arrive; if peak_in_flight stays
+    above pool_size, connections beyond the pool are opened and thrown away
+    and pool_size should go up."""
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=60.0, max_hosts=10):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._stats = {}  # host -> HostStats
+        self._lock = threading.Lock()
+        self.adapter = PooledAdapter(self, pool_connections=max_hosts, pool_maxsize=pool_size)
+        self.session = PooledSession()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        """Per host: requests sent, connections opened (the rest reused a
+        kept-alive one), idle pooled connections, requests in flight now
+        and at peak, timeouts and other errors."""
+        pools = {}
+        for key in self.adapter.poolmanager.pools.keys():
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                port = f":{pool.port}" if pool.port not in (None, 80, 443) else ""
+                pools[f"{pool.host}{port}"] = pool
+
+        with self._lock:
+            hosts = dict(self._stats)
+        result = {}
+        for host, stats in sorted(hosts.items()):
+            pool = pools.get(host)
+            opened = pool.num_connections if pool is not None else 0
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool is not None else 0
+            result[host] = {
+                "requests": stats.requests,
+                "connections_opened": opened,
+                "reused": max(stats.requests - opened, 0),
+                "idle": idle,
+                "in_flight": stats.in_flight,
+                "peak_in_flight": stats.peak_in_flight,
+                "pool_size": self.pool_size,
+                "timeouts": stats.timeouts,
+                "errors": stats.errors,
+            }
+        return result
+
+    def close(self):
+        self.session.shutdown()
+
+    def _begin(self, host):
+        with self._lock:
+            stats = self._stats.get(host)
+            if stats is None:
+                stats = self._stats[host] = HostStats()
+            stats.requests += 1
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        return stats
+
+    def _count(self, stats, field):
+        with self._lock:
+            setattr(stats, field, getattr(stats, field) + 1)
+
+    def _end(self, stats):
+        with self._lock:
+            stats.in_flight -= 1
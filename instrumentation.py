@@ -0,0 +1,152 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request, Response
+from sqlalchemy import event
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+        self.count += 1
+
+
+def format_labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+class Metrics:
+    """Histogram families keyed by label set, plus gauges read at scrape
+    time, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._families = {}  # name -> (help, {labels tuple: Histogram})
+        self._gauges = []  # (name, help, type, fn)
+        self._lock = threading.Lock()
+
+    def observe(self, name, help_text, seconds, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, series = self._families.setdefault(name, (help_text, {}))
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def register_gauge(self, name, help_text, fn, metric_type="gauge"):
+        # fn returns a number, or a list of (labels dict, number)
+        self._gauges.append((name, help_text, metric_type, fn))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, series) in sorted(self._families.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    labels = dict(key)
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{format_labels(dict(labels, le=bound))}}} {cumulative}')
+                    lines.append(f"{name}_sum{{{format_labels(labels)}}} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{{{format_labels(labels)}}} {histogram.count}")
+
+        for name, help_text, metric_type, fn in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            value = fn()
+            if isinstance(value, list):
+                for labels, sample in value:
+                    lines.append(f"{name}{{{format_labels(labels)}}} {sample}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def record(name, seconds, kind="upstream"):
+    # Histogram per upstream call or internal stage, plus a Server-Timing entry for the current request
+    if kind == "upstream":
+        metrics.observe("upstream_call_seconds", "Time spent in calls to external services",
+                        seconds, upstream=name)
+    else:
+        metrics.observe("stage_seconds", "Time spent in internal processing stages", seconds, stage=name)
+    if has_request_context():
+        timings = g.setdefault("server_timings", {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timer(name, kind="upstream"):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, kind)
+
+
+def timed(name, fn, kind="upstream"):
+    # Wrap a callable so every call is recorded under name
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with timer(name, kind):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def instrument_sqlalchemy(engine):
+    # Time every statement executed on the engine
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        record("sqlalchemy", time.perf_counter() - conn.info["query_start"].pop())
+
+
+def server_timing_header(timings, total):
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def init_app(app):
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_request_timer(response):
+        start = g.pop("request_start", None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe("http_request_seconds", "Time to handle a request, by route",
+                        total, route=route, method=request.method)
+        response.headers["Server-Timing"] = server_timing_header(g.get("server_timings", {}), total)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
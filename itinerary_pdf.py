@@ -0,0 +1,411 @@
+import bisect
+import io
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from itertools import accumulate
+
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+
+# Bundled Unicode font, one file per style; see data/fonts/LICENSE-dejavu.txt
+FONT_FAMILY = "DejaVu"
+FONT_FILES = {"": "DejaVuSans.ttf", "B": "DejaVuSans-Bold.ttf"}
+# Core font used when the TTF files are missing; it only covers Latin-1
+FALLBACK_FAMILY = "Arial"
+# Typography LLMs like to emit that Latin-1 has no code for
+LATIN1_REPLACEMENTS = str.maketrans({
+    "‘": "'", "’": "'", "‚": ",", "“": '"', "”": '"', "„": '"',
+    "–": "-", "—": "-", "•": "*", "…": "...", "™": "TM", "€": "EUR",
+})
+# Glyphs every subset starts with, so documents in plain English share one cached subset
+BASE_SUBSET = range(32, 127)
+MAX_CACHED_SUBSETS = 64
+
+# Page layout, in mm on A4 with FPDF's default 10 mm margins
+PAGE_WIDTH = 210
+LINE_HEIGHT = 10
+TIME_COLUMN_WIDTH = 40
+DETAILS_COLUMN_WIDTH = PAGE_WIDTH - TIME_COLUMN_WIDTH - 20
+FONT_SIZE = 12
+TITLE_FONT_SIZE = 14
+
+HEADER_LINES = (
+    "Departure City: {departure_city}",
+    "Arrival City: {arrival_city}",
+    "Number of Adults: {num_adults}",
+    "Number of Children: {num_children}",
+    "Travel Dates: From {start_date} to {end_date}",
+)
+CAR_RENTAL_LINES = (
+    "  Company: {company}",
+    "  Car Type: {car_type}",
+    "  Pickup Location: {pick_up_location}",
+    "  Pickup Time: {pick_up_time}",
+    "  Return Location: {return_location}",
+    "  Return Time: {return_time}",
+    "  Total Price: ${total_price}",
+)
+DETAILS_TEMPLATE = "{place}\n{location}\n{description}\nPrice: ${price}"
+
+# ToUnicode CMap for Identity-H fonts: character codes are the Unicode code points
+TO_UNICODE_CMAP = (
+    "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+    "/CIDSystemInfo\n<</Registry (Adobe)\n/Ordering (UCS)\n/Supplement 0\n>> def\n"
+    "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+    "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+    "1 beginbfrange\n<0000> <FFFF> <0000>\nendbfrange\n"
+    "endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend"
+)
+
+
+class Fields(dict):
+    # Template values; anything the LLM left out prints as N/A
+    def __missing__(self, key):
+        return "N/A"
+
+
+def latin1_text(text):
+    # For the core font: swap common typography for ASCII, then drop what Latin-1 still can't encode
+    return str(text).translate(LATIN1_REPLACEMENTS).encode("latin-1", "replace").decode("latin-1")
+
+
+def parse_price(value):
+    # Prices arrive as strings; blank or malformed ones count as 0
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class GlyphSubset(set):
+    """The code points a document uses in one font. FPDF keeps these in a
+    list, appending every character it draws, so the list grows with the
+    text and each membership test is a scan; a set stays one entry per
+    character."""
+
+    append = set.add
+
+
+class CharWidths(dict):
+    """Glyph advance of each character in one font, in 1/1000 em, filled in
+    from the TTF width table as characters are first measured."""
+
+    def __init__(self, cw, missing):
+        super().__init__()
+        self.cw = cw
+        self.missing = missing or 500
+
+    def __missing__(self, char):
+        code = ord(char)
+        width = self[char] = self.cw[code] if code < len(self.cw) else self.missing
+        return width
+
+
+class PdfBuffer(io.BytesIO):
+    # FPDF only appends to its output buffer and asks for its length
+    def __len__(self):
+        return self.tell()
+
+
+class EmbeddedFonts:
+    """TTF metrics and font subsets shared by every document the process
+    renders. Metrics are parsed the first time a font is used; subsets are
+    cached by the set of code points they cover, along with their glyph
+    widths and CID map, so most documents embed a font without touching
+    the TTF file."""
+
+    def __init__(self, font_dir, max_subsets=MAX_CACHED_SUBSETS):
+        self.paths = {style: os.path.join(font_dir, name) for style, name in FONT_FILES.items()}
+        self.max_subsets = max_subsets
+        self._metrics = {}  # path -> font dict in the shape FPDF.add_font builds, plus CharWidths
+        self._subsets = OrderedDict()  # (path, code points) -> (font stream, length, widths, CID map)
+        self._lock = threading.Lock()
+
+    def available(self):
+        return all(os.path.exists(path) for path in self.paths.values())
+
+    def metrics(self, style):
+        path = self.paths[style]
+        with self._lock:
+            metrics = self._metrics.get(path)
+            if metrics is None:
+                ttf = TTFontFile()
+                ttf.getMetrics(path)
+                metrics = {
+                    "type": "TTF",
+                    "name": re.sub("[ ()]", "", ttf.fullName),
+                    "desc": {
+                        "Ascent": int(round(ttf.ascent)),
+                        "Descent": int(round(ttf.descent)),
+                        "CapHeight": int(round(ttf.capHeight)),
+                        "Flags": ttf.flags,
+                        "FontBBox": "[%s]" % " ".join(str(int(round(v))) for v in ttf.bbox),
+                        "ItalicAngle": int(ttf.italicAngle),
+                        "StemV": int(round(ttf.stemV)),
+                        "MissingWidth": int(round(ttf.defaultWidth)),
+                    },
+                    "up": round(ttf.underlinePosition),
+                    "ut": round(ttf.underlineThickness),
+                    "cw": ttf.charWidths,
+                    "ttffile": path,
+                }
+                metrics["widths"] = CharWidths(metrics["cw"], metrics["desc"]["MissingWidth"])
+                self._metrics[path] = metrics
+            return metrics
+
+    def subset(self, font):
+        key = (font["ttffile"], tuple(sorted(font["subset"])))
+        with self._lock:
+            cached = self._subsets.get(key)
+            if cached is not None:
+                self._subsets.move_to_end(key)
+                return cached
+
+        ttf = TTFontFile()
+        stream = ttf.makeSubset(font["ttffile"], list(key[1]))
+        cid_map = bytearray(256 * 256 * 2)
+        for code, glyph in ttf.codeToGlyph.items():
+            cid_map[code * 2] = glyph >> 8
+            cid_map[code * 2 + 1] = glyph & 0xFF
+        cached = (zlib.compress(stream), len(stream), cid_widths(font["cw"], key[1]), zlib.compress(bytes(cid_map)))
+
+        with self._lock:
+            self._subsets[key] = cached
+            while len(self._subsets) > self.max_subsets:
+                self._subsets.popitem(last=False)
+        return cached
+
+
+def cid_widths(char_widths, codes):
+    # /W array for a CIDFont: runs of consecutive code points, each with its list of widths
+    runs = []
+    for code in codes:
+        if code <= 0 or code >= len(char_widths) or not char_widths[code]:
+            continue
+        width = 0 if char_widths[code] == 65535 else char_widths[code]
+        if runs and runs[-1][0] + len(runs[-1][1]) == code:
+            runs[-1][1].append(width)
+        else:
+            runs.append((code, [width]))
+    return "/W [" + " ".join("%d [%s]" % (start, " ".join(map(str, widths))) for start, widths in runs) + "]"
+
+
+class ItineraryPDF(FPDF):
+    """FPDF writing straight into a bytes buffer, with Unicode fonts
+    embedded from an EmbeddedFonts cache. A document uses either the
+    embedded fonts or the core fonts, never both."""
+
+    def __init__(self, fonts=None):
+        super().__init__()
+        self.buffer = PdfBuffer()
+        self.embedded_fonts = fonts
+        if fonts is not None:
+            for style in FONT_FILES:
+                self.fonts[FONT_FAMILY.lower() + style] = dict(
+                    fonts.metrics(style), i=len(self.fonts) + 1, subset=GlyphSubset(BASE_SUBSET))
+
+    def get_string_width(self, s):
+        # Same sum as FPDF's TTF branch, over the font's cached character widths
+        if not self.unifontsubset:
+            return super().get_string_width(s)
+        return sum(map(self.current_font["widths"].__getitem__, s)) * self.font_size / 1000.0
+
+    def multi_cell(self, w, h, txt='', border=0, align='J', fill=0, split_only=False):
+        # Same lines and borders as FPDF.multi_cell, which measures a TTF string one character at a time
+        if not self.unifontsubset or align == 'J' or border not in (0, 1) or split_only:
+            return super().multi_cell(w, h, txt, border, align, fill, split_only)
+        if w == 0:
+            w = self.w - self.r_margin - self.x
+        lines = self.wrap(txt, w)
+        for number, line in enumerate(lines):
+            b = 0
+            if border:
+                b = ("LRT" if number == 0 else "LR") + ("B" if number == len(lines) - 1 else "")
+            self.cell(w, h, line, b, 2, align, fill)
+        self.x = self.l_margin
+
+    def wrap(self, txt, w):
+        """Split txt into the lines FPDF.multi_cell would print in a cell
+        w wide: at newlines, and otherwise at the last space before the
+        text overflows (or mid-word when there is none)."""
+        widths_of = self.current_font["widths"].__getitem__
+        wmax = (w - 2 * self.c_margin) * 1000.0 / self.font_size
+        text = txt.replace("\r", "")
+        if text.endswith("\n"):
+            text = text[:-1]
+
+        lines = []
+        for paragraph in text.split("\n"):
+            # Running width of the paragraph, so each break is a bisect rather than a character loop
+            widths = list(accumulate(map(widths_of, paragraph)))
+            start = 0
+            while True:
+                offset = widths[start - 1] if start else 0
+                end = bisect.bisect_right(widths, offset + wmax, start)
+                if end >= len(paragraph):
+                    lines.append(paragraph[start:])
+                    break
+                space = paragraph.rfind(" ", start, end + 1)
+                if space == -1:
+                    end = max(end, start + 1)
+                    lines.append(paragraph[start:end])
+                    start = end
+                else:
+                    lines.append(paragraph[start:space])
+                    start = space + 1
+        return lines
+
+    def _out(self, s):
+        # Page content stays text until the page is finished; everything else goes to the buffer as bytes
+        if self.state == 2:
+            return super()._out(s)
+        if not isinstance(s, bytes):
+            s = str(s).encode("latin1")
+        self.buffer.write(s)
+        self.buffer.write(b"\n")
+
+    def _putfonts(self):
+        if self.embedded_fonts is None:
+            return super()._putfonts()
+        for font in self.fonts.values():
+            self._put_embedded_font(font)
+
+    def _put_embedded_font(self, font):
+        # The same objects FPDF writes for a TTF font, built from the cached subset
+        stream, length, widths, cid_map = self.embedded_fonts.subset(font)
+        font["n"] = self.n + 1
+        name = "MPDFA%s+%s" % (chr(ord("A") + font["i"]), font["name"])
+
+        self._newobj()
+        self._out("<</Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H"
+                  " /DescendantFonts [%d 0 R] /ToUnicode %d 0 R>>" % (name, self.n + 1, self.n + 2))
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Type /Font /Subtype /CIDFontType2 /BaseFont /%s /CIDSystemInfo %d 0 R"
+                  " /FontDescriptor %d 0 R" % (name, self.n + 2, self.n + 3))
+        if font["desc"].get("MissingWidth"):
+            self._out("/DW %d" % font["desc"]["MissingWidth"])
+        self._out(widths)
+        self._out("/CIDToGIDMap %d 0 R>>" % (self.n + 4))
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Length %d>>" % len(TO_UNICODE_CMAP))
+        self._putstream(TO_UNICODE_CMAP)
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Registry (Adobe) /Ordering (UCS) /Supplement 0>>")
+        self._out("endobj")
+
+        self._newobj()
+        desc = dict(font["desc"], Flags=(font["desc"]["Flags"] | 4) & ~32)  # Nonsymbolic
+        self._out("<</Type /FontDescriptor /FontName /%s " % name
+                  + " ".join("/%s %s" % item for item in desc.items())
+                  + " /FontFile2 %d 0 R>>" % (self.n + 2))
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Length %d /Filter /FlateDecode>>" % len(cid_map))
+        self._putstream(cid_map)
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Length %d /Filter /FlateDecode /Length1 %d>>" % (len(stream), length))
+        self._putstream(stream)
+        self._out("endobj")
+
+
+class ItineraryRenderer:
+    """Lays out a generated itinerary (the LLM's header/content dict) as a
+    PDF. Text goes through the bundled DejaVu fonts when font_dir has them,
+    so any character the LLM emits renders; otherwise the core Arial font
+    is used with the text folded to Latin-1."""
+
+    def __init__(self, font_dir):
+        fonts = EmbeddedFonts(font_dir)
+        self.fonts = fonts if fonts.available() else None
+        self.family = FONT_FAMILY if self.fonts else FALLBACK_FAMILY
+        self.text = str if self.fonts else latin1_text
+
+    def render(self, itinerary, num_adults, num_children):
+        pdf = ItineraryPDF(self.fonts)
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.add_page()
+
+        header = itinerary['header']
+        pdf.set_font(self.family, "B", TITLE_FONT_SIZE)
+        pdf.cell(0, LINE_HEIGHT, "Travel Itinerary", ln=True, align='C')
+        pdf.ln(10)
+
+        pdf.set_font(self.family, "", FONT_SIZE)
+        fields = Fields(header, num_adults=num_adults, num_children=num_children)
+        for line in HEADER_LINES:
+            pdf.cell(0, LINE_HEIGHT, self.text(line.format_map(fields)), ln=True)
+        pdf.ln(5)
+
+        total_price = self._car_rental(pdf, header.get('car_rental_info') or {})
+        total_price += self._schedule(pdf, itinerary.get('content') or [])
+
+        pdf.set_font(self.family, "", FONT_SIZE)
+        pdf.cell(0, LINE_HEIGHT, f"  Total Price: ${total_price}", ln=True, align='C')
+        pdf.ln(10)
+
+        pdf.close()
+        return pdf.buffer.getvalue()
+
+    def _car_rental(self, pdf, car_rental):
+        if not car_rental:
+            return 0
+        pdf.set_font(self.family, "B", FONT_SIZE)
+        pdf.cell(0, LINE_HEIGHT, "Car Rental Information:", ln=True)
+        pdf.set_font(self.family, "", FONT_SIZE)
+        fields = Fields(car_rental)
+        for line in CAR_RENTAL_LINES:
+            pdf.cell(0, LINE_HEIGHT, self.text(line.format_map(fields)), ln=True)
+        pdf.ln(10)
+        return parse_price(car_rental.get('total_price'))
+
+    def _schedule(self, pdf, content_list):
+        if not content_list:
+            pdf.set_font(self.family, "B", FONT_SIZE)
+            pdf.cell(0, LINE_HEIGHT, "No destination information available.", ln=True)
+            return 0
+
+        pdf.set_font(self.family, "B", FONT_SIZE)
+        pdf.cell(0, LINE_HEIGHT, "Schedule:", ln=True)
+        total_price = 0
+        curr_date = ""
+        for content in content_list:
+            if isinstance(content, dict):
+                total_price += parse_price(content.get('price'))
+                try:
+                    date_obj = datetime.fromisoformat(content.get("time_stamp") or "")
+                except (TypeError, ValueError):
+                    date_obj = None  # Listed under the previous day, with no time
+
+                # Date header whenever the day changes
+                date_formatted = date_obj.strftime("%A %Y-%m-%d") if date_obj else curr_date  # e.g., Saturday 2024-12-14
+                if date_formatted != curr_date:
+                    pdf.ln(5)
+                    pdf.set_font(self.family, "B", FONT_SIZE)
+                    pdf.cell(0, LINE_HEIGHT, date_formatted, border=1, ln=1, align="C")
+                    pdf.set_font(self.family, "", FONT_SIZE)
+                    curr_date = date_formatted
+
+                # Time column, then the details column
+                time_formatted = date_obj.strftime("%I:%M %p") if date_obj else "N/A"
+                pdf.cell(TIME_COLUMN_WIDTH, LINE_HEIGHT, time_formatted, border=0, ln=0, align='C')
+                details = DETAILS_TEMPLATE.format_map(Fields(content))
+                pdf.multi_cell(DETAILS_COLUMN_WIDTH, LINE_HEIGHT, self.text(details), border=1, align='L')
+
+            elif isinstance(content, str):
+                pdf.set_font(self.family, "", FONT_SIZE)
+                pdf.multi_cell(0, LINE_HEIGHT, self.text(f"  Note: {content}"))
+                pdf.ln(5)
+        return total_price
@@ -0,0 +1,92 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, SavedItinerary
+
+
+def encode_cursor(itinerary):
+    # Opaque history page token: the creation time and id of the last itinerary shown
+    text = f"{itinerary.created_at.isoformat()}|{itinerary.id}"
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, itinerary_id = text.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(itinerary_id)
+    except ValueError:
+        raise ValueError("Malformed cursor")
+
+
+def itinerary_etag(saved):
+    # Unedited itineraries keep the trip fingerprint the PDF routes already use as their ETag
+    return saved.trip_key if not saved.revision else f"{saved.trip_key}-r{saved.revision}"
+
+
+class ItineraryStore:
+    """Generated itineraries persisted in the itineraries table: the trip
+    they came from, the itinerary JSON and the rendered PDF. A user has one
+    row per trip fingerprint. All access needs an app context."""
+
+    def save(self, user_id, trip_id, trip_key, trip, itinerary, pdf_bytes):
+        """Insert the itinerary unless the user already has one for the trip,
+        and return the stored row. An existing row, and any days or
+        activities regenerated in it, is never overwritten."""
+        saved = self.find(user_id, trip_key)
+        if saved is not None:
+            return saved
+        saved = SavedItinerary(user_id, trip_id, trip_key, json.dumps(trip), json.dumps(itinerary), pdf_bytes,
+                               datetime.utcnow())
+        saved.destination = trip.get("arrival_city")
+        saved.start_date = trip.get("start_date")
+        saved.end_date = trip.get("end_date")
+        db.session.add(saved)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The same trip was saved concurrently; keep that row
+            db.session.rollback()
+            return self.find(user_id, trip_key)
+        return saved
+
+    def get(self, itinerary_id, user_id):
+        # None if missing or owned by someone else
+        return SavedItinerary.query.filter_by(id=itinerary_id, user_id=user_id).first()
+
+    def find(self, user_id, trip_key):
+        return SavedItinerary.query.filter_by(user_id=user_id, trip_key=trip_key).first()
+
+    def page(self, user_id, cursor=None, limit=10):
+        """One page of a user's itineraries, newest first, and the cursor for
+        the next page (None on the last). Keyset pagination over the
+        (user_id, created_at, id) index, so later pages cost the same as the
+        first. Raises ValueError for a malformed cursor."""
+        query = SavedItinerary.query.filter_by(user_id=user_id)
+        after = decode_cursor(cursor)
+        if after is not None:
+            created_at, itinerary_id = after
+            query = query.filter(db.or_(
+                SavedItinerary.created_at < created_at,
+                db.and_(SavedItinerary.created_at == created_at, SavedItinerary.id < itinerary_id)))
+        rows = query.order_by(SavedItinerary.created_at.desc(), SavedItinerary.id.desc()).limit(limit + 1).all()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def revise(self, saved, itinerary, pdf_bytes):
+        """Store an edited itinerary and its re-rendered PDF as the next
+        revision. Returns False, and changes nothing, if another edit was
+        saved since saved was read."""
+        updated = SavedItinerary.query.filter_by(id=saved.id, revision=saved.revision).update({
+            "data": json.dumps(itinerary),
+            "pdf": pdf_bytes,
+            "revision": saved.revision + 1,
+            "updated_at": datetime.utcnow(),
+        })
+        db.session.commit()
+        return updated == 1
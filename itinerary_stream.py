@@ -0,0 +1,85 @@
+import json
+from datetime import datetime
+
+
+def sse_event(event, data):
+    # Format one server-sent event
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ContentStreamParser:
+    """Incremental JSON parser for a streamed itinerary completion.
+
+    feed() takes raw text chunks and returns every entry of the top-level
+    array (by default "content") that has been fully received so far.
+    result() parses the complete document once the stream has ended."""
+
+    def __init__(self, array_key="content"):
+        self.array_key = array_key
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._in_array = False
+        self._item_start = None
+
+    def feed(self, chunk):
+        self._text += chunk
+        entries = []
+        text = self._text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:self._pos]
+                    # Plain string entries (notes) sit directly inside the array
+                    if self._in_array and self._depth == 2:
+                        entries.append(json.loads(text[self._string_start:self._pos + 1]))
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._last_string == self.array_key:
+                    self._in_array = True
+                elif ch == "{" and self._in_array and self._depth == 3:
+                    self._item_start = self._pos
+            elif ch in "}]":
+                if ch == "}" and self._in_array and self._depth == 3 and self._item_start is not None:
+                    entries.append(json.loads(text[self._item_start:self._pos + 1]))
+                    self._item_start = None
+                elif ch == "]" and self._in_array and self._depth == 2:
+                    self._in_array = False
+                self._depth -= 1
+            self._pos += 1
+        return entries
+
+    def result(self):
+        return json.loads(self._text)
+
+
+class DayProgress:
+    # Groups streamed schedule entries into trip days for progress events
+
+    def __init__(self):
+        self.days = 0
+        self._current_date = None
+
+    def add(self, entry):
+        if isinstance(entry, dict):
+            try:
+                date = datetime.fromisoformat(entry.get("time_stamp", "")).date().isoformat()
+            except (TypeError, ValueError):
+                date = self._current_date
+            if date and date != self._current_date:
+                self._current_date = date
+                self.days += 1
+        return {"day": self.days, "date": self._current_date, "entry": entry}
@@ -0,0 +1,95 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# What a client is told about a failed job; the exception itself only goes to the server log
+JOB_ERROR = "Itinerary generation failed."
+
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {"job_id": self.id, "status": self.status, "error": self.error}
+
+
+class JobQueue:
+    """Runs itinerary jobs on a worker pool.
+
+    Jobs are deduplicated by key while they are queued or running, so
+    identical requests share one job. llm_slot() caps how many workers may
+    be inside the LLM stage at once, independently of the pool size."""
+
+    def __init__(self, max_workers=4, llm_concurrency=2, retention=60 * 60):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="itinerary-job")
+        self._llm_slots = threading.BoundedSemaphore(llm_concurrency)
+        self.retention = retention  # Seconds to keep finished jobs around for polling
+        self._jobs = {}  # job id -> Job
+        self._active = {}  # job key -> Job still queued or running
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def completed(self, key):
+        # A job that is already done, for results that exist without running anything; clients poll it like any other
+        job = Job(key)
+        job.status = DONE
+        job.finished_at = time.time()
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def llm_slot(self):
+        return self._llm_slots
+
+    def _run(self, job, fn, args):
+        job.status = RUNNING
+        try:
+            fn(*args)
+            job.status = DONE
+        except Exception as e:
+            print(f"Itinerary job {job.id} failed: {e}")
+            traceback.print_exc()
+            job.error = JOB_ERROR
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def _prune(self):
+        # Caller must hold the lock
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,414 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+import openai
+
+from compact_prompt import compact_document, expand_document, expand_entry, is_compact
+from itinerary_stream import ContentStreamParser
+
+ITINERARY_MODEL = "gpt-4o-mini"
+
+
+class ItineraryGenerator:
+    """Turns the itinerary prompt into the itinerary JSON text.
+
+    complete() returns the whole document; stream() yields it in chunks as
+    it is produced. Both receive the chat messages, the parsed trip and the
+    part of the itinerary the messages ask for ("itinerary", "skeleton",
+    "day" or "activity"); everything a request asks for is in the messages,
+    part only labels it."""
+
+    def complete(self, messages, trip, part="itinerary"):
+        raise NotImplementedError
+
+    def stream(self, messages, trip, part="itinerary"):
+        yield self.complete(messages, trip, part)
+
+    def last_usage(self):
+        # (prompt tokens, completion tokens) the provider reported for this thread's last call, if it did
+        return None
+
+
+class OpenAIGenerator(ItineraryGenerator):
+    # Chat completions from OpenAI in JSON mode; timeout is (connect, read) seconds, None for openai's default
+
+    def __init__(self, model=ITINERARY_MODEL, timeout=None):
+        self.model = model
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def complete(self, messages, trip, part="itinerary"):
+        completion = openai.ChatCompletion.create(
+            model=self.model,
+            messages=messages,
+            response_format={
+                "type": "json_object"
+            },
+            request_timeout=self.timeout
+        )
+        usage = completion.get("usage")
+        self._local.usage = (usage["prompt_tokens"], usage["completion_tokens"]) if usage else None
+        return completion.choices[0].message.content
+
+    def stream(self, messages, trip, part="itinerary"):
+        chunks = openai.ChatCompletion.create(
+            model=self.model,
+            messages=messages,
+            response_format={
+                "type": "json_object"
+            },
+            stream=True,
+            request_timeout=self.timeout
+        )
+        self._local.usage = None  # Streamed completions don't report usage
+        for chunk in chunks:
+            delta = chunk.choices[0].delta.get("content")
+            if delta:
+                yield delta
+
+    def last_usage(self):
+        return getattr(self._local, "usage", None)
+
+
+def read_prompt(messages):
+    """What an itinerary prompt asks for, read back from its text: "part"
+    ("itinerary", "skeleton", "day" or "activity"), "format" ("full" or
+    "compact"), the trip's dates, cities and car rental as trip fields,
+    "day" for a day or activity, the "place" and "time_stamp" an activity
+    replaces, and a compact prompt's "description_words". Follows the
+    wording of the prompts app.py builds, so only StubGenerator should
+    rely on it; anything missing is left out."""
+    prompt = "\n".join(str(message.get("content", "")) for message in messages or [])
+    request = {"part": "itinerary", "format": "full"}
+    if is_compact(messages):
+        request["format"] = "compact"
+        words = re.search(r'"d" is at most (\d+) words', prompt)
+        if words:
+            request["description_words"] = int(words.group(1))
+        facts = re.search(r"Trip: (.+?) to (.+?), (\d{4}-\d{2}-\d{2}) to (\d{4}-\d{2}-\d{2})", prompt)
+        if facts:
+            request.update(departure_city=facts.group(1), arrival_city=facts.group(2),
+                           start_date=facts.group(3), end_date=facts.group(4))
+        request["car_needed"] = "Yes" if "Car rental: yes" in prompt else "No"
+        day = re.search(r"Write: day \d+ of \d+ \((\d{4}-\d{2}-\d{2})\)", prompt)
+        if day:
+            request.update(part="day", day=day.group(1))
+        return request
+
+    dates = re.findall(r"\d{4}-\d{2}-\d{2}", prompt)
+    if dates:
+        request.update(start_date=min(dates), end_date=max(dates))
+    travel_dates = re.search(r"From (\d{4}-\d{2}-\d{2}) to (\d{4}-\d{2}-\d{2})", prompt)
+    if travel_dates:
+        request.update(start_date=travel_dates.group(1), end_date=travel_dates.group(2))
+    cities = re.search(r"trip from (.+?) to (.+?) in JSON format", prompt)
+    if cities:
+        request.update(departure_city=cities.group(1), arrival_city=cities.group(2))
+    for field, label in (("departure_city", "Departure City"), ("arrival_city", "Arrival City")):
+        city = re.search(rf"{label}: (.+)\.$", prompt, re.M)
+        if city:
+            request[field] = city.group(1)
+    car = re.search(r"Car Rental:\s*- Required: (\w+)", prompt)
+    if car:
+        request["car_needed"] = car.group(1)
+
+    day = re.search(r"Date: (\d{4}-\d{2}-\d{2})", prompt)
+    replaces = re.search(r"It replaces (.+) at (\S+)\. ", prompt)
+    if replaces and day:
+        request.update(part="activity", day=day.group(1), place=replaces.group(1))
+        if replaces.group(2) != "None":
+            request["time_stamp"] = replaces.group(2)
+    elif re.search(r"Plan day \d+ of \d+", prompt) and day:
+        request.update(part="day", day=day.group(1))
+    elif '"days"' in prompt:
+        request["part"] = "skeleton"
+    return request
+
+
+# Vocabulary for the stub's made-up activities
+STUB_MEALS = [(8, "Breakfast at"), (12, "Lunch at"), (19, "Dinner at")]
+STUB_PLACES = ["Riverside Market", "City Art Museum", "Botanical Garden", "Old Town Walking Tour",
+               "Harbor Cruise", "Science Center", "Historic Theater", "Skyline Observation Deck",
+               "Jazz Club", "Street Art District", "Local Brewery"]
+STUB_RESTAURANTS = ["Corner Bistro", "Food Hall", "Harbor Grill", "Taqueria Sol", "Garden Cafe",
+                    "Smokehouse BBQ", "Noodle Bar", "Rooftop Kitchen"]
+STUB_THEMES = ["Museums and history", "Food and markets", "Parks and outdoors", "Neighborhood walks",
+               "Music and nightlife", "Architecture", "Day trip"]
+STUB_WORDS = ["explore", "local", "historic", "views", "guided", "popular", "family", "friendly",
+              "seasonal", "exhibits", "tasting", "neighborhood", "sunset", "walk", "classic", "music"]
+
+
+class StubGenerator(ItineraryGenerator):
+    """Deterministic offline generator for tests and load testing.
+
+    Builds a plausible itinerary for the trip's dates with
+    activities_per_day entries per day (meals included) and descriptions
+    of description_words words, after sleeping for delay seconds plus
+    day_delay seconds per day it writes. When streaming, the delay is
+    spread across the chunks. Like a model, it answers what the messages
+    ask for (see read_prompt), not the trip it is passed: skeleton and
+    single-day prompts get just that piece, an activity prompt gets a
+    different place at the same time, and compact prompts get the compact
+    schema's short keys and capped descriptions."""
+
+    def __init__(self, delay=0.0, activities_per_day=5, description_words=25, chunk_size=32, seed=0, day_delay=0.0):
+        self.delay = delay
+        self.activities_per_day = activities_per_day
+        self.description_words = description_words
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.day_delay = day_delay
+
+    def dates(self, trip):
+        try:
+            start = date.fromisoformat(trip.get("start_date") or "")
+            end = date.fromisoformat(trip.get("end_date") or "")
+        except ValueError:
+            start = end = date.today()
+        return start, end
+
+    def build(self, trip):
+        # The document for a read_prompt() request, or for a plain trip (the whole itinerary)
+        part = trip.get("part")
+        if part == "skeleton":
+            return self.build_skeleton(trip)
+        if part == "day":
+            return {"content": self.build_day(trip, date.fromisoformat(trip["day"]))}
+        if part == "activity":
+            return {"content": [self.build_activity(trip)]}
+
+        start, end = self.dates(trip)
+        num_days = max((end - start).days, 0) + 1
+        content = []
+        for day in range(num_days):
+            content += self.build_day(trip, start + timedelta(days=day))
+        return {"header": self.build_header(trip), "content": content}
+
+    def build_header(self, trip):
+        start, end = self.dates(trip)
+        num_days = max((end - start).days, 0) + 1
+        car_rental_info = {}
+        if trip.get("car_needed") == "Yes":
+            car_rental_info = {
+                "company": "Stub Rentals",
+                "car_type": "Compact",
+                "pick_up_location": trip.get("departure_city") or "",
+                "pick_up_time": f"{start.isoformat()}T07:00",
+                "return_location": trip.get("departure_city") or "",
+                "return_time": f"{end.isoformat()}T20:00",
+                "total_price": str(45 * num_days),
+            }
+
+        return {
+            "departure_city": trip.get("departure_city") or "",
+            "arrival_city": trip.get("arrival_city") or "",
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "car_rental_info": car_rental_info,
+        }
+
+    def build_skeleton(self, trip):
+        start, end = self.dates(trip)
+        days = [start + timedelta(days=day) for day in range(max((end - start).days, 0) + 1)]
+        return {
+            "header": self.build_header(trip),
+            "days": [{"date": day.isoformat(), "theme": STUB_THEMES[i % len(STUB_THEMES)]} for i, day in enumerate(days)],
+        }
+
+    def build_day(self, trip, current):
+        # Seeded per day, so a day is the same whether built alone or as part of the whole trip
+        rng = random.Random(f"{self.seed}:{trip.get('arrival_city')}:{current.isoformat()}")
+        hours = [hour for hour, _ in STUB_MEALS]
+        extra = max(self.activities_per_day - len(STUB_MEALS), 0)
+        hours += [9 + (10 * i) // max(extra, 1) for i in range(extra)]
+        meals = dict(STUB_MEALS)
+        content = []
+        for hour in sorted(hours)[:self.activities_per_day]:
+            if hour in meals:
+                place = f"{meals.pop(hour)} {rng.choice(STUB_RESTAURANTS)}"
+            else:
+                place = rng.choice(STUB_PLACES)
+            content.append({
+                "place": place,
+                "location": f"{rng.randint(1, 999)} Main St, {trip.get('arrival_city') or 'Downtown'}",
+                "time_stamp": f"{current.isoformat()}T{hour:02d}:{rng.choice(['00', '15', '30', '45'])}",
+                "description": " ".join(rng.choice(STUB_WORDS) for _ in range(self.description_words)).capitalize() + ".",
+                "price": str(rng.randint(0, 80)),
+            })
+        return content
+
+    def build_activity(self, trip):
+        rng = random.Random(f"{self.seed}:{trip.get('arrival_city')}:{trip.get('time_stamp')}:{trip.get('place')}")
+        place = rng.choice([place for place in STUB_PLACES if place != trip.get("place")])
+        return {
+            "place": place,
+            "location": f"{rng.randint(1, 999)} Main St, {trip.get('arrival_city') or 'Downtown'}",
+            "time_stamp": trip.get("time_stamp") or f"{trip['day']}T10:00",
+            "description": " ".join(rng.choice(STUB_WORDS) for _ in range(self.description_words)).capitalize() + ".",
+            "price": str(rng.randint(0, 80)),
+        }
+
+    def latency(self, request):
+        # Seconds a real model would spend: a fixed cost plus the days it has to write
+        if request["part"] == "skeleton":
+            days = 0
+        elif request["part"] in ("day", "activity"):
+            days = 1
+        else:
+            start, end = self.dates(request)
+            days = max((end - start).days, 0) + 1
+        return self.delay + self.day_delay * days
+
+    def text(self, request):
+        document = self.build(request)
+        if request["format"] == "compact":
+            document = compact_document(document, request.get("description_words"))
+        return json.dumps(document)
+
+    def complete(self, messages, trip, part="itinerary"):
+        request = read_prompt(messages)
+        delay = self.latency(request)
+        if delay:
+            time.sleep(delay)
+        return self.text(request)
+
+    def stream(self, messages, trip, part="itinerary"):
+        request = read_prompt(messages)
+        text = self.text(request)
+        chunks = [text[start:start + self.chunk_size] for start in range(0, len(text), self.chunk_size)]
+        delay = self.latency(request)
+        pause = delay / len(chunks) if delay and chunks else 0
+        for chunk in chunks:
+            if pause:
+                time.sleep(pause)
+            yield chunk
+
+
+def estimate_tokens(text):
+    # About four characters per token for English text and JSON
+    return (len(text) + 3) // 4
+
+
+class TokenLedger:
+    """Prompt and completion tokens and generation time of every LLM
+    request, totalled by prompt mode ("full" or "compact") and itinerary
+    part, with the last size requests kept for inspection."""
+
+    def __init__(self, size=500):
+        self._recent = deque(maxlen=size)
+        self._totals = {}  # (mode, part) -> request, token and time totals
+        self._lock = threading.Lock()
+
+    def record(self, mode, part, prompt_tokens, completion_tokens, seconds, estimated=False):
+        entry = {"mode": mode, "part": part, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "seconds": round(seconds, 3), "estimated": estimated}
+        with self._lock:
+            self._recent.append(entry)
+            totals = self._totals.setdefault((mode, part), {"requests": 0, "prompt_tokens": 0,
+                                                            "completion_tokens": 0, "seconds": 0.0})
+            totals["requests"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["seconds"] += seconds
+        return entry
+
+    def totals(self):
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._totals.items()}
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+
+class MeteredGenerator(ItineraryGenerator):
+    """Records every request of the wrapped generator in a TokenLedger,
+    under the part the caller passes and the prompt mode (compact when the
+    messages open with the compact system prompt). Token counts are the provider's when it reports them, otherwise
+    estimated from the text; streamed requests are recorded once the
+    stream ends."""
+
+    def __init__(self, generator, ledger):
+        self.generator = generator
+        self.ledger = ledger
+
+    def complete(self, messages, trip, part="itinerary"):
+        start = time.perf_counter()
+        text = self.generator.complete(messages, trip, part)
+        self._record(messages, part, text, time.perf_counter() - start)
+        return text
+
+    def stream(self, messages, trip, part="itinerary"):
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self.generator.stream(messages, trip, part):
+            chunks.append(chunk)
+            yield chunk
+        self._record(messages, part, "".join(chunks), time.perf_counter() - start)
+
+    def _record(self, messages, part, text, seconds):
+        usage = self.generator.last_usage()
+        estimated = usage is None
+        if estimated:
+            prompt = "".join(str(message.get("content", "")) for message in messages)
+            usage = (estimate_tokens(prompt), estimate_tokens(text))
+        mode = "compact" if is_compact(messages) else "full"
+        self.ledger.record(mode, part, usage[0], usage[1], seconds, estimated=estimated)
+
+
+class CompactGenerator(ItineraryGenerator):
+    """Wraps an ItineraryGenerator so compact conversations (see
+    is_compact) come back in the full itinerary shape, descriptions capped
+    at description_words. Other conversations pass straight through."""
+
+    def __init__(self, generator, description_words=15):
+        self.generator = generator
+        self.description_words = description_words
+
+    def complete(self, messages, trip, part="itinerary"):
+        if not is_compact(messages):
+            return self.generator.complete(messages, trip, part)
+        text = self.generator.complete(messages, trip, part)
+        return json.dumps(expand_document(json.loads(text), self.description_words))
+
+    def last_usage(self):
+        return self.generator.last_usage()
+
+    def stream(self, messages, trip, part="itinerary"):
+        """Re-emits the compact stream as full-shape JSON: each schedule
+        entry as soon as it is complete, then the rest of the document
+        (header and anything else) once the stream ends."""
+        if not is_compact(messages):
+            yield from self.generator.stream(messages, trip, part)
+            return
+        parser = ContentStreamParser("c")
+        sent = 0
+        yield '{"content": ['
+        for chunk in self.generator.stream(messages, trip, part):
+            for entry in parser.feed(chunk):
+                yield (", " if sent else "") + json.dumps(expand_entry(entry, self.description_words))
+                sent += 1
+        document = expand_document(parser.result(), self.description_words)
+        for entry in (document.pop("content", None) or [])[sent:]:  # Entries the parser couldn't see (full keys)
+            yield (", " if sent else "") + json.dumps(entry)
+            sent += 1
+        yield "]" + "".join(f", {json.dumps(key)}: {json.dumps(value)}" for key, value in document.items()) + "}"
+
+
+GENERATORS = {
+    "openai": OpenAIGenerator,
+    "stub": StubGenerator,
+}
+
+
+def create_generator(name, **options):
+    try:
+        generator_class = GENERATORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown itinerary generator: {name}")
+    return generator_class(**options)
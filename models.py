@@ -58,3 +58,49 @@ class UserInformation(db.Model):
 
     def __init__(self, keywords_picked):
         self.keywords_picked = keywords_picked
+
+#Trip drafts: the wizard's inputs and selections, saved step by step
+class TripDraft(db.Model):
+    __tablename__ = "trip_drafts"
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
+    data = db.Column(db.Text, nullable=False)  # JSON object of trip fields
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, id, user_id, data, updated_at):
+        self.id = id
+        self.user_id = user_id
+        self.data = data
+        self.updated_at = updated_at
+
+#Generated itineraries: the itinerary JSON and its rendered PDF, one row per user and trip
+class SavedItinerary(db.Model):
+    __tablename__ = "itineraries"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "trip_key"),
+        db.Index("ix_itineraries_user_history", "user_id", "created_at", "id"),  # Trip history pages
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    trip_id = db.Column(db.String(32), db.ForeignKey("trip_drafts.id"))
+    trip_key = db.Column(db.String(64), nullable=False)  # pdf_cache.trip_fingerprint of the trip
+    destination = db.Column(db.String(80))
+    start_date = db.Column(db.String(10))
+    end_date = db.Column(db.String(10))
+    trip = db.Column(db.Text, nullable=False)  # JSON object of the trip fields the itinerary was generated from
+    data = db.Column(db.Text, nullable=False)  # Itinerary JSON
+    pdf = db.deferred(db.Column(db.LargeBinary, nullable=False))  # Only loaded when the PDF is served
+    revision = db.Column(db.Integer, nullable=False, default=0)  # Bumped by each day or activity regeneration
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, user_id, trip_id, trip_key, trip, data, pdf, created_at):
+        self.user_id = user_id
+        self.trip_id = trip_id
+        self.trip_key = trip_key
+        self.trip = trip
+        self.data = data
+        self.pdf = pdf
+        self.revision = 0
+        self.created_at = created_at
+        self.updated_at = created_at
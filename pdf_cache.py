@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Trip fields that determine the generated itinerary
+TRIP_KEY_FIELDS = (
+    "start_date", "end_date", "departure_city", "arrival_city",
+    "flight_needed", "car_needed", "hotel_stars", "budget",
+    "num_adults", "num_children", "departing_flight", "returning_flight", "hotel",
+)
+
+
+def normalize_keywords(keywords):
+    # "Food, music" and "music,food " describe the same trip
+    words = {word.strip().lower() for word in (keywords or "").split(",")}
+    return sorted(word for word in words if word)
+
+
+def trip_fingerprint(trip):
+    # Content address for a trip: sha256 over its normalized parameters
+    normalized = {field: trip.get(field) for field in TRIP_KEY_FIELDS}
+    normalized["num_adults"] = str(normalized["num_adults"])
+    normalized["num_children"] = str(normalized["num_children"])
+    normalized["keywords"] = normalize_keywords(trip.get("keywords"))
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """Rendered itinerary PDFs stored on disk under their trip fingerprint.
+    The least recently used files are evicted once the directory grows past
+    max_bytes."""
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # key -> (size, last used); rebuilt from disk so the cache survives restarts
+        self._index = {}
+        for name in os.listdir(directory):
+            if name.endswith(".pdf"):
+                stat = os.stat(os.path.join(directory, name))
+                self._index[name[:-4]] = (stat.st_size, stat.st_mtime)
+        self._size = sum(size for size, _ in self._index.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._index
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._index:
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self._drop(key)
+                return None
+            self._index[key] = (len(data), time.time())
+            return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Readers never see a half-written file
+
+        with self._lock:
+            if key in self._index:
+                self._size -= self._index[key][0]
+            self._index[key] = (len(data), time.time())
+            self._size += len(data)
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._index), "bytes": self._size, "max_bytes": self.max_bytes}
+
+    def _evict(self):
+        # Caller must hold the lock
+        while self._size > self.max_bytes and len(self._index) > 1:
+            oldest = min(self._index, key=lambda k: self._index[k][1])
+            self._drop(oldest)
+            try:
+                os.remove(self._path(oldest))
+            except FileNotFoundError:
+                pass
+
+    def _drop(self, key):
+        size, _ = self._index.pop(key)
+        self._size -= size
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from search_cache import cache_key
+
+
+class SearchPrefetcher:
+    """Runs searches on a background thread pool and lets later callers join
+    a search that is already in flight instead of starting a new one."""
+
+    def __init__(self, search, max_workers=4):
+        self._search = search
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._inflight = {}  # cache key -> Future
+        self._lock = threading.RLock()  # Done callbacks can fire while we hold it
+
+    def prefetch(self, params_list):
+        # Fire every search in parallel; the results land in the search cache
+        return [self._submit(params) for params in params_list]
+
+    def search(self, params):
+        # Join the in-flight future if there is one, otherwise search inline
+        with self._lock:
+            future = self._inflight.get(cache_key(params))
+        if future is not None:
+            return future.result()
+        return self._search(params)
+
+    def pending(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def _submit(self, params):
+        key = cache_key(params)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._search, params)
+                self._inflight[key] = future
+                future.add_done_callback(lambda f, key=key: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
@@ -0,0 +1,100 @@
+import cProfile
+import os
+import time
+import uuid
+
+from flask import g, request
+from flask_login import current_user
+from werkzeug.wsgi import ClosingIterator
+
+
+def profiling_requested():
+    # Opt in per request with ?profile=1 (or =pyinstrument), or an X-Profile header
+    return request.args.get("profile") or request.headers.get("X-Profile")
+
+
+def is_admin(app):
+    admins = app.config.get("ADMIN_EMAILS", set())
+    return current_user.is_authenticated and current_user.email in admins
+
+
+def rotate(directory, max_files):
+    # Keep only the newest max_files profiles
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file()),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(len(profiles) - max_files, 0)]:
+        os.remove(entry.path)
+
+
+class RequestProfile:
+    """One profiled request. Uses pyinstrument (HTML flamegraph) when asked
+    for and installed, otherwise cProfile (pstats file)."""
+
+    def __init__(self, mode):
+        self.profiler = None
+        self.extension = "prof"
+        if mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+                self.profiler = Profiler()
+                self.extension = "html"
+            except ImportError:
+                pass
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.extension == "html":
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def path(self, directory, name):
+        return os.path.join(directory, f"{name}.{self.extension}")
+
+    def save(self, path):
+        if self.extension == "html":
+            self.profiler.stop()
+            with open(path, "w") as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.disable()
+            self.profiler.dump_stats(path)
+
+
+def init_app(app):
+    @app.before_request
+    def start_profile():
+        if not app.config.get("PROFILING_ENABLED") or not profiling_requested() or not is_admin(app):
+            return
+        profile = RequestProfile(profiling_requested())
+        try:
+            profile.start()
+        except ValueError:
+            return  # Another profiler is already active on this thread
+        g.request_profile = profile
+
+    @app.after_request
+    def save_profile(response):
+        profile = g.pop("request_profile", None)
+        if profile is None:
+            return response
+        directory = app.config["PROFILE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        endpoint = (request.endpoint or "unknown").replace(".", "_")
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+        path = profile.path(directory, name)
+
+        def finish():
+            profile.save(path)
+            rotate(directory, app.config["PROFILE_MAX_FILES"])
+
+        if response.is_streamed:
+            # The body runs after this hook; keep profiling and save once the server closes the response
+            response.response = ClosingIterator(response.response, finish)
+        else:
+            finish()
+        response.headers["X-Profile-Path"] = path
+        return response
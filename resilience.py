@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    # Raised instead of calling an upstream that keeps failing
+    pass
+
+
+class CircuitBreaker:
+    """Fails fast after failure_threshold consecutive failures. Once open,
+    calls raise CircuitOpenError for reset_timeout seconds; then a single
+    trial call is let through (half open), and its outcome closes the
+    breaker again or reopens it for another reset_timeout."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0  # Times the breaker has tripped
+        self.rejected = 0  # Calls failed fast while open
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        # Raises CircuitOpenError unless the call may go ahead
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_running = False
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial_running):
+                self.rejected += 1
+                raise CircuitOpenError(f"Upstream failed {self.failures} times in a row; not calling it for now")
+            if self.state == HALF_OPEN:
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened += 1
+                self._opened_at = self.clock()
+            self._trial_running = False
+
+    def call(self, fn, *args, **kwargs):
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+
+class RateLimiter:
+    """Token bucket: acquire() blocks until the next call may start, so
+    calls average at most rate per second with bursts of up to burst.
+    Waiting callers are served in the order they arrived. A rate of 0 or
+    less never waits."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.acquired = 0
+        self.waited = 0.0  # Seconds callers spent held back
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Seconds waited
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1  # Below zero, the token is reserved from the refill
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.acquired += 1
+            self.waited += wait
+        if wait:
+            self.sleep(wait)
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return {"acquired": self.acquired, "waited_seconds": round(self.waited, 3)}
+
+
+class LatencyWindow:
+    # The last size latencies (seconds) of a call, for percentile-based hedging
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent, min_samples=1):
+        # None until there are min_samples samples
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(int(len(samples) * percent / 100), len(samples) - 1)]
@@ -0,0 +1,148 @@
+import base64
+import threading
+from collections import OrderedDict
+
+from search_cache import cache_key
+from search_records import FlightOption, HotelOption
+
+# Sort options per record type, named like the old client-side dropdown values.
+# Each maps to the record field to sort on; records missing the value sort last.
+SORT_FIELDS = {
+    FlightOption: {
+        "price": "price",
+        "time": "departure_time",
+        "duration": "duration",
+    },
+    HotelOption: {
+        "price": "nightly_rate",
+        "rating": "rating",
+    },
+}
+DEFAULT_SORT = "price-asc"
+
+
+def encode_cursor(sort, position, shown):
+    # Opaque page token: where the next page starts in the sorted order, and how many were shown
+    return base64.urlsafe_b64encode(f"{sort}:{position}:{shown}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    if not cursor:
+        return 0, 0
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        cursor_sort, position, shown = text.rsplit(":", 2)
+        position, shown = int(position), int(shown)
+    except ValueError:
+        raise ValueError("Malformed cursor")
+    if cursor_sort != sort:
+        raise ValueError("Cursor belongs to a different sort order")
+    return position, shown
+
+
+class ResultFilters:
+    """Optional limits on a result set: max_price (per flight or per night),
+    min_rating and min_stars. Unset limits match everything."""
+
+    __slots__ = ("max_price", "min_rating", "min_stars")
+
+    def __init__(self, max_price=None, min_rating=None, min_stars=None):
+        self.max_price = max_price
+        self.min_rating = min_rating
+        self.min_stars = min_stars
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(max_price=args.get("max_price", type=float),
+                   min_rating=args.get("min_rating", type=float),
+                   min_stars=args.get("min_stars", type=int))
+
+    def to_args(self):
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+    def matches(self, record):
+        if isinstance(record, HotelOption):
+            price, rating, stars = record.nightly_rate, record.rating, record.stars
+        else:
+            price, rating, stars = record.price, None, None
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        if self.min_rating is not None and (rating is None or rating < self.min_rating):
+            return False
+        if self.min_stars is not None and (stars is None or stars < self.min_stars):
+            return False
+        return True
+
+
+class ResultIndex:
+    """Sorted orders over one search's records. Each order is a list of
+    positions into records, built the first time that sort is asked for."""
+
+    def __init__(self, records):
+        self.records = records
+        self.record_type = type(records[0]) if records else None
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def sorts(self):
+        return SORT_FIELDS.get(self.record_type, {})
+
+    def order(self, sort):
+        # sort is "<name>-asc" or "<name>-desc"
+        name, _, direction = sort.rpartition("-")
+        field = self.sorts().get(name)
+        if field is None or direction not in ("asc", "desc"):
+            raise ValueError(f"Unknown sort: {sort}")
+        with self._lock:
+            order = self._orders.get(sort)
+            if order is None:
+                present = [i for i, record in enumerate(self.records) if getattr(record, field) is not None]
+                missing = [i for i, record in enumerate(self.records) if getattr(record, field) is None]
+                # Stable sort, so ties keep the provider's order in both directions
+                present.sort(key=lambda i: getattr(self.records[i], field), reverse=direction == "desc")
+                order = self._orders[sort] = present + missing
+            return order
+
+    def page(self, sort, filters=None, cursor=None, limit=10):
+        """One page of records in sort order that pass filters, plus the
+        cursor for the next page (None on the last page) and the number of
+        records shown on earlier pages."""
+        order = self.order(sort)
+        position, shown = decode_cursor(cursor, sort)
+        page = []
+        while position < len(order) and len(page) < limit:
+            record = self.records[order[position]]
+            position += 1
+            if filters is None or filters.matches(record):
+                page.append(record)
+
+        # Only hand out a cursor when something is left to show
+        rest = (self.records[i] for i in order[position:])
+        has_more = any(filters is None or filters.matches(record) for record in rest)
+        next_cursor = encode_cursor(sort, position, shown + len(page)) if has_more else None
+        return page, next_cursor, shown
+
+
+class ResultIndexes:
+    """Indexes for recently paged searches. A page can merge several
+    searches (one per airport pair); its index is rebuilt whenever the
+    cache hands back new records for any of them."""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()  # tuple of cache keys -> (source record lists, ResultIndex)
+        self._lock = threading.Lock()
+
+    def get(self, params_list, record_lists):
+        # record_lists[i] holds the records for params_list[i], or None if that search failed
+        key = tuple(cache_key(params) for params in params_list)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is None or len(entry[0]) != len(record_lists) or \
+                    any(old is not new for old, new in zip(entry[0], record_lists)):
+                merged = [record for records in record_lists if records for record in records]
+                entry = self._indexes[key] = (list(record_lists), ResultIndex(merged))
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+            return entry[1]
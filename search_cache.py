@@ -0,0 +1,185 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Default time-to-live (in seconds) for each SerpAPI engine.
+# Fares move quickly, hotel listings much less so.
+DEFAULT_TTLS = {
+    "google_flights": 10 * 60,
+    "google_hotels": 6 * 60 * 60,
+}
+FALLBACK_TTL = 15 * 60
+
+
+def cache_key(params):
+    # Normalize the params dict so equivalent searches share one entry.
+    # The api_key is never part of the key (or stored anywhere).
+    normalized = {
+        key: str(value)
+        for key, value in params.items()
+        if key != "api_key" and value is not None
+    }
+    return json.dumps(normalized, sort_keys=True)
+
+
+class SearchCache:
+    """In-memory LRU cache for search results with per-engine TTLs and an
+    optional SQLite tier that survives restarts. encode/decode turn a result
+    into the text stored in that tier and back.
+
+    Expired results are kept for stale_ttl more seconds. get_or_fetch can
+    serve one of those while it is refreshed in the background, or when the
+    search fails."""
+
+    def __init__(self, max_entries=256, ttls=None, db_path=None, encode=json.dumps, decode=json.loads, stale_ttl=0):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.encode = encode
+        self.decode = decode
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, engine TEXT, expires_at REAL, payload TEXT)"
+            )
+            self._db.commit()
+
+    def ttl_for(self, params):
+        return self.ttls.get(params.get("engine"), FALLBACK_TTL)
+
+    def get(self, params):
+        key = cache_key(params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                if expires_at + self.stale_ttl <= now:
+                    del self._entries[key]
+
+            # Fall back to the persistent tier and promote fresh rows to memory
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, payload FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[0] > now:
+                    try:
+                        result = self.decode(row[1])
+                    except (KeyError, ValueError):
+                        result = None  # Written in an older format; search again
+                    if result is not None:
+                        self._store(key, row[0], result)
+                        self.persistent_hits += 1
+                        return result
+
+            self.misses += 1
+            return None
+
+    def set(self, params, result):
+        # SerpAPI reports failures as an "error" key; never cache those
+        if result is None or (isinstance(result, dict) and "error" in result):
+            return
+        key = cache_key(params)
+        expires_at = time.time() + self.ttl_for(params)
+        with self._lock:
+            self._store(key, expires_at, result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, engine, expires_at, payload) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, params.get("engine"), expires_at, self.encode(result)),
+                )
+                self._db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time() - self.stale_ttl,))
+                self._db.commit()
+
+    def get_stale(self, params):
+        # An expired result still within stale_ttl, or None
+        key = cache_key(params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, payload FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+                try:
+                    entry = (row[0], self.decode(row[1])) if row else None
+                except (KeyError, ValueError):
+                    entry = None
+            if entry is None or entry[0] > now or entry[0] + self.stale_ttl <= now:
+                return None
+            return entry[1]
+
+    def is_fresh(self, params):
+        # Whether get() would answer from memory without searching
+        with self._lock:
+            entry = self._entries.get(cache_key(params))
+            return entry is not None and entry[0] > time.time()
+
+    def get_or_fetch(self, params, fetch, refresh=None):
+        """The cached result, or fetch(params) stored in the cache. With a
+        stale result at hand, refresh(params) is called to update it in the
+        background and the stale result is returned at once; without a
+        refresh callback the stale result is only returned if fetch raises."""
+        result = self.get(params)
+        if result is not None:
+            return result
+        stale = self.get_stale(params) if self.stale_ttl else None
+        if stale is not None and refresh is not None:
+            refresh(params)
+            return self._served_stale(stale)
+        try:
+            result = fetch(params)
+        except Exception:
+            if stale is None:
+                raise
+            return self._served_stale(stale)
+        self.set(params, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM search_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+            }
+
+    def _served_stale(self, result):
+        with self._lock:
+            self.stale_hits += 1
+        return result
+
+    def _store(self, key, expires_at, result):
+        # Caller must hold the lock
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
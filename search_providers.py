@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from http_pool import HttpPool
+from resilience import CircuitBreaker, LatencyWindow
+from search_cache import cache_key
+from search_records import FlightOption, HotelOption
+
+
+def flight_search_params(departure_code, arrival_code, outbound_date, num_adults, num_children):
+    # SerpAPI query parameters for a one-way flight
+    return {
+        "departure_id": departure_code,
+        "arrival_id": arrival_code,
+        "engine": "google_flights",
+        "gl": "us",
+        "hl": "en",
+        "currency": "USD",
+        "type": "2",  # One-way flight
+        "outbound_date": outbound_date,
+        "adults": num_adults,
+        "children": num_children,
+        "stops": 1,  # Limit to direct flights
+    }
+
+
+def hotel_search_params(arrival_city, start_date, end_date, num_adults, hotel_stars):
+    # SerpAPI query parameters for hotels in the destination city
+    return {
+        "engine": "google_hotels",
+        "q": f"{arrival_city} Resorts",
+        "check_in_date": start_date,
+        "check_out_date": end_date,
+        "adults": num_adults,
+        "children": 0,
+        "currency": "USD",
+        "hotel_class": hotel_stars,
+        "gl": "us",
+        "hl": "en",
+    }
+
+
+def flight_options(results):
+    # One record per "best_flights" entry, from its first leg
+    return [FlightOption.from_result(flight) for flight in results.get("best_flights", [])]
+
+
+def rated_hotels(results):
+    # Hotels without a rating are not shown
+    return [
+        HotelOption.from_result(hotel) for hotel in results.get('properties', [])
+        if hotel.get('overall_rating') is not None
+    ]
+
+
+def project_results(params, results):
+    # Reduce a raw response to the records the pages use, once, before it is cached
+    if "error" in results:
+        raise LookupError(f"Search failed: {results['error']}")
+    if params.get("engine") == "google_hotels":
+        return rated_hotels(results)
+    return flight_options(results)
+
+
+def fixture_name(params):
+    # Stable file name for a search, derived from the same key as the search cache
+    return hashlib.sha1(cache_key(params).encode("utf-8")).hexdigest() + ".json"
+
+
+class SearchProvider:
+    """Source of raw search responses. search() takes the params dict built
+    by flight_search_params/hotel_search_params and returns the SerpAPI-shaped
+    response dict."""
+
+    def search(self, params):
+        raise NotImplementedError
+
+
+SERPAPI_URL = "https://serpapi.com"
+
+
+class SerpApiProvider(SearchProvider):
+    # Live searches against SerpAPI (or base_url, e.g. a mock server) over the shared connection pool
+
+    def __init__(self, api_key, http=None, base_url=SERPAPI_URL):
+        self.api_key = api_key
+        self.http = http or HttpPool()
+        self.base_url = base_url.rstrip("/")
+
+    def search(self, params):
+        response = self.http.get(f"{self.base_url}/search",
+                                 params=dict(params, api_key=self.api_key, output="json", source="python"))
+        # Errors name the status only; the request URL carries the API key
+        if response.status_code >= 500:
+            raise requests.HTTPError(f"SerpAPI returned {response.status_code}", response=response)
+        try:
+            # SerpAPI reports bad searches as JSON with an "error" key, which project_results raises on
+            return response.json()
+        except ValueError:
+            raise requests.HTTPError(f"SerpAPI returned a non-JSON response ({response.status_code})", response=response)
+
+
+class RecordingProvider(SearchProvider):
+    # Passes searches through to another provider and saves every raw response
+
+    def __init__(self, provider, directory):
+        self.provider = provider
+        self.directory = directory
+
+    def search(self, params):
+        results = self.provider.search(params)
+        engine_dir = os.path.join(self.directory, params.get("engine", "unknown"))
+        os.makedirs(engine_dir, exist_ok=True)
+        path = os.path.join(engine_dir, fixture_name(params))
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"params": {k: v for k, v in params.items() if k != "api_key"}, "results": results}, f)
+        os.replace(f"{path}.tmp", path)
+        return results
+
+
+class HedgedProvider(SearchProvider):
+    """Sends a duplicate of a search that has taken longer than the given
+    percentile of recent latencies for its engine, and returns whichever
+    copy answers first. Hedging starts once min_samples searches have
+    finished, and never waits less than min_delay seconds; at the 95th
+    percentile it adds about 5% more upstream calls."""
+
+    def __init__(self, provider, percentile=95, min_samples=20, min_delay=0.05, max_workers=16):
+        self.provider = provider
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.hedged = 0  # Duplicates sent
+        self.hedge_wins = 0  # Duplicates that answered first
+        self._latencies = {}  # engine -> LatencyWindow
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-search")
+
+    def hedge_delay(self, params):
+        # Seconds to wait before hedging this search, or None while there are too few samples
+        delay = self._window(params).percentile(self.percentile, self.min_samples)
+        return None if delay is None else max(delay, self.min_delay)
+
+    def search(self, params):
+        delay = self.hedge_delay(params) if self.percentile else None
+        if delay is None:
+            return self._search(params)
+
+        futures = [self._executor.submit(self._search, params)]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            with self._lock:
+                self.hedged += 1
+            futures.append(self._executor.submit(self._search, params))
+
+        # The first copy to succeed wins; the other is left to finish in the background
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is not futures[0]:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return result
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return {"hedged": self.hedged, "hedge_wins": self.hedge_wins}
+
+    def _search(self, params):
+        start = time.perf_counter()
+        result = self.provider.search(params)
+        self._window(params).add(time.perf_counter() - start)
+        return result
+
+    def _window(self, params):
+        engine = params.get("engine", "unknown")
+        with self._lock:
+            window = self._latencies.get(engine)
+            if window is None:
+                window = self._latencies[engine] = LatencyWindow()
+            return window
+
+
+class CircuitBreakerProvider(SearchProvider):
+    # Stops calling a provider that keeps raising; see resilience.CircuitBreaker
+
+    def __init__(self, provider, breaker=None):
+        self.provider = provider
+        self.breaker = breaker or CircuitBreaker()
+
+    def search(self, params):
+        return self.breaker.call(self.provider.search, params)
+
+
+class ReplayProvider(SearchProvider):
+    """Serves recorded responses from disk after an artificial latency.
+
+    Searches with no exact recording fall back to another recording for the
+    same engine (chosen deterministically from the params) unless strict
+    is set, so soak tests can use arbitrary dates and passenger counts."""
+
+    def __init__(self, directory, latency=0.0, jitter=0.0, strict=False):
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.strict = strict
+        self._fixtures = {}  # path -> parsed response
+
+    def search(self, params):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        return self._load(self._fixture_path(params))
+
+    def _fixture_path(self, params):
+        engine_dir = os.path.join(self.directory, params.get("engine", "unknown"))
+        path = os.path.join(engine_dir, fixture_name(params))
+        if os.path.exists(path) or self.strict:
+            return path
+
+        recorded = sorted(name for name in os.listdir(engine_dir) if name.endswith(".json")) \
+            if os.path.isdir(engine_dir) else []
+        if not recorded:
+            raise LookupError(f"No recorded {params.get('engine')} responses in {engine_dir}")
+        index = int(fixture_name(params)[:8], 16) % len(recorded)
+        return os.path.join(engine_dir, recorded[index])
+
+    def _load(self, path):
+        results = self._fixtures.get(path)
+        if results is None:
+            with open(path) as f:
+                results = json.load(f)["results"]
+            self._fixtures[path] = results
+        return results
+
+
+class SyntheticProvider(SearchProvider):
+    """Generates SerpAPI-shaped responses from the params alone, with no
+    network or fixtures. Used by the benchmarks; num_flights and num_hotels
+    control the payload size."""
+
+    def __init__(self, num_flights=12, num_hotels=20, latency=0.0):
+        self.num_flights = num_flights
+        self.num_hotels = num_hotels
+        self.latency = latency
+
+    def search(self, params):
+        if self.latency:
+            time.sleep(self.latency)
+        rng = random.Random(cache_key(params))
+        if params.get("engine") == "google_hotels":
+            return {"properties": [self._hotel(rng, params, i) for i in range(self.num_hotels)]}
+        return {"best_flights": [self._flight(rng, params, i) for i in range(self.num_flights)]}
+
+    def _flight(self, rng, params, i):
+        day = params.get("outbound_date")
+        departs = 6 * 60 + rng.randint(0, 15 * 60)
+        duration = rng.randint(90, 330)
+        arrives = departs + duration
+        airline = rng.choice(["American", "Delta", "United", "Southwest", "Alaska", "JetBlue"])
+        return {
+            "flights": [{
+                "departure_airport": {"name": f"{params.get('departure_id')} International Airport",
+                                      "id": params.get("departure_id"),
+                                      "time": f"{day} {departs // 60:02d}:{departs % 60:02d}"},
+                "arrival_airport": {"name": f"{params.get('arrival_id')} International Airport",
+                                    "id": params.get("arrival_id"),
+                                    "time": f"{day} {arrives // 60 % 24:02d}:{arrives % 60:02d}"},
+                "duration": duration,
+                "airplane": rng.choice(["Airbus A321", "Boeing 737", "Embraer 175"]),
+                "airline": airline,
+                "airline_logo": f"https://www.gstatic.com/flights/airline_logos/70px/{airline[:2].upper()}.png",
+                "travel_class": "Economy",
+                "flight_number": f"{airline[:2].upper()} {rng.randint(100, 2999)}",
+                "legroom": "30 in",
+                "extensions": ["Average legroom (30 in)", "Wi-Fi for a fee", "In-seat power & USB outlets"],
+            }],
+            "total_duration": duration,
+            "carbon_emissions": {"this_flight": rng.randint(80000, 200000), "typical_for_this_route": 120000},
+            "price": rng.randint(89, 650),
+            "type": "One way",
+            "airline_logo": f"https://www.gstatic.com/flights/airline_logos/70px/{airline[:2].upper()}.png",
+            "booking_token": "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(120)),
+        }
+
+    def _hotel(self, rng, params, i):
+        city = params.get("q", "").replace(" Resorts", "")
+        stars = rng.randint(2, 5)
+        rate = rng.randint(70, 520)
+        return {
+            "type": "hotel",
+            "name": f"{city} {rng.choice(['Grand', 'Plaza', 'Harbor', 'Central', 'Park'])} Hotel {i + 1}",
+            "description": "Relaxed hotel with a pool, a fitness center and free Wi-Fi near downtown.",
+            "link": f"https://example.com/hotels/{i + 1}",
+            "gps_coordinates": {"latitude": 30 + rng.random(), "longitude": -97 - rng.random()},
+            "check_in_time": "3:00 PM",
+            "check_out_time": "11:00 AM",
+            "rate_per_night": {"lowest": f"${rate}", "extracted_lowest": rate},
+            "total_rate": {"lowest": f"${rate * 3}", "extracted_lowest": rate * 3},
+            "hotel_class": f"{stars}-star hotel",
+            "extracted_hotel_class": stars,
+            "images": [{"thumbnail": f"https://example.com/img/{i}-{n}.jpg",
+                        "original_image": f"https://example.com/img/{i}-{n}-full.jpg"} for n in range(8)],
+            "overall_rating": round(rng.uniform(3.0, 5.0), 1) if rng.random() > 0.1 else None,
+            "reviews": rng.randint(20, 4000),
+            "amenities": ["Free Wi-Fi", "Pool", "Fitness center", "Restaurant", "Air conditioning",
+                          "Bar", "Room service", "Accessible"],
+        }
+
+
+def create_provider(mode, api_key=None, directory=None, latency=0.0, jitter=0.0, http=None, base_url=SERPAPI_URL):
+    # mode is "live", "record", "replay" or "synthetic"; http and base_url are for the live modes
+    if mode == "synthetic":
+        return SyntheticProvider(latency=latency)
+    if mode == "live":
+        return SerpApiProvider(api_key, http, base_url)
+    if mode == "record":
+        return RecordingProvider(SerpApiProvider(api_key, http, base_url), directory)
+    if mode == "replay":
+        return ReplayProvider(directory, latency=latency, jitter=jitter)
+    raise ValueError(f"Unknown search provider mode: {mode}")
@@ -0,0 +1,89 @@
+import json
+
+
+class SearchRecord:
+    """A search result reduced to the fields the wizard pages and the
+    itinerary prompt use. Subclasses list those fields in __slots__, in the
+    order used by the compact row form."""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def to_row(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_row(cls, row):
+        if not isinstance(row, list) or len(row) != len(cls.__slots__):
+            raise ValueError(f"Expected {len(cls.__slots__)} {cls.__name__} fields")
+        return cls(*row)
+
+    def to_dict(self):
+        return dict(zip(self.__slots__, self.to_row()))
+
+    def token(self):
+        # Form value for a radio button; replaces the old pipe-delimited string
+        return json.dumps(self.to_row(), separators=(",", ":"))
+
+    @classmethod
+    def from_token(cls, token):
+        try:
+            row = json.loads(token)
+        except (TypeError, ValueError):
+            raise ValueError(f"Malformed {cls.__name__} selection")
+        return cls.from_row(row)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class FlightOption(SearchRecord):
+    # First leg of a "best_flights" entry
+    __slots__ = ("price", "flight_number", "departure_airport", "departure_time",
+                 "arrival_airport", "arrival_time", "duration")
+
+    @classmethod
+    def from_result(cls, flight):
+        leg = flight['flights'][0]
+        return cls(flight.get('price'), leg['flight_number'],
+                   leg['departure_airport']['name'], leg['departure_airport']['time'],
+                   leg['arrival_airport']['name'], leg['arrival_airport']['time'],
+                   flight.get('total_duration', leg.get('duration')))  # Minutes
+
+
+class HotelOption(SearchRecord):
+    # One hotel "properties" entry; nightly_rate and stars are the numbers used for sorting and filtering
+    __slots__ = ("name", "price_per_night", "nightly_rate", "rating", "hotel_class", "stars", "thumbnail")
+
+    @classmethod
+    def from_result(cls, hotel):
+        rate = hotel.get('rate_per_night') or {}
+        images = hotel.get('images') or [{}]
+        return cls(hotel.get('name'), rate.get('lowest'), rate.get('extracted_lowest'),
+                   hotel.get('overall_rating'), hotel.get('hotel_class'), hotel.get('extracted_hotel_class'),
+                   images[0].get('thumbnail'))
+
+
+RECORD_TYPES = {record_type.__name__: record_type for record_type in (FlightOption, HotelOption)}
+
+
+def encode_records(records):
+    # Compact JSON for the persistent cache tier: the record type once, then one list of values per record
+    record_type = type(records[0]).__name__ if records else None
+    return json.dumps({"type": record_type, "rows": [record.to_row() for record in records]},
+                      separators=(",", ":"))
+
+
+def decode_records(payload):
+    data = json.loads(payload)
+    if not data["rows"]:
+        return []
+    record_type = RECORD_TYPES[data["type"]]
+    return [record_type.from_row(row) for row in data["rows"]]
@@ -0,0 +1,235 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from collections import namedtuple
+
+from flask import abort, request, send_file
+from werkzeug.utils import safe_join
+
+from instrumentation import timer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Only gzip then; pip install brotli for .br variants and br responses
+
+# Types worth compressing; images, fonts and PDFs (whose streams are already deflated) are left alone
+COMPRESSIBLE = {"text/html", "text/css", "text/plain", "text/csv", "text/javascript", "application/javascript",
+                "application/json", "image/svg+xml"}
+
+# Fingerprinted URLs name one version of a file forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# The content hash added to a fingerprinted filename: style.css -> style.0123456789ab.css
+HASH_LENGTH = 12
+FINGERPRINT = re.compile(r"\.[0-9a-f]{%d}(?=\.[^./]*$|$)" % HASH_LENGTH)
+
+Asset = namedtuple("Asset", "path mtime_ns size digest mimetype url_name variants")  # variants: {encoding: path}
+
+
+def fingerprinted(filename, digest):
+    root, ext = posixpath.splitext(filename)
+    return f"{root}.{digest}{ext}"
+
+
+def compress(body, encoding, level=6):
+    # level is gzip's 1-9; brotli's quality scale (0-11) is bigger, so it gets a little more
+    if encoding == "br":
+        return brotli.compress(body, quality=min(level + 5, 11))
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def encodings():
+    # Best first
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def accepted_encoding(accept_encodings, available=None):
+    # The best encoding the request accepts, out of available (default: any we can produce); None for identity
+    for encoding in encodings():
+        if (available is None or encoding in available) and accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+class StaticAssets:
+    """Content-hashed names and precompressed variants for the files in
+    static_folder.
+
+    build() hashes every file and writes a gzip (and, with brotli
+    installed, a brotli) copy of each compressible one into build_dir,
+    keeping only variants at least 10% smaller. A file that changes on
+    disk is hashed and compressed again the next time it is looked up, so
+    its URL changes with it."""
+
+    def __init__(self, static_folder, build_dir, min_size=1024, level=9):
+        self.static_folder = static_folder
+        self.build_dir = build_dir
+        self.min_size = min_size
+        self.level = level
+        self._assets = {}  # filename -> Asset
+        self._by_url_name = {}  # fingerprinted name -> filename
+        self._lock = threading.Lock()
+
+    def build(self):
+        # Hash and precompress everything up front, so the first page view doesn't have to
+        if not os.path.isdir(self.static_folder):
+            return
+        for directory, _, files in os.walk(self.static_folder):
+            for name in files:
+                path = os.path.join(directory, name)
+                self.asset(os.path.relpath(path, self.static_folder).replace(os.sep, "/"))
+
+    def asset(self, filename):
+        # The current Asset for filename, rebuilt if the file changed; None if there is no such file
+        path = safe_join(self.static_folder, filename)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None or not os.path.isfile(path):
+            return None
+        current = self._assets.get(filename)
+        if current and (current.mtime_ns, current.size) == (stat.st_mtime_ns, stat.st_size):
+            return current
+
+        with open(path, "rb") as f:
+            body = f.read()
+        digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        variants = {}
+        if mimetype in COMPRESSIBLE and len(body) >= self.min_size:
+            for encoding in encodings():
+                compressed = compress(body, encoding, self.level)
+                if len(compressed) <= len(body) * 0.9:
+                    variants[encoding] = self._write_variant(fingerprinted(filename, digest), encoding, compressed)
+        asset = Asset(path, stat.st_mtime_ns, stat.st_size, digest, mimetype, fingerprinted(filename, digest), variants)
+        with self._lock:
+            if current:
+                self._by_url_name.pop(current.url_name, None)
+            self._assets[filename] = asset
+            self._by_url_name[asset.url_name] = filename
+        return asset
+
+    def url_name(self, filename):
+        # What url_for('static') should link to: the fingerprinted name, or filename itself if it isn't a file
+        asset = self.asset(filename)
+        return asset.url_name if asset else filename
+
+    def resolve(self, requested):
+        """(filename, Asset, immutable) for a requested static path: a
+        current fingerprinted name is immutable; a plain name, or one with an
+        outdated hash (a page cached from before a deploy), gets the current
+        file but has to be revalidated. Asset is None if nothing matches."""
+        filename = self._by_url_name.get(requested)
+        if filename is not None:
+            asset = self.asset(filename)
+            if asset and asset.url_name == requested:
+                return filename, asset, True
+        asset = self.asset(requested)
+        if asset is None:
+            # Not looked up yet (a file added since build()), or an outdated hash
+            filename = FINGERPRINT.sub("", requested, count=1)
+            asset = self.asset(filename)
+            return filename, asset, asset is not None and asset.url_name == requested
+        return requested, asset, False
+
+    def stats(self):
+        with self._lock:
+            assets = list(self._assets.values())
+        return {"files": len(assets), "bytes": sum(asset.size for asset in assets),
+                "variants": {encoding: sum(os.path.getsize(asset.variants[encoding]) for asset in assets
+                                           if encoding in asset.variants)
+                             for encoding in encodings()}}
+
+    def _write_variant(self, url_name, encoding, compressed):
+        path = os.path.join(self.build_dir, f"{url_name}.{'br' if encoding == 'br' else 'gz'}")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp, "wb") as f:
+                f.write(compressed)
+            os.replace(temp, path)
+        return path
+
+
+class ResponseCompressor:
+    """Compresses dynamic responses (rendered pages, JSON) of at least
+    min_size bytes for clients that accept it, with brotli when installed
+    and gzip otherwise."""
+
+    def __init__(self, min_size=1024, level=6):
+        self.min_size = min_size
+        self.level = level
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def wants(self, response):
+        return (response.status_code == 200 and not response.direct_passthrough and not response.is_streamed
+                and "Content-Encoding" not in response.headers and response.mimetype in COMPRESSIBLE
+                and (response.content_length or 0) >= self.min_size)
+
+    def apply(self, response, accept_encodings):
+        if not self.wants(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = accepted_encoding(accept_encodings)
+        if encoding is None:
+            return response
+        body = response.get_data()
+        with timer("compress", kind="stage"):
+            compressed = compress(body, encoding, self.level)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)  # Same content, different bytes
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(compressed)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {"responses": self.responses, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+
+
+def init_app(app, assets, compressor):
+    default_static = app.view_functions["static"]
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == "static" and "filename" in values and app.config.get("STATIC_FINGERPRINT"):
+            values["filename"] = assets.url_name(values["filename"])
+
+    def static_file(filename):
+        # Replaces Flask's static view: fingerprinted names are cached for good, and precompressed variants are sent when accepted
+        if not app.config.get("STATIC_FINGERPRINT"):
+            return default_static(filename=filename)
+        filename, asset, immutable = assets.resolve(filename)
+        if asset is None:
+            abort(404)
+        encoding = accepted_encoding(request.accept_encodings, asset.variants)
+        response = send_file(asset.variants[encoding] if encoding else asset.path, mimetype=asset.mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if asset.variants:
+            response.vary.add("Accept-Encoding")
+        if immutable:
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    app.view_functions["static"] = static_file
+
+    @app.after_request
+    def compress_response(response):
+        if not app.config.get("COMPRESS_RESPONSES"):
+            return response
+        return compressor.apply(response, request.accept_encodings)
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from airports import AirportIndex
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.fixture(scope="module")
+def index():
+    return AirportIndex(os.path.join(DATA, "airports.csv"), os.path.join(DATA, "metro_areas.csv"),
+                        os.path.join(DATA, "large_airports.txt"))
+
+
+def test_search_keeps_airport_and_metro_with_the_same_code(index):
+    results = index.search("DFW")
+    assert [(result["kind"], result["code"]) for result in results[:2]] == [("airport", "DFW"), ("metro", "DFW")]
+    assert results[1]["airports"] == ["DAL", "DFW"]
+
+
+@pytest.mark.parametrize("code", ["DFW", "HOU", "BKK", "IST", "OSL", "NGO", "SHA", "TPE", "MEL", "DXB"])
+def test_a_bare_code_is_the_airport(index, code):
+    assert index.resolve(code).codes == [code]
+
+
+def test_suggestion_labels_resolve_to_what_was_picked(index):
+    for result in index.search("DFW") + index.search("Houston"):
+        assert index.resolve(result["label"]).codes == result["airports"]
+
+
+def test_city_names(index):
+    assert index.resolve("Dallas").codes == ["DAL", "DFW"]
+    assert index.resolve("NYC").codes == ["EWR", "JFK", "LGA"]
+    assert index.resolve("Seattle").codes == ["SEA"]
+
+
+def test_namesakes_are_not_merged(index):
+    assert index.resolve("Portland").codes == ["PDX"]
+    assert index.resolve("Portland, Maine").codes == ["PWM"]
+    assert index.resolve("Springfield, Illinois").codes == ["SPI"]
+    assert index.resolve("Melbourne, US").codes == ["MLB"]
+    assert index.resolve("Melbourne").codes == ["AVV", "MEL"]
+    assert len(index.resolve("Springfield").codes) == 1
+
+
+def test_search_ranks_bigger_airports_first(index):
+    assert index.search("port")[0]["code"] == "PDX"
+    assert index.resolve("Nowhere") is None
+    assert index.search("") == []
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from batch import BatchRunner, pdf_filename, read_trip_specs
+
+NDJSON = """{"ref": "austin", "arrival_city": "Austin"}
+
+{"ref": "denver", "arrival_city": "Denver"}
+"""
+
+
+def test_read_trip_specs_formats():
+    trips = [{"ref": "austin", "arrival_city": "Austin"}, {"ref": "denver", "arrival_city": "Denver"}]
+    assert read_trip_specs(NDJSON, "ndjson") == trips
+    assert read_trip_specs('[{"ref": "austin", "arrival_city": "Austin"}, {"ref": "denver", "arrival_city": "Denver"}]') == trips
+    assert read_trip_specs('{"trips": [{"ref": "austin"}]}') == [{"ref": "austin"}]
+    assert read_trip_specs("ref,arrival_city,keywords\naustin, Austin ,\n", "csv") == [{"ref": "austin", "arrival_city": "Austin"}]
+
+
+@pytest.mark.parametrize("line", ['{"ref": "broken", ', '["not", "a", "trip"]', "42"])
+def test_ndjson_names_the_malformed_line(line):
+    with pytest.raises(ValueError, match="Line 3 "):
+        read_trip_specs(NDJSON.replace("\n\n", f"\n\n{line}\n"), "ndjson")
+
+
+@pytest.mark.parametrize("text", ['{"ref": "one"}', '[{"ref": "one"}, "two"]', "{not json"])
+def test_json_that_is_not_a_trip_list_is_rejected(text):
+    with pytest.raises(ValueError):
+        read_trip_specs(text)
+
+
+def test_pdf_filenames_are_numbered_and_safe():
+    assert pdf_filename(0, "../../etc/passwd") == "001-etc_passwd.pdf"
+    assert pdf_filename(11, "") == "012-trip.pdf"
+
+
+def test_one_failing_trip_does_not_stop_the_batch():
+    started = threading.Barrier(3, timeout=5)  # Every trip is running before any finishes
+
+    def plan(index, spec, progress):
+        progress("search")
+        started.wait()
+        if spec.get("fail"):
+            progress("itinerary")
+            raise RuntimeError("LLM unavailable")
+        progress("itinerary")
+        return {"pdf": f"{index}.pdf"}
+
+    specs = [{"ref": "a"}, {"ref": "b", "fail": True}, {}]
+    events = list(BatchRunner(plan, max_workers=3).run(specs))
+
+    finished = {event["ref"]: event for event in events if event["event"] in ("done", "failed")}
+    assert set(finished) == {"a", "b", "3"}  # A trip without a ref is named by its position
+    assert finished["a"]["pdf"] == "0.pdf" and finished["3"]["pdf"] == "2.pdf"
+    assert (finished["b"]["event"], finished["b"]["stage"], finished["b"]["error"]) == ("failed", "itinerary", "LLM unavailable")
+
+    summary = events[-1]
+    assert (summary["event"], summary["trips"], summary["done"], summary["failed"]) == ("summary", 3, 2, 1)
+    assert [event["event"] for event in events].count("progress") == 6
+    for ref in ("a", "b", "3"):
+        stages = [event["stage"] for event in events if event["event"] == "progress" and event["ref"] == ref]
+        assert stages == ["search", "itinerary"]
+        assert events.index(finished[ref]) > max(i for i, event in enumerate(events)
+                                                 if event["event"] == "progress" and event["ref"] == ref)
+
+
+def test_an_empty_batch_is_just_a_summary():
+    [summary] = BatchRunner(lambda index, spec, progress: {}).run([])
+    assert (summary["event"], summary["trips"], summary["done"], summary["failed"]) == ("summary", 0, 0, 0)
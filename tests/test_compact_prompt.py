@@ -0,0 +1,52 @@
+import json
+
+from compact_prompt import system_prompt
+from llm import CompactGenerator, ItineraryGenerator
+
+COMPACT = [{"role": "system", "content": system_prompt(15)}, {"role": "user", "content": "Trip: Chicago to Austin"}]
+FULL = [{"role": "system", "content": "You are a travel planner."}, {"role": "user", "content": "Plan it"}]
+ANSWER = {"h": {"dc": "Chicago", "ac": "Austin", "car": {"co": "Stub Rentals"}},
+          "c": [{"p": "Museum", "t": "2024-05-01T10:00", "d": "one two three four", "$": 12}, "Bring a hat",
+                {"p": "Market", "t": "2024-05-01T12:00", "d": "lunch", "$": 0}]}
+
+
+class FixedGenerator(ItineraryGenerator):
+    # Answers every conversation with text, in small chunks when streamed
+    def __init__(self, text):
+        self.text = text
+
+    def complete(self, messages, trip, part="itinerary"):
+        return self.text
+
+    def stream(self, messages, trip, part="itinerary"):
+        for start in range(0, len(self.text), 7):
+            yield self.text[start:start + 7]
+
+    def last_usage(self):
+        return (10, 20)
+
+
+def test_is_an_itinerary_generator():
+    generator = CompactGenerator(FixedGenerator("{}"))
+    assert isinstance(generator, ItineraryGenerator)
+    assert generator.last_usage() == (10, 20)
+
+
+def test_complete_expands_compact_answers():
+    document = json.loads(CompactGenerator(FixedGenerator(json.dumps(ANSWER)), 2).complete(COMPACT, {}))
+    assert document["header"] == {"departure_city": "Chicago", "arrival_city": "Austin",
+                                  "car_rental_info": {"company": "Stub Rentals"}}
+    assert document["content"][0] == {"place": "Museum", "time_stamp": "2024-05-01T10:00", "description": "one two",
+                                      "price": 12}
+    assert document["content"][1] == "Bring a hat"
+
+
+def test_stream_matches_complete():
+    generator = CompactGenerator(FixedGenerator(json.dumps(ANSWER)), 2)
+    assert json.loads("".join(generator.stream(COMPACT, {}))) == json.loads(generator.complete(COMPACT, {}))
+
+
+def test_full_conversations_pass_through():
+    generator = CompactGenerator(FixedGenerator(json.dumps(ANSWER)))
+    assert generator.complete(FULL, {}) == json.dumps(ANSWER)
+    assert "".join(generator.stream(FULL, {})) == json.dumps(ANSWER)
@@ -0,0 +1,33 @@
+from day_plan_cache import DayPlanCache
+
+TRIP = {"start_date": "2024-05-01", "end_date": "2024-05-05", "arrival_city": "Austin", "keywords": "food",
+        "budget": "low", "num_adults": "2", "num_children": "0"}
+
+
+def itinerary(trip_dates):
+    return {"days": [{"date": day, "theme": f"Theme {day}"} for day in trip_dates],
+            "content": [{"time_stamp": f"{day}T10:00", "place": f"Museum {day}"} for day in trip_dates]}
+
+
+def test_lookup_deals_out_sightseeing_days_redated():
+    cache = DayPlanCache()
+    cache.store(TRIP, itinerary(["2024-05-01", "2024-05-02", "2024-05-03", "2024-05-04", "2024-05-05"]))
+    later = dict(TRIP, start_date="2024-06-01", end_date="2024-06-04")
+    cached = cache.lookup(later)
+    assert list(cached) == ["2024-06-02", "2024-06-03"]  # Travel days are left for the LLM
+    assert cached["2024-06-02"]["content"][0]["time_stamp"] == "2024-06-02T10:00"
+
+
+def test_only_reused_days_count():
+    cache = DayPlanCache()
+    cache.store(TRIP, itinerary(["2024-05-01", "2024-05-02", "2024-05-03", "2024-05-04", "2024-05-05"]))
+    later = dict(TRIP, start_date="2024-06-01", end_date="2024-06-04")
+    assert cache.lookup(later)
+    assert cache.stats()["hits"] == 0  # Looking is not reusing; the caller may plan without them
+
+    cache.store(later, itinerary(["2024-06-01", "2024-06-02", "2024-06-03", "2024-06-04"]))
+    cached = cache.lookup(later)
+    cache.store(later, itinerary(["2024-06-01", "2024-06-02", "2024-06-03", "2024-06-04"]), reused=cached, calls_saved=3)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["days_reused"], stats["llm_calls_saved"]) == (1, 2, 2, 3)
+    assert stats["days_generated"] == 5 + 4 + 2
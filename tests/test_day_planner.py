@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+
+import pytest
+
+from day_planner import DayPlanError, DayPlanner, parse_day
+from llm import ItineraryGenerator
+
+TRIP = {"departure_city": "Chicago", "arrival_city": "Austin", "start_date": "2024-05-01", "end_date": "2024-05-04",
+        "car_needed": "No"}
+DAYS = ["2024-05-01", "2024-05-02", "2024-05-03", "2024-05-04"]
+
+
+def skeleton_messages(trip):
+    return [{"role": "user", "content": "skeleton"}]
+
+
+def day_messages(trip, skeleton, day):
+    return [{"role": "user", "content": day}]
+
+
+def activity(day, hour, place):
+    return {"place": place, "time_stamp": f"{day}T{hour:02d}:00", "description": "", "price": "0"}
+
+
+class ScriptedGenerator(ItineraryGenerator):
+    """Answers skeleton and day prompts; earlier days take longer, so they
+    finish last, and each day in fail_once first gets a malformed answer."""
+
+    def __init__(self, fail_once=(), always_fail=()):
+        self.fail_once = set(fail_once)
+        self.always_fail = set(always_fail)
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def complete(self, messages, trip, part="itinerary"):
+        prompt = messages[-1]["content"]
+        with self.lock:
+            self.calls[prompt] = self.calls.get(prompt, 0) + 1
+            first = self.calls[prompt] == 1
+        if part == "skeleton":
+            return json.dumps({"header": {"arrival_city": trip["arrival_city"]},
+                               "days": [{"date": day, "theme": f"Theme {day}"} for day in DAYS]})
+        time.sleep(0.02 * (len(DAYS) - DAYS.index(prompt)))
+        if prompt in self.always_fail or (first and prompt in self.fail_once):
+            return '{"content": [{"place": "Nowhere", "time_stamp": "2020-01-01T09:00"}]}'
+        return json.dumps({"content": [activity(prompt, 9, f"Museum {prompt}"), "Walk over",
+                                       activity(prompt, 12, f"Lunch {prompt}")]})
+
+
+def test_days_are_merged_in_order_whatever_order_they_finish():
+    generator = ScriptedGenerator(fail_once=["2024-05-02"])
+    planner = DayPlanner(generator, skeleton_messages, day_messages, max_concurrency=4, max_attempts=2)
+
+    finished = [day for _, day, _ in planner.fill_days(TRIP, planner.skeleton(TRIP))]
+    assert sorted(finished) == DAYS
+    assert finished != DAYS  # Later days answer sooner
+
+    itinerary = planner.generate(TRIP)
+    assert [plan["date"] for plan in itinerary["days"]] == DAYS
+    assert itinerary["header"]["start_date"] == "2024-05-01"
+    assert itinerary["header"]["end_date"] == "2024-05-04"
+    places = [entry["place"] if isinstance(entry, dict) else entry for entry in itinerary["content"]]
+    assert places == [item for day in DAYS for item in (f"Museum {day}", "Walk over", f"Lunch {day}")]
+
+
+def test_a_failed_day_is_retried_on_its_own():
+    generator = ScriptedGenerator(fail_once=["2024-05-02"])
+    planner = DayPlanner(generator, skeleton_messages, day_messages, max_attempts=2)
+    planner.generate(TRIP)
+    assert generator.calls == {"skeleton": 1, "2024-05-01": 1, "2024-05-02": 2, "2024-05-03": 1, "2024-05-04": 1}
+
+
+def test_a_day_that_keeps_failing_fails_the_itinerary():
+    generator = ScriptedGenerator(always_fail=["2024-05-03"])
+    planner = DayPlanner(generator, skeleton_messages, day_messages, max_attempts=3)
+    with pytest.raises(DayPlanError, match="2024-05-03"):
+        planner.generate(TRIP)
+    assert generator.calls["2024-05-03"] == 3
+
+
+def test_cached_days_are_not_generated():
+    generator = ScriptedGenerator()
+    planner = DayPlanner(generator, skeleton_messages, day_messages)
+    cached = {"2024-05-02": {"theme": "Old", "content": [activity("2024-05-02", 10, "Kept")]}}
+    itinerary = planner.generate(TRIP, cached)
+    assert "2024-05-02" not in generator.calls
+    assert "skeleton" not in generator.calls  # No car to rent, so the outline is skipped
+    assert [entry["place"] for entry in itinerary["content"] if isinstance(entry, dict)][2] == "Kept"
+    assert itinerary["days"][1] == {"date": "2024-05-02", "theme": "Old"}
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "No activities"),
+    ('{"content": []}', "No activities"),
+    ('{"content": ["just a note"]}', "No activities"),
+    ('{"content": [{"time_stamp": "2024-05-01T09:00"}]}', "Malformed activity"),
+    ('{"content": [{"place": "Museum", "time_stamp": "2024-05-02T09:00"}]}', "Activity outside"),
+])
+def test_parse_day_rejects(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_day(text, "2024-05-01")
+
+
+def test_parse_day_rejects_malformed_json_and_timestamps():
+    with pytest.raises(ValueError):
+        parse_day("{not json", "2024-05-01")
+    with pytest.raises(ValueError):
+        parse_day('{"content": [{"place": "Museum", "time_stamp": "soon"}]}', "2024-05-01")
+
+
+def test_parse_day_keeps_notes():
+    content = [activity("2024-05-01", 9, "Museum"), "Take the bus"]
+    assert parse_day(json.dumps({"content": content}), "2024-05-01") == content
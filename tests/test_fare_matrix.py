@@ -0,0 +1,58 @@
+from datetime import date
+
+import numpy as np
+
+from fare_matrix import FareMatrix, date_window
+from search_records import FlightOption
+
+OUT = ["2024-05-01", "2024-05-02", "2024-05-03"]
+BACK = ["2024-05-02", "2024-05-03", "2024-05-04"]
+NAN = np.nan
+
+
+def flight(price):
+    return FlightOption(price, "AA 1", "ORD", "2024-05-01 08:00", "AUS", "2024-05-01 11:00", 180)
+
+
+def test_cheapest_skips_missing_fares():
+    # No fares out on May 2nd or back on May 3rd; returning before leaving is NaN too
+    matrix = FareMatrix(OUT, BACK, [100, NAN, 90], [50, NAN, 70])
+    assert np.isnan(matrix.totals).tolist() == [[False, True, False], [True, True, True], [True, True, False]]
+    assert matrix.cheapest(10) == [("2024-05-01", "2024-05-02", 150.0), ("2024-05-03", "2024-05-04", 160.0),
+                                   ("2024-05-01", "2024-05-04", 170.0)]
+    assert matrix.cheapest(1) == [("2024-05-01", "2024-05-02", 150.0)]
+
+    rows = dict(matrix.rows(highlight=1))
+    assert [cell["price"] for cell in rows["2024-05-02"]] == [None, None, None]
+    assert [(cell["price"], cell["cheapest"]) for cell in rows["2024-05-01"]] == [(150, True), (None, False), (170, False)]
+
+
+def test_an_all_missing_matrix_has_no_cheapest():
+    matrix = FareMatrix(OUT, BACK, [NAN] * 3, [NAN] * 3)
+    assert matrix.cheapest() == []
+    assert all(cell["price"] is None and not cell["cheapest"] for _, cells in matrix.rows() for cell in cells)
+
+
+def test_search_takes_the_cheapest_fare_across_airport_pairs():
+    # Two airport pairs a day; a failed search (None) or one without prices just has no fares
+    answers = {("2024-05-01", "ORD"): [flight(120), flight(None)], ("2024-05-01", "MDW"): [flight(110)],
+               ("2024-05-02", "ORD"): None, ("2024-05-02", "MDW"): [flight(None)],
+               ("2024-05-03", "ORD"): [flight(60)], ("2024-05-03", "MDW"): [flight(80), flight(75)]}
+    searched = []
+
+    def search_many(params_list):
+        searched.extend(params_list)
+        return [answers[params["date"], params["airport"]] for params in params_list]
+
+    def params(day):
+        return [{"date": day, "airport": "ORD"}, {"date": day, "airport": "MDW"}]
+
+    matrix = FareMatrix.search(search_many, params, params, ["2024-05-01", "2024-05-02"], ["2024-05-02", "2024-05-03"])
+    assert len(searched) == 8
+    assert matrix.outbound_fares.tolist()[0] == 110 and np.isnan(matrix.outbound_fares[1])
+    assert matrix.cheapest() == [("2024-05-01", "2024-05-03", 170.0)]
+
+
+def test_date_window_skips_past_dates():
+    assert date_window("2024-05-02", 1) == ["2024-05-01", "2024-05-02", "2024-05-03"]
+    assert date_window("2024-05-02", 2, earliest=date(2024, 5, 2)) == ["2024-05-02", "2024-05-03", "2024-05-04"]
@@ -0,0 +1,61 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_pool import HttpPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+
+    def do_GET(self):
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def host_stats(pool, url):
+    return pool.stats()[url.split("//", 1)[1]]
+
+
+def test_connections_are_kept_alive(server):
+    pool = HttpPool(pool_size=2)
+    for _ in range(5):
+        assert pool.get(f"{server}/search").json() == {"ok": True}
+    pool.session.close()  # What openai does with "its" session; the pool survives
+    assert pool.get(f"{server}/search").status_code == 200
+    stats = host_stats(pool, server)
+    assert (stats["requests"], stats["connections_opened"], stats["reused"]) == (6, 1, 5)
+    assert stats["in_flight"] == 0
+    pool.close()
+
+
+def test_default_read_timeout(server):
+    pool = HttpPool(read_timeout=0.1)
+    with pytest.raises(requests.Timeout):
+        pool.get(f"{server}/slow")
+    assert pool.get(f"{server}/slow", timeout=5).status_code == 200  # A caller's own timeout wins
+    stats = host_stats(pool, server)
+    assert (stats["timeouts"], stats["errors"], stats["in_flight"]) == (1, 0, 0)
+    pool.close()
@@ -0,0 +1,124 @@
+import re
+from collections import defaultdict
+
+import pytest
+from flask import Flask
+
+import instrumentation
+from instrumentation import BUCKETS, Metrics, record
+
+SAMPLE = re.compile(r'^(\w+?)(?:_(bucket|sum|count))?(?:\{(.*)\})? (\S+)$')
+SERVER_TIMING = re.compile(r'^[\w.-]+;dur=\d+\.\d$')
+
+
+def parse(text):
+    """{name: {"type", "series": {labels without le: {"buckets": [(le, count)], "sum", "count"}}}}
+    from the Prometheus text format; samples keep the order they were written in."""
+    families = defaultdict(lambda: {"type": None, "series": defaultdict(lambda: {"buckets": []})})
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            families[name]["type"] = metric_type
+            continue
+        if line.startswith("#"):
+            continue
+        name, suffix, labels, value = SAMPLE.match(line).groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', labels or ""))
+        le = labels.pop("le", None)
+        series = families[name]["series"][tuple(sorted(labels.items()))]
+        if suffix == "bucket":
+            series["buckets"].append((le, float(value)))
+        else:
+            series[suffix or "value"] = float(value)
+    return families
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(instrumentation, "metrics", metrics)
+    return metrics
+
+
+@pytest.fixture
+def app(metrics):
+    app = Flask(__name__)
+    instrumentation.init_app(app)
+
+    @app.route("/trip/<name>")
+    def trip(name):
+        record("serpapi", 0.004)
+        record("serpapi", 0.006)
+        record("render", 0.2, kind="stage")
+        return name
+
+    return app
+
+
+def check_histogram(series):
+    bounds = [le for le, _ in series["buckets"]]
+    assert bounds == [str(bound) for bound in BUCKETS] + ["+Inf"]
+    counts = [count for _, count in series["buckets"]]
+    assert counts == sorted(counts)  # Cumulative
+    assert counts[-1] == series["count"]
+
+
+def test_histograms_are_cumulative(metrics):
+    for seconds in (0.003, 0.005, 0.2, 45, 100):
+        metrics.observe("demo_seconds", "Demo", seconds, route="/a")
+    metrics.observe("demo_seconds", "Demo", 1, route="/b")
+    metrics.register_gauge("demo_pending", "Pending", lambda: 3)
+    metrics.register_gauge("demo_hits_total", "Hits", lambda: [({"outcome": "hit"}, 5), ({"outcome": "miss"}, 2)],
+                           "counter")
+
+    families = parse(metrics.render())
+    assert families["demo_seconds"]["type"] == "histogram"
+    series = families["demo_seconds"]["series"][(("route", "/a"),)]
+    check_histogram(series)
+    buckets = dict(series["buckets"])
+    assert (buckets["0.005"], buckets["0.25"], buckets["30"], buckets["60"], buckets["+Inf"]) == (2, 3, 3, 4, 5)
+    assert series["count"] == 5
+    assert series["sum"] == pytest.approx(145.208)
+    assert families["demo_seconds"]["series"][(("route", "/b"),)]["count"] == 1
+
+    assert (families["demo_pending"]["type"], families["demo_pending"]["series"][()]["value"]) == ("gauge", 3)
+    hits = families["demo_hits_total"]["series"]
+    assert families["demo_hits_total"]["type"] == "counter"
+    assert (hits[(("outcome", "hit"),)]["value"], hits[(("outcome", "miss"),)]["value"]) == (5, 2)
+
+
+def test_requests_are_timed_and_reported(app):
+    client = app.test_client()
+    response = client.get("/trip/austin")
+
+    entries = response.headers["Server-Timing"].split(", ")
+    assert all(SERVER_TIMING.match(entry) for entry in entries)
+    durations = {name: float(duration) for name, duration in (entry.split(";dur=") for entry in entries)}
+    assert list(durations) == ["serpapi", "render", "total"]
+    assert durations["serpapi"] == 10.0  # Both calls, in milliseconds
+    assert durations["render"] == 200.0
+
+    client.get("/trip/denver")
+    body = client.get("/metrics")
+    assert body.mimetype == "text/plain"
+    families = parse(body.get_data(as_text=True))
+
+    upstream = families["upstream_call_seconds"]["series"][(("upstream", "serpapi"),)]
+    check_histogram(upstream)
+    assert upstream["count"] == 4 and upstream["sum"] == pytest.approx(0.02)
+    stage = families["stage_seconds"]["series"][(("stage", "render"),)]
+    check_histogram(stage)
+    assert stage["count"] == 2
+
+    routes = families["http_request_seconds"]["series"]
+    trip = routes[(("method", "GET"), ("route", "/trip/<name>"))]
+    check_histogram(trip)
+    assert trip["count"] == 2  # Both trips under the route pattern, not their URLs
+
+
+def test_unmatched_requests_share_one_series(app, metrics):
+    client = app.test_client()
+    client.get("/nope")
+    client.get("/also-nope")
+    families = parse(metrics.render())
+    assert families["http_request_seconds"]["series"][(("method", "GET"), ("route", "unmatched"))]["count"] == 2
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from fpdf import FPDF
+
+from itinerary_pdf import FONT_FAMILY, EmbeddedFonts, ItineraryPDF, ItineraryRenderer
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "fonts")
+HEADER = {"departure_city": "Kraków", "arrival_city": "東京", "start_date": "2024-05-01", "end_date": "2024-05-02",
+          "car_rental_info": {}}
+CONTENT = [
+    {"place": "Café Ünter den Łinden", "location": "Москва, ул. Арбат 1", "time_stamp": "2024-05-01T09:00",
+     "description": "Ramen – “the best” in town… ☕", "price": "12"},
+    "Take the train → Shibuya",
+    {"place": "Tsukiji", "location": "築地", "time_stamp": "2024-05-02T08:30", "description": "Sushi", "price": "30"},
+]
+LONG_TEXT = ("Walk through the old town and stop at the market for coffee and pastries, then take the "
+             "funicular up the hill for views over the river.\nSupercalifragilisticexpialidociousandthensome"
+             "wordthatneverendsbecauseitistoolongforonecell\n\nŁódź Kraków Gdańsk Zürich München Москва 東京 "
+             "and a few more words to wrap")
+
+
+@pytest.fixture
+def renderer():
+    renderer = ItineraryRenderer(FONT_DIR)
+    if renderer.fonts is None:
+        pytest.skip("DejaVu fonts are not in data/fonts")
+    return renderer
+
+
+def test_non_latin1_text_is_embedded(renderer):
+    pdf = renderer.render({"header": HEADER, "content": CONTENT}, 2, 1)
+    assert pdf.startswith(b"%PDF") and pdf.rstrip().endswith(b"%%EOF")
+    assert b"/FontFile2" in pdf and b"/ToUnicode" in pdf
+
+    used = set().union(*(codes for _, codes in renderer.fonts._subsets))
+    assert {ord(char) for char in "ŁМосква東京築地ó–“…→"} <= used
+
+
+def test_core_font_fallback_folds_text(tmp_path):
+    renderer = ItineraryRenderer(str(tmp_path))
+    assert renderer.fonts is None
+    pdf = renderer.render({"header": HEADER, "content": CONTENT}, 2, 1)
+    assert pdf.startswith(b"%PDF")
+    assert b"/FontFile2" not in pdf
+
+
+@pytest.mark.parametrize("time_stamp", [None, "", "soon", "2024-13-40T25:00", 1714550400])
+def test_bad_timestamps_do_not_break_the_pdf(renderer, time_stamp):
+    content = [CONTENT[0], {"place": "Somewhere", "time_stamp": time_stamp, "price": "5"}, CONTENT[2]]
+    assert renderer.render({"header": HEADER, "content": content}, 1, 0).startswith(b"%PDF")
+    assert ItineraryRenderer("").render({"header": HEADER, "content": content}, 1, 0).startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("width", [20, 60, 170])
+def test_wrap_matches_stock_multi_cell(width):
+    fonts = EmbeddedFonts(FONT_DIR)
+    if not fonts.available():
+        pytest.skip("DejaVu fonts are not in data/fonts")
+    pdf = ItineraryPDF(fonts)
+    pdf.add_page()
+    pdf.set_font(FONT_FAMILY, "", 12)
+    # FPDF's own character-by-character line breaking over the same font metrics
+    expected = FPDF.multi_cell(pdf, width, 10, LONG_TEXT, 1, "L", 0, split_only=True)
+    assert pdf.wrap(LONG_TEXT, width) == expected
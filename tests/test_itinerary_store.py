@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from flask import Flask
+
+from itinerary_store import ItineraryStore, itinerary_etag
+from models import db
+
+TRIP = {"arrival_city": "Austin", "start_date": "2024-05-01", "end_date": "2024-05-03"}
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'itineraries.db'}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_save_keeps_a_regenerated_itinerary(app):
+    store = ItineraryStore()
+    saved = store.save(1, None, "trip", TRIP, {"content": ["first"]}, b"first")
+    assert store.revise(saved, {"content": ["edited"]}, b"edited")
+
+    again = store.save(1, None, "trip", TRIP, {"content": ["second"]}, b"second")
+    assert again.id == saved.id
+    assert again.revision == 1
+    assert json.loads(again.data) == {"content": ["edited"]}
+    assert again.pdf == b"edited"
+    assert itinerary_etag(again) == "trip-r1"
+
+
+def test_save_is_per_user(app):
+    store = ItineraryStore()
+    mine = store.save(1, None, "trip", TRIP, {"content": []}, b"mine")
+    theirs = store.save(2, None, "trip", TRIP, {"content": []}, b"theirs")
+    assert mine.id != theirs.id
+    assert store.find(2, "trip").pdf == b"theirs"
+    assert store.get(mine.id, 2) is None
+
@@ -0,0 +1,53 @@
+import json
+
+from itinerary_stream import ContentStreamParser, DayProgress, sse_event
+
+DOCUMENT = {
+    "header": {"departure_city": "Chicago", "arrival_city": "Austin", "car_rental_info": {"company": "[none]"}},
+    "content": [
+        {"place": "Flight to Austin", "time_stamp": "2024-05-01T08:00", "price": 180},
+        "Note: bring \"comfortable\" shoes, {and} [sunscreen]",
+        {"place": "Cafe \\ Bar", "time_stamp": "2024-05-01T12:00", "details": {"tags": ["food", "}"]}},
+        {"place": "Museum", "time_stamp": "2024-05-02T10:00", "price": 0},
+    ],
+    "days": [{"date": "2024-05-01"}],
+}
+
+
+def feed_in_chunks(parser, text, size):
+    entries = []
+    for start in range(0, len(text), size):
+        entries.extend(parser.feed(text[start:start + size]))
+    return entries
+
+
+def test_entries_arrive_whole_whatever_the_chunking():
+    text = json.dumps(DOCUMENT)
+    for size in (1, 3, 17, len(text)):
+        parser = ContentStreamParser()
+        assert feed_in_chunks(parser, text, size) == DOCUMENT["content"]
+        assert parser.result() == DOCUMENT
+
+
+def test_an_entry_is_returned_as_soon_as_it_closes():
+    parser = ContentStreamParser()
+    assert parser.feed('{"content": [{"place": "Museum"') == []
+    assert parser.feed('}, {"place": ') == [{"place": "Museum"}]
+    assert parser.feed('"Park"}]}') == [{"place": "Park"}]
+
+
+def test_other_arrays_are_ignored():
+    parser = ContentStreamParser("c")
+    text = '{"h": {"content": [{"x": 1}]}, "days": [{"date": "d"}], "c": [{"p": "Museum"}]}'
+    assert parser.feed(text) == [{"p": "Museum"}]
+
+
+def test_day_progress_counts_days_and_keeps_notes_on_the_current_day():
+    progress = DayProgress()
+    events = [progress.add(entry) for entry in DOCUMENT["content"]]
+    assert [(event["day"], event["date"]) for event in events] == [
+        (1, "2024-05-01"), (1, "2024-05-01"), (1, "2024-05-01"), (2, "2024-05-02")]
+
+
+def test_sse_event():
+    assert sse_event("done", {"days": 2}) == 'event: done\ndata: {"days": 2}\n\n'
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from jobs import DONE, FAILED, JOB_ERROR, JobQueue, QUEUED, RUNNING
+
+
+def wait_for(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.status in (QUEUED, RUNNING) and time.time() < deadline:
+        time.sleep(0.01)
+    return job.status
+
+
+def test_identical_keys_share_a_job_while_it_runs():
+    queue = JobQueue(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+
+    first = queue.submit("trip", work)
+    second = queue.submit("trip", work)
+    other = queue.submit("other trip", work)
+    assert second is first
+    assert other is not first
+    release.set()
+    assert wait_for(first) == DONE
+    assert wait_for(other) == DONE
+    assert len(calls) == 2
+
+
+def test_a_finished_key_gets_a_new_job():
+    queue = JobQueue()
+    first = queue.submit("trip", lambda: None)
+    assert wait_for(first) == DONE
+    second = queue.submit("trip", lambda: None)
+    assert second is not first
+    assert wait_for(second) == DONE
+
+
+def test_completed_jobs_are_done_and_can_be_polled():
+    queue = JobQueue()
+    job = queue.completed("trip")
+    assert job.status == DONE
+    assert job.finished_at is not None
+    assert queue.get(job.id) is job
+
+
+def test_llm_slot_caps_concurrent_llm_stages():
+    queue = JobQueue(max_workers=6, llm_concurrency=2)
+    lock = threading.Lock()
+    inside = [0]
+    peak = [0]
+
+    def work():
+        with queue.llm_slot():
+            with lock:
+                inside[0] += 1
+                peak[0] = max(peak[0], inside[0])
+            time.sleep(0.05)
+            with lock:
+                inside[0] -= 1
+
+    jobs = [queue.submit(f"trip {i}", work) for i in range(6)]
+    assert all(wait_for(job) == DONE for job in jobs)
+    assert peak[0] == 2
+
+
+def test_failed_jobs_hide_the_exception(capsys):
+    queue = JobQueue()
+
+    def work():
+        raise RuntimeError("database is locked: /srv/instance/site.db")
+
+    job = queue.submit("trip", work)
+    assert wait_for(job) == FAILED
+    assert job.to_dict() == {"job_id": job.id, "status": FAILED, "error": JOB_ERROR}
+    assert "Traceback" in capsys.readouterr().err  # The details are logged on the server
+    # A failed key is free again, so the trip can be retried
+    assert queue.submit("trip", lambda: None) is not job
+
+
+def test_finished_jobs_are_pruned_after_the_retention():
+    queue = JobQueue(retention=60)
+    old = queue.submit("old trip", lambda: None)
+    assert wait_for(old) == DONE
+    old.finished_at = time.time() - 120
+    running = threading.Event()
+    current = queue.submit("current trip", running.wait, 5)
+    assert queue.get(old.id) is None
+    assert queue.get(current.id) is current
+    running.set()
+    assert wait_for(current) == DONE
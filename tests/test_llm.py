@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+# app.py reads its settings on import; keep its database and caches out of the checkout
+_instance = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_instance}/users.db")
+os.environ.setdefault("ITINERARY_LLM_BACKEND", "stub")
+os.environ.setdefault("SEARCH_PROVIDER", "synthetic")
+os.environ.setdefault("PREFETCH_ENABLED", "0")
+os.environ.setdefault("PDF_CACHE_DIR", os.path.join(_instance, "pdf"))
+os.environ.setdefault("STATIC_BUILD_DIR", os.path.join(_instance, "static"))
+
+import app  # noqa: E402
+from llm import ItineraryGenerator, MeteredGenerator, StubGenerator, TokenLedger, read_prompt  # noqa: E402
+
+FLIGHT = {"flight_number": "AA 100", "departure_airport": "ORD", "departure_time": "2024-05-01 08:00",
+          "arrival_airport": "AUS", "arrival_time": "2024-05-01 11:00", "price": 200}
+TRIP = {"departure_city": "Chicago", "arrival_city": "Austin", "start_date": "2024-05-01", "end_date": "2024-05-03",
+        "num_adults": 2, "num_children": 0, "budget": "medium", "keywords": "food", "flight_needed": "Yes",
+        "departing_flight": FLIGHT, "returning_flight": dict(FLIGHT, departure_time="2024-05-03 18:00"),
+        "car_needed": "Yes", "hotel": {"name": "Hotel Austin", "price_per_night": 150}, "hotel_stars": 3}
+SKELETON = {"header": {}, "days": [{"date": "2024-05-01", "theme": "Food"}, {"date": "2024-05-02", "theme": "Music"},
+                                   {"date": "2024-05-03", "theme": ""}]}
+TRIP_FIELDS = {"departure_city": "Chicago", "arrival_city": "Austin", "start_date": "2024-05-01",
+               "end_date": "2024-05-03", "car_needed": "Yes"}
+
+
+@pytest.fixture(params=["full", "compact"])
+def mode(request, monkeypatch):
+    monkeypatch.setitem(app.app.config, "ITINERARY_PROMPT_MODE", request.param)
+    return request.param
+
+
+def itinerary():
+    return json.loads(StubGenerator().complete(app.itinerary_messages(TRIP), TRIP))
+
+
+def test_read_prompt_follows_the_itinerary_prompt(mode):
+    request = read_prompt(app.itinerary_messages(TRIP))
+    assert request["part"] == "itinerary"
+    assert request["format"] == mode
+    assert {field: request.get(field) for field in TRIP_FIELDS} == TRIP_FIELDS
+
+
+def test_read_prompt_follows_the_day_prompt(mode):
+    request = read_prompt(app.day_messages(TRIP, SKELETON, "2024-05-02"))
+    assert (request["part"], request["format"], request["day"]) == ("day", mode, "2024-05-02")
+
+
+def test_read_prompt_follows_the_skeleton_and_activity_prompts():
+    assert read_prompt(app.skeleton_messages(TRIP))["part"] == "skeleton"
+
+    document = itinerary()
+    entry = document["content"][1]
+    request = read_prompt(app.activity_messages(TRIP, document, "2024-05-01", entry))
+    assert request["part"] == "activity"
+    assert (request["day"], request["place"], request["time_stamp"]) == ("2024-05-01", entry["place"], entry["time_stamp"])
+
+
+def test_stub_answers_what_the_prompt_asks_for(mode):
+    generator = StubGenerator(activities_per_day=4)
+    document = json.loads(generator.complete(app.itinerary_messages(TRIP), TRIP))
+    days = {entry.get("time_stamp", entry.get("t", ""))[:10] for entry in document.get("content", document.get("c"))}
+    assert days == {"2024-05-01", "2024-05-02", "2024-05-03"}
+
+    day = json.loads(generator.complete(app.day_messages(TRIP, SKELETON, "2024-05-02"), TRIP))
+    entries = day.get("content", day.get("c"))
+    assert len(entries) == 4
+    assert all(entry.get("time_stamp", entry.get("t")).startswith("2024-05-02") for entry in entries)
+
+    skeleton = json.loads(generator.complete(app.skeleton_messages(TRIP), TRIP))
+    assert [plan["date"] for plan in skeleton["days"]] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+
+
+def test_stub_replaces_an_activity_at_the_same_time():
+    document = itinerary()
+    old = document["content"][2]
+    new = json.loads(StubGenerator().complete(app.activity_messages(TRIP, document, "2024-05-01", old), TRIP))["content"]
+    assert len(new) == 1
+    assert new[0]["time_stamp"] == old["time_stamp"]
+    assert new[0]["place"] != old["place"]
+
+
+class FixedGenerator(ItineraryGenerator):
+    def complete(self, messages, trip, part="itinerary"):
+        return "{}"
+
+
+def test_metered_generator_labels_requests_by_the_part_it_is_given(mode):
+    ledger = TokenLedger()
+    generator = MeteredGenerator(FixedGenerator(), ledger)
+    generator.complete(app.day_messages(TRIP, SKELETON, "2024-05-02"), TRIP, "day")
+    "".join(generator.stream([{"role": "user", "content": "anything"}], TRIP, "skeleton"))
+
+    assert [(entry["mode"], entry["part"], entry["estimated"]) for entry in ledger.recent()] == [
+        (mode, "day", True), ("full", "skeleton", True)]
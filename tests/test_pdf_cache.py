@@ -0,0 +1,72 @@
+import itertools
+import os
+
+import pytest
+
+from pdf_cache import PdfCache, trip_fingerprint
+
+TRIP = {"start_date": "2024-05-01", "end_date": "2024-05-03", "departure_city": "Chicago", "arrival_city": "Austin",
+        "flight_needed": "Yes", "car_needed": "No", "hotel_stars": "3", "budget": "medium", "num_adults": 2,
+        "num_children": 0, "departing_flight": {"flight_number": "AA 100", "price": 200},
+        "returning_flight": {"flight_number": "AA 101", "price": 210}, "hotel": {"name": "Hotel Austin", "rating": 4.5},
+        "keywords": "Food, live music"}
+
+
+def test_equivalent_trips_share_a_fingerprint():
+    reordered = {key: TRIP[key] for key in reversed(list(TRIP))}
+    reordered["hotel"] = {"rating": 4.5, "name": "Hotel Austin"}
+    assert trip_fingerprint(reordered) == trip_fingerprint(TRIP)
+
+    assert trip_fingerprint(dict(TRIP, keywords=" live music ,food,,  FOOD ")) == trip_fingerprint(TRIP)
+    assert trip_fingerprint(dict(TRIP, num_adults="2", num_children="0")) == trip_fingerprint(TRIP)
+    assert trip_fingerprint(dict(TRIP, trip_id="abc", csrf_token="x")) == trip_fingerprint(TRIP)  # Not trip fields
+
+
+@pytest.mark.parametrize("change", [{"end_date": "2024-05-04"}, {"budget": "low"}, {"keywords": "food"},
+                                    {"num_children": 1}, {"hotel": {"name": "Other Hotel", "rating": 4.5}}])
+def test_different_trips_get_different_fingerprints(change):
+    assert trip_fingerprint(dict(TRIP, **change)) != trip_fingerprint(TRIP)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Distinct, increasing "last used" times however fast the test runs
+    ticks = itertools.count(1000)
+    monkeypatch.setattr("pdf_cache.time.time", lambda: next(ticks))
+
+
+def test_least_recently_used_files_are_evicted(tmp_path, clock):
+    cache = PdfCache(str(tmp_path), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert cache.get("a") == b"a" * 100  # a is now the most recently used
+
+    cache.put("c", b"c" * 100)
+    assert "b" not in cache
+    assert not os.path.exists(tmp_path / "b.pdf")
+    assert cache.get("a") == b"a" * 100 and cache.get("c") == b"c" * 100
+    assert cache.stats() == {"entries": 2, "bytes": 200, "max_bytes": 250}
+
+    cache.put("d", b"d" * 200)
+    assert os.listdir(tmp_path) == ["d.pdf"]
+    assert cache.stats()["bytes"] == 200
+
+
+def test_a_file_larger_than_the_limit_is_still_kept(tmp_path, clock):
+    cache = PdfCache(str(tmp_path), max_bytes=50)
+    cache.put("big", b"x" * 100)
+    assert cache.get("big") == b"x" * 100
+
+
+def test_the_index_is_rebuilt_from_disk(tmp_path, clock):
+    cache = PdfCache(str(tmp_path), max_bytes=1000)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 300)
+
+    reopened = PdfCache(str(tmp_path), max_bytes=1000)
+    assert reopened.stats() == {"entries": 2, "bytes": 400, "max_bytes": 1000}
+    assert reopened.get("b") == b"b" * 300
+
+    os.remove(tmp_path / "a.pdf")  # Deleted behind the cache's back
+    assert reopened.get("a") is None
+    assert reopened.stats()["entries"] == 1
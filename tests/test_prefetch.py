@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import Counter
+
+from prefetch import SearchPrefetcher
+from search_cache import cache_key
+
+AUSTIN = {"engine": "google_flights", "departure_id": "ORD", "arrival_id": "AUS", "outbound_date": "2024-05-01"}
+DENVER = dict(AUSTIN, arrival_id="DEN")
+
+
+class BlockingProvider:
+    # Counts searches per key; every search waits until release is set
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = Counter()
+        self.started = threading.Semaphore(0)
+        self.lock = threading.Lock()
+
+    def search(self, params):
+        with self.lock:
+            self.calls[cache_key(params)] += 1
+        self.started.release()
+        assert self.release.wait(5)
+        return {"arrival": params["arrival_id"]}
+
+
+def test_foreground_search_joins_the_prefetch():
+    provider = BlockingProvider()
+    prefetcher = SearchPrefetcher(provider.search, max_workers=2)
+    futures = prefetcher.prefetch([AUSTIN, DENVER])
+    prefetcher.prefetch([dict(AUSTIN, api_key="secret")])  # Same search; the key is not part of it
+    for _ in range(2):
+        assert provider.started.acquire(timeout=5)
+    assert prefetcher.pending() == 2
+
+    results = []
+    foreground = threading.Thread(target=lambda: results.append(prefetcher.search(AUSTIN)))
+    foreground.start()
+    foreground.join(0.1)
+    assert foreground.is_alive()  # Waiting on the prefetch, not searching again
+
+    provider.release.set()
+    foreground.join(5)
+    assert results == [{"arrival": "AUS"}]
+    assert [future.result(5) for future in futures] == [{"arrival": "AUS"}, {"arrival": "DEN"}]
+    assert provider.calls == Counter({cache_key(AUSTIN): 1, cache_key(DENVER): 1})
+
+
+def test_search_runs_inline_when_nothing_is_in_flight():
+    provider = BlockingProvider()
+    provider.release.set()
+    prefetcher = SearchPrefetcher(provider.search)
+    prefetcher.prefetch([AUSTIN])[0].result(5)
+    for _ in range(100):  # The done callback can run just after result() returns
+        if not prefetcher.pending():
+            break
+        time.sleep(0.01)
+    assert prefetcher.pending() == 0
+
+    assert prefetcher.search(AUSTIN) == {"arrival": "AUS"}  # Finished prefetches are the search cache's job
+    assert provider.calls[cache_key(AUSTIN)] == 2
@@ -0,0 +1,60 @@
+import os
+import pstats
+
+import pytest
+from flask import Flask, Response
+
+import profiling
+
+
+def plain_work():
+    return sum(range(1000))
+
+
+def stream_work(part):
+    return f"{part}:{sum(range(1000))}\n"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "is_admin", lambda app: True)
+    app = Flask(__name__)
+    app.config.update(PROFILING_ENABLED=True, PROFILE_DIR=str(tmp_path / "profiles"), PROFILE_MAX_FILES=10)
+    profiling.init_app(app)
+
+    @app.route("/plain")
+    def plain():
+        return str(plain_work())
+
+    @app.route("/stream")
+    def stream():
+        return Response((stream_work(part) for part in range(3)), mimetype="text/plain")
+
+    return app
+
+
+def profiled_functions(path):
+    return {function for _, _, function in pstats.Stats(path).stats}
+
+
+def test_plain_responses_are_profiled(app):
+    response = app.test_client().get("/plain?profile=1")
+    path = response.headers["X-Profile-Path"]
+    assert os.path.exists(path)
+    assert "plain_work" in profiled_functions(path)
+
+
+def test_streamed_responses_are_profiled_until_closed(app):
+    response = app.test_client().get("/stream", headers={"X-Profile": "1"}, buffered=False)
+    path = response.headers["X-Profile-Path"]
+    assert not os.path.exists(path)  # The body hasn't run yet
+
+    assert response.get_data(as_text=True).splitlines()[0] == "0:499500"
+    response.close()
+    assert "stream_work" in profiled_functions(path)
+
+
+def test_unrequested_profiles_are_not_taken(app):
+    response = app.test_client().get("/plain")
+    assert "X-Profile-Path" not in response.headers
+
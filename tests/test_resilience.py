@@ -0,0 +1,91 @@
+import pytest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, LatencyWindow, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def fail():
+    raise ConnectionError("upstream down")
+
+
+def trip(breaker, failures):
+    for _ in range(failures):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+
+def test_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker(failure_threshold=3, clock=Clock())
+    trip(breaker, 2)
+    assert breaker.call(lambda: "ok") == "ok"  # A success resets the count
+    trip(breaker, 2)
+    assert breaker.state == CLOSED
+    trip(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+    assert breaker.stats() == {"state": OPEN, "failures": 3, "opened": 1, "rejected": 1}
+
+
+def test_half_open_lets_one_trial_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    trip(breaker, 1)
+    clock.now += 29.9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 0.1
+    breaker.before_call()  # The trial
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Anyone else while it runs
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.call(lambda: "ok") == "ok"
+
+
+def test_failed_trial_reopens_for_another_timeout():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    trip(breaker, 2)
+    clock.now += 30
+    trip(breaker, 1)  # The trial fails: no second run of failure_threshold needed
+    assert (breaker.state, breaker.opened) == (OPEN, 2)
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+    clock.now += 1
+    assert breaker.call(lambda: "ok") == "ok"
+
+
+def test_rate_limiter_allows_a_burst_then_spaces_calls():
+    clock = Clock()
+    limiter = RateLimiter(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+    assert [limiter.acquire() for _ in range(5)] == [0, 0, 0, 0.5, 0.5]
+    clock.now += 10  # Idle time refills the bucket, up to burst
+    assert [limiter.acquire() for _ in range(4)] == [0, 0, 0, 0.5]
+    assert limiter.stats() == {"acquired": 9, "waited_seconds": 1.5}
+    assert RateLimiter(rate=0).acquire() == 0
+
+
+def test_latency_window_percentiles():
+    window = LatencyWindow(size=100)
+    assert window.percentile(95) is None
+    for ms in range(1, 101):
+        window.add(ms / 1000)
+    assert window.percentile(95) == 0.096
+    assert window.percentile(100) == 0.1
+    assert window.percentile(50, min_samples=101) is None
+    window.add(5.0)  # The oldest sample drops out
+    assert window.percentile(0) == 0.002
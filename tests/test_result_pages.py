@@ -0,0 +1,79 @@
+import pytest
+
+from result_pages import ResultFilters, ResultIndex, ResultIndexes, decode_cursor, encode_cursor
+from search_providers import SyntheticProvider, flight_search_params, hotel_search_params, project_results
+
+FLIGHTS = flight_search_params("ORD", "AUS", "2024-05-01", 1, 0)
+HOTELS = hotel_search_params("Austin", "2024-05-01", "2024-05-04", 2, 3)
+
+
+def records(params, **sizes):
+    return project_results(params, SyntheticProvider(**sizes).search(params))
+
+
+def all_pages(index, sort, filters=None, limit=4):
+    pages, cursor = [], None
+    while True:
+        page, cursor, shown = index.page(sort, filters, cursor, limit)
+        assert shown == sum(len(earlier) for earlier in pages)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("price-asc", 12, 9)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "price-asc") == (12, 9)
+    assert decode_cursor(None, "price-asc") == (0, 0)
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor!", encode_cursor("price-asc", "x", 1)[:-2], "bm9wZQ"])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "price-asc")
+
+
+def test_cursor_from_another_sort():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor("price-asc", 4, 4), "duration-asc")
+
+
+def test_pages_cover_the_sorted_results_once():
+    flights = records(FLIGHTS, num_flights=11)
+    pages = all_pages(ResultIndex(flights), "price-asc")
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [flight.price for page in pages for flight in page] == sorted(flight.price for flight in flights)
+
+
+def test_descending_sort_keeps_missing_values_last():
+    hotels = records(HOTELS, num_hotels=30)
+    pages = all_pages(ResultIndex(hotels), "rating-desc", limit=7)
+    ratings = [hotel.rating for page in pages for hotel in page]
+    assert ratings == sorted(ratings, reverse=True)
+    hotels[1].nightly_rate = None
+    ordered = [hotel for page in all_pages(ResultIndex(hotels), "price-desc") for hotel in page]
+    assert ordered[-1] is hotels[1]
+
+
+def test_filters_and_the_last_cursor():
+    hotels = records(HOTELS, num_hotels=30)
+    filters = ResultFilters(max_price=300, min_stars=3)
+    pages = all_pages(ResultIndex(hotels), "price-asc", filters, limit=3)
+    shown = [hotel for page in pages for hotel in page]
+    assert shown == sorted((hotel for hotel in hotels if hotel.nightly_rate <= 300 and hotel.stars >= 3),
+                           key=lambda hotel: hotel.nightly_rate)
+    assert pages[-1]  # No cursor is handed out for an empty last page
+
+
+def test_unknown_sort():
+    with pytest.raises(ValueError):
+        ResultIndex(records(FLIGHTS)).page("rating-asc")
+
+
+def test_indexes_rebuild_when_the_records_change():
+    indexes = ResultIndexes(max_entries=1)
+    first = records(FLIGHTS)
+    index = indexes.get([FLIGHTS], [first])
+    assert indexes.get([FLIGHTS], [first]) is index
+    assert indexes.get([FLIGHTS], [list(first)]) is not index
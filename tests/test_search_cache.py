@@ -0,0 +1,115 @@
+import threading
+import types
+
+import pytest
+
+import search_cache
+from prefetch import SearchPrefetcher
+from search_cache import SearchCache
+from search_providers import SyntheticProvider, flight_search_params, project_results
+from search_records import decode_records, encode_records
+
+PARAMS = flight_search_params("ORD", "AUS", "2024-05-01", 1, 0)
+TTL, STALE_TTL = 600, 3600
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # The cache reads time.time(); this one only moves when a test moves it
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(search_cache, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+class Upstream:
+    # Counts searches; answers with SyntheticProvider records, different each call
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self, params):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return project_results(params, SyntheticProvider(num_flights=self.calls).search(params))
+
+
+def filled(clock, **options):
+    cache = SearchCache(ttls={"google_flights": TTL}, stale_ttl=STALE_TTL, **options)
+    upstream = Upstream()
+    first = cache.get_or_fetch(PARAMS, upstream)
+    clock.now += TTL  # Expired, but within stale_ttl
+    return cache, upstream, first
+
+
+def test_fresh_results_are_not_fetched_again(clock):
+    cache = SearchCache(ttls={"google_flights": TTL}, stale_ttl=STALE_TTL)
+    upstream = Upstream()
+    first = cache.get_or_fetch(PARAMS, upstream)
+    clock.now += TTL - 1
+    assert cache.get_or_fetch(PARAMS, upstream) is first
+    assert upstream.calls == 1
+    assert cache.is_fresh(PARAMS)
+
+
+def test_stale_result_is_served_at_once_and_refreshed(clock):
+    cache, upstream, first = filled(clock)
+    refreshed = []
+    assert cache.get_or_fetch(PARAMS, upstream, refresh=refreshed.append) is first
+    assert refreshed == [PARAMS]
+    assert upstream.calls == 1  # The request itself didn't wait for a search
+    assert not cache.is_fresh(PARAMS)
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_refresh_hand_off_searches_once_and_updates_the_cache(clock):
+    cache, upstream, first = filled(clock)
+    release = threading.Event()
+    refreshed = []
+
+    def refresh_search(params):
+        # What app.refresh_search does, held until the test lets it finish
+        release.wait(5)
+        refreshed.append(upstream(params))
+        cache.set(params, refreshed[-1])
+
+    refresher = SearchPrefetcher(refresh_search, max_workers=2)
+    futures = []
+    for _ in range(3):  # Several pages showing the same stale search
+        assert cache.get_or_fetch(PARAMS, upstream, refresh=lambda params: futures.extend(
+            refresher.prefetch([params]))) is first
+    assert len(set(futures)) == 1  # Deduplicated while in flight
+    release.set()
+    futures[0].result(5)
+
+    assert upstream.calls == 2
+    assert cache.is_fresh(PARAMS)
+    assert cache.get_or_fetch(PARAMS, upstream) is refreshed[0]
+    assert refreshed[0] != first
+
+
+def test_stale_result_covers_a_failing_search(clock):
+    cache, upstream, first = filled(clock)
+    upstream.fail = True
+    assert cache.get_or_fetch(PARAMS, upstream) is first  # No refresh callback: search, fall back when it fails
+    assert upstream.calls == 2
+
+    clock.now += STALE_TTL  # Too old to show
+    with pytest.raises(ConnectionError):
+        cache.get_or_fetch(PARAMS, upstream)
+
+
+def test_stale_results_survive_a_restart(clock, tmp_path):
+    db_path = str(tmp_path / "search.db")
+    options = dict(db_path=db_path, encode=encode_records, decode=decode_records)
+    _, upstream, first = filled(clock, **options)
+    restarted = SearchCache(ttls={"google_flights": TTL}, stale_ttl=STALE_TTL, **options)
+    refreshed = []
+    assert restarted.get_or_fetch(PARAMS, upstream, refresh=refreshed.append) == first
+    assert refreshed == [PARAMS]
+
+
+def test_errors_are_never_cached(clock):
+    cache = SearchCache(stale_ttl=STALE_TTL)
+    cache.set(PARAMS, {"error": "Google hasn't returned any results"})
+    assert cache.get(PARAMS) is None
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError
+from search_providers import (CircuitBreakerProvider, HedgedProvider, RecordingProvider, ReplayProvider,
+                              SearchProvider, SyntheticProvider, flight_search_params, hotel_search_params)
+
+FLIGHTS = flight_search_params("ORD", "AUS", "2024-05-01", 1, 0)
+HOTELS = hotel_search_params("Austin", "2024-05-01", "2024-05-04", 2, 3)
+
+
+class ScriptedProvider(SearchProvider):
+    """SyntheticProvider answers, with each call's behaviour taken from a
+    script: "ok", "fail", "slow fail" (after 0.2 s), or an Event the call
+    waits for before answering."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._synthetic = SyntheticProvider(num_flights=2, num_hotels=2)
+
+    def search(self, params):
+        with self._lock:
+            step = self.script[self.calls] if self.calls < len(self.script) else "ok"
+            self.calls += 1
+        if step == "slow fail":
+            time.sleep(0.2)
+        if step in ("fail", "slow fail"):
+            raise ConnectionError("upstream down")
+        if isinstance(step, threading.Event):
+            step.wait(5)
+        return self._synthetic.search(params)
+
+
+def warmed_up(provider, samples=3):
+    hedged = HedgedProvider(provider, percentile=95, min_samples=samples, min_delay=0.05)
+    for _ in range(samples):
+        hedged.search(FLIGHTS)
+    return hedged
+
+
+def test_no_hedging_until_there_are_enough_samples():
+    provider = ScriptedProvider("ok", "ok", "ok")
+    hedged = HedgedProvider(provider, min_samples=4, min_delay=0.05)
+    for _ in range(3):
+        hedged.search(FLIGHTS)
+    assert hedged.hedge_delay(FLIGHTS) is None
+    assert hedged.hedge_delay(HOTELS) is None  # Latencies are kept per engine
+    assert hedged.stats() == {"hedged": 0, "hedge_wins": 0}
+
+
+def test_a_slow_search_is_hedged_and_the_duplicate_wins():
+    release = threading.Event()
+    provider = ScriptedProvider("ok", "ok", "ok", release)
+    hedged = warmed_up(provider)
+    assert hedged.hedge_delay(FLIGHTS) == 0.05  # Fast samples; min_delay is the floor
+    assert hedged.search(FLIGHTS) == SyntheticProvider(num_flights=2).search(FLIGHTS)
+    assert provider.calls == 5
+    assert hedged.stats() == {"hedged": 1, "hedge_wins": 1}
+    release.set()
+
+
+def test_a_fast_search_is_not_hedged():
+    provider = ScriptedProvider()
+    hedged = warmed_up(provider)
+    hedged.search(FLIGHTS)
+    assert provider.calls == 4
+    assert hedged.stats()["hedged"] == 0
+
+
+def test_a_failed_duplicate_leaves_the_first_copy_to_answer():
+    release = threading.Event()
+    provider = ScriptedProvider("ok", "ok", "ok", release, "fail")
+    hedged = warmed_up(provider)
+    threading.Timer(0.2, release.set).start()  # The first copy answers after the duplicate has failed
+    assert hedged.search(FLIGHTS)["best_flights"]
+    assert hedged.stats() == {"hedged": 1, "hedge_wins": 0}
+
+
+def test_both_copies_failing_raises():
+    provider = ScriptedProvider("ok", "ok", "ok", "slow fail", "fail")
+    hedged = warmed_up(provider)
+    with pytest.raises(ConnectionError):
+        hedged.search(FLIGHTS)
+    assert (provider.calls, hedged.stats()["hedged"]) == (5, 1)
+
+
+def test_percentile_zero_turns_hedging_off():
+    provider = ScriptedProvider()
+    hedged = HedgedProvider(provider, percentile=0, min_samples=1)
+    hedged.search(FLIGHTS)
+    hedged.search(FLIGHTS)
+    assert provider.calls == 2
+
+
+def test_breaker_stops_calling_a_failing_provider():
+    now = [0.0]
+    provider = ScriptedProvider("fail", "fail", "fail")
+    breaking = CircuitBreakerProvider(provider, CircuitBreaker(failure_threshold=3, reset_timeout=10,
+                                                               clock=lambda: now[0]))
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            breaking.search(HOTELS)
+    with pytest.raises(CircuitOpenError):
+        breaking.search(HOTELS)
+    assert provider.calls == 3
+
+    now[0] = 10.0  # Half open: the trial reaches the provider, which has recovered
+    assert breaking.search(HOTELS)["properties"]
+    assert provider.calls == 4
+    assert breaking.breaker.stats()["state"] == "closed"
+
+
+def test_replay_serves_recordings(tmp_path):
+    recorder = RecordingProvider(SyntheticProvider(), str(tmp_path))
+    recorded = recorder.search(FLIGHTS)
+    replay = ReplayProvider(str(tmp_path))
+    assert replay.search(FLIGHTS) == recorded
+    other_day = dict(FLIGHTS, outbound_date="2024-06-01")
+    assert replay.search(other_day) == recorded  # Nearest recording for the engine
+    with pytest.raises(FileNotFoundError):
+        ReplayProvider(str(tmp_path), strict=True).search(other_day)
+    with pytest.raises(LookupError):
+        replay.search(HOTELS)
@@ -0,0 +1,44 @@
+import pytest
+
+from search_providers import SyntheticProvider, flight_search_params, hotel_search_params, project_results
+from search_records import FlightOption, HotelOption, decode_records, encode_records
+
+FLIGHTS = flight_search_params("ORD", "AUS", "2024-05-01", 2, 0)
+HOTELS = hotel_search_params("Austin", "2024-05-01", "2024-05-04", 2, 3)
+
+
+def test_flights_keep_the_first_leg():
+    raw = SyntheticProvider(num_flights=3).search(FLIGHTS)
+    records = project_results(FLIGHTS, raw)
+    leg = raw["best_flights"][0]["flights"][0]
+    assert records[0] == FlightOption(raw["best_flights"][0]["price"], leg["flight_number"],
+                                      leg["departure_airport"]["name"], leg["departure_airport"]["time"],
+                                      leg["arrival_airport"]["name"], leg["arrival_airport"]["time"],
+                                      raw["best_flights"][0]["total_duration"])
+
+
+def test_hotels_without_a_rating_are_dropped():
+    raw = SyntheticProvider(num_hotels=40).search(HOTELS)
+    records = project_results(HOTELS, raw)
+    assert len(records) == sum(1 for hotel in raw["properties"] if hotel["overall_rating"] is not None)
+    assert all(isinstance(record, HotelOption) and record.rating is not None for record in records)
+
+
+def test_error_responses_raise():
+    with pytest.raises(LookupError):
+        project_results(FLIGHTS, {"error": "Google hasn't returned any results"})
+
+
+@pytest.mark.parametrize("params", [FLIGHTS, HOTELS])
+def test_tokens_and_cache_rows_round_trip(params):
+    records = project_results(params, SyntheticProvider().search(params))
+    record_type = type(records[0])
+    assert [record_type.from_token(record.token()) for record in records] == records
+    assert decode_records(encode_records(records)) == records
+    assert decode_records(encode_records([])) == []
+
+
+def test_malformed_tokens():
+    for token in ("not json", "[1, 2]", '{"price": 1}', None):
+        with pytest.raises(ValueError):
+            FlightOption.from_token(token)
@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+
+import pytest
+from flask import Flask, Response, url_for
+from werkzeug.datastructures import Accept
+
+import static_assets
+from static_assets import IMMUTABLE, ResponseCompressor, StaticAssets, encodings
+
+CSS = b"body { color: #333; margin: 0 auto; }\n" * 100
+PAGE = "<p>" + "A long page of itinerary text. " * 100 + "</p>"
+
+
+def digest(body):
+    return hashlib.sha256(body).hexdigest()[:static_assets.HASH_LENGTH]
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    folder = tmp_path / "static"
+    (folder / "css").mkdir(parents=True)
+    (folder / "css" / "style.css").write_bytes(CSS)
+    (folder / "small.css").write_bytes(b"p { margin: 0; }")
+    (folder / "logo.png").write_bytes(b"\x89PNG" + bytes(range(256)) * 8)
+    return folder
+
+
+@pytest.fixture
+def assets(static_folder, tmp_path):
+    return StaticAssets(str(static_folder), str(tmp_path / "build"))
+
+
+@pytest.fixture
+def app(static_folder, assets):
+    app = Flask(__name__, static_folder=str(static_folder))
+    app.config.update(STATIC_FINGERPRINT=True, COMPRESS_RESPONSES=True)
+
+    @app.route("/page")
+    def page():
+        return PAGE
+
+    @app.route("/short")
+    def short():
+        return "<p>Short</p>"
+
+    @app.route("/tagged")
+    def tagged():
+        response = Response(PAGE, mimetype="text/html")
+        response.set_etag("v1")
+        return response
+
+    @app.route("/streamed")
+    def streamed():
+        return Response((PAGE for _ in range(2)), mimetype="text/html")
+
+    static_assets.init_app(app, assets, ResponseCompressor())
+    return app
+
+
+def test_urls_carry_the_content_hash(app):
+    with app.test_request_context():
+        assert url_for("static", filename="css/style.css") == f"/static/css/style.{digest(CSS)}.css"
+        assert url_for("static", filename="missing.css") == "/static/missing.css"
+
+
+def test_resolve(assets, static_folder):
+    current = f"css/style.{digest(CSS)}.css"
+    assets.build()
+    assert assets.resolve(current)[0] == "css/style.css"
+    assert assets.resolve(current)[2] is True
+    assert assets.resolve("css/style.css")[2] is False
+    stale_name, asset, immutable = assets.resolve("css/style.0123456789ab.css")  # From a page cached before a deploy
+    assert (stale_name, asset.digest, immutable) == ("css/style.css", digest(CSS), False)
+    assert assets.resolve("css/other.0123456789ab.css")[1] is None
+
+    changed = CSS + b"a { color: red; }\n"
+    (static_folder / "css" / "style.css").write_bytes(changed)
+    assert assets.url_name("css/style.css") == f"css/style.{digest(changed)}.css"
+    assert assets.resolve(current)[1:] == (assets.asset("css/style.css"), False)
+
+
+def test_only_worthwhile_variants_are_built(assets):
+    assets.build()
+    assert set(assets.asset("css/style.css").variants) == set(encodings())
+    assert assets.asset("small.css").variants == {}
+    assert assets.asset("logo.png").variants == {}
+
+
+def test_static_files_are_sent_precompressed_when_accepted(app):
+    client = app.test_client()
+    url = f"/static/css/style.{digest(CSS)}.css"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()) == CSS
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["Cache-Control"] == IMMUTABLE
+    response.close()
+
+    for accept in (None, "gzip;q=0", "deflate"):
+        response = client.get(url, headers={"Accept-Encoding": accept} if accept else {})
+        assert "Content-Encoding" not in response.headers
+        assert response.get_data() == CSS
+        assert response.headers["Vary"] == "Accept-Encoding"
+        response.close()
+
+    response = client.get("/static/css/style.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers.get("Cache-Control") != IMMUTABLE
+    response.close()
+
+    response = client.get("/static/logo.png", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+    response.close()
+
+    assert client.get("/static/nothing.css").status_code == 404
+
+
+def test_pages_are_compressed_for_clients_that_accept_it(app):
+    client = app.test_client()
+
+    response = client.get("/page", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.get_data()).decode() == PAGE
+
+    response = client.get("/page")
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"  # Caches must not give this copy to a gzip client either
+    assert response.get_data(as_text=True) == PAGE
+
+    response = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["ETag"] == 'W/"v1"'
+
+    for path in ("/short", "/streamed"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+        assert "Vary" not in response.headers
+
+
+def test_compressor_wants_only_large_finished_text_responses():
+    compressor = ResponseCompressor(min_size=100)
+    assert compressor.wants(Response(PAGE, mimetype="text/html"))
+    assert compressor.wants(Response("[" + "1, " * 50 + "1]", mimetype="application/json"))
+    assert not compressor.wants(Response(PAGE, status=404, mimetype="text/html"))
+    assert not compressor.wants(Response(b"\0" * 1000, mimetype="application/pdf"))
+    assert not compressor.wants(Response("tiny", mimetype="text/html"))
+    assert not compressor.wants(Response(PAGE, mimetype="text/html", headers={"Content-Encoding": "gzip"}))
+
+    response = compressor.apply(Response(PAGE, mimetype="text/html"), Accept([("br", 1), ("gzip", 0.5)]))
+    assert response.headers["Content-Encoding"] == encodings()[0]
+    assert compressor.stats()["responses"] == 1
+    assert compressor.stats()["bytes_out"] < compressor.stats()["bytes_in"] == len(PAGE)
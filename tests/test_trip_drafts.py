@@ -0,0 +1,40 @@
+import pytest
+from flask import Flask
+
+from models import db
+from trip_drafts import TripDraftStore
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'drafts.db'}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def test_workers_with_stale_caches_keep_each_others_picks(app):
+    # Two workers, each with its own cache of the draft
+    first, second = TripDraftStore(), TripDraftStore()
+    trip_id = first.create(None, arrival_city="Austin")
+    assert second.get(trip_id)["arrival_city"] == "Austin"
+
+    first.update(trip_id, departing_flight={"flight_number": "UA 1"})
+    second.update(trip_id, hotel={"name": "South Congress Hotel"})  # Its cached copy has no flight
+
+    trip = TripDraftStore().get(trip_id)
+    assert trip["departing_flight"] == {"flight_number": "UA 1"}
+    assert trip["hotel"] == {"name": "South Congress Hotel"}
+    assert first.update(trip_id, returning_flight={"flight_number": "UA 2"})["hotel"] == {"name": "South Congress Hotel"}
+
+
+def test_get_checks_the_owner(app):
+    store = TripDraftStore()
+    trip_id = store.create(7, arrival_city="Austin")
+    assert store.get(trip_id, 7)["arrival_city"] == "Austin"
+    assert store.get(trip_id, 8) is None
+    assert store.get("missing") is None
+    assert store.update("missing", hotel={}) is None
@@ -0,0 +1,140 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from search_records import FlightOption, HotelOption
+from trip_optimizer import TripOptimizer, best_hotels, pareto_front, skyline
+
+NIGHTS = 2
+TRAVELERS = 2
+
+
+def dominates(a, b):
+    # a is at least as good as b on every objective (all "higher is better") and better on one
+    return all(x >= y for x, y in zip(a, b)) and a != b
+
+
+def brute_skyline(lower_better, higher_better):
+    points = list(zip(-lower_better, higher_better))
+    return [i for i, point in enumerate(points)
+            if not any(dominates(other, point) for other in points) and point not in points[:i]]
+
+
+def brute_front(points):
+    return {point for point in points if not any(dominates(other, point) for other in points)}
+
+
+def flights(rng, count, day):
+    # Coarse prices and times, so ties are common; some options lack a price or a time
+    options = []
+    for i in range(count):
+        hour = rng.choice([6, 9, 12, 15, 18])
+        options.append(FlightOption(rng.choice([100, 150, 200, None]) if rng.random() < 0.9 else None, f"F{i}",
+                                    "A", f"{day} {hour:02d}:00", "B", f"{day} {hour + 2:02d}:00" if rng.random() < 0.95 else None, 120))
+    return options
+
+
+def hotels(rng, count):
+    return [HotelOption(f"H{i}", None, rng.choice([80, 120, 160, None]), rng.choice([3.5, 4.0, 4.5, None]), None, 3, None)
+            for i in range(count)]
+
+
+def brute_packages(outbound, returning, hotel_options, max_total=None):
+    # (-cost, rating, hours) of every valid combination, so that higher is better on all three
+    packages = []
+    for out, back, hotel in itertools.product(outbound, returning, hotel_options):
+        if None in (out.price, out.arrival_time, back.price, back.departure_time, hotel.nightly_rate, hotel.rating):
+            continue
+        hours = (np.datetime64(back.departure_time.replace(" ", "T")) - np.datetime64(out.arrival_time.replace(" ", "T"))) / np.timedelta64(1, "h")
+        cost = (out.price + back.price) * TRAVELERS + hotel.nightly_rate * NIGHTS
+        if hours > 0 and (max_total is None or cost <= max_total):
+            packages.append((-float(cost), float(hotel.rating), float(hours)))
+    return packages
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_skyline_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(1, 30))
+    lower, higher = rng.integers(0, 5, size).astype(float), rng.integers(0, 5, size).astype(float)
+    assert list(skyline(lower, higher)) == brute_skyline(lower, higher)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_pareto_front_matches_brute_force(seed, monkeypatch):
+    monkeypatch.setattr("trip_optimizer.BLOCK", 7)  # Several blocks even for small inputs
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(1, 40))
+    cost, rating, hours = (rng.integers(0, 4, size).astype(float) for _ in range(3))
+    points = list(zip(-cost, rating, hours))
+    expected = [i for i, point in enumerate(points) if not any(dominates(other, point) for other in points)]
+    assert list(pareto_front(cost, rating, hours)) == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_best_packages_are_the_brute_force_front(seed):
+    rng = random.Random(seed)
+    outbound = flights(rng, rng.randint(1, 6), "2024-05-01")
+    returning = flights(rng, rng.randint(1, 6), "2024-05-03")
+    hotel_options = hotels(rng, rng.randint(1, 6))
+    max_total = rng.choice([None, 800])
+
+    packages = TripOptimizer(outbound, returning, hotel_options, NIGHTS, TRAVELERS).best(1000, max_total=max_total)
+    # Packages equal on all three objectives may be cut to one, so fronts are compared by value
+    found = [(-package["total_cost"], package["rating"], package["hours_at_destination"]) for package in packages]
+    assert len(found) == len(set(found))
+    assert set(found) == brute_front(brute_packages(outbound, returning, hotel_options, max_total))
+    for package in packages:
+        assert package["total_cost"] == package["flight_cost"] + package["hotel_cost"]
+
+
+def test_best_ranks_by_budget():
+    outbound = [FlightOption(100, "F1", "A", "2024-05-01 06:00", "B", "2024-05-01 08:00", 120)]
+    returning = [FlightOption(100, "F2", "B", "2024-05-03 20:00", "A", "2024-05-03 22:00", 120)]
+    cheap, fancy = HotelOption("Cheap", None, 50, 3.0, None, 2, None), HotelOption("Fancy", None, 400, 5.0, None, 5, None)
+    optimizer = TripOptimizer(outbound, returning, [cheap, fancy], NIGHTS, TRAVELERS)
+    assert [package["hotel"] for package in optimizer.best(budget="low")] == [cheap, fancy]
+    assert [package["hotel"] for package in optimizer.best(budget="high")] == [fancy, cheap]
+    assert [package["hotel"] for package in optimizer.best(1, budget="high")] == [fancy]
+
+
+def test_single_option_and_missing_legs():
+    outbound = [FlightOption(100, "F1", "A", "2024-05-01 06:00", "B", "2024-05-01 08:00", 120)]
+    returning = [FlightOption(120, "F2", "B", "2024-05-03 20:00", "A", "2024-05-03 22:00", 120)]
+    hotel = HotelOption("Only", None, 90, 4.0, None, 3, None)
+
+    [package] = TripOptimizer(outbound, returning, [hotel], NIGHTS, TRAVELERS).best()
+    assert package["total_cost"] == 620
+    assert package["hours_at_destination"] == 60
+
+    assert TripOptimizer(outbound, returning, [], NIGHTS, TRAVELERS).best() == []
+    assert TripOptimizer([], returning, [hotel], NIGHTS, TRAVELERS).best() == []
+    assert TripOptimizer(outbound, returning, [hotel], NIGHTS, TRAVELERS).best(max_total=100) == []
+    # A return flight before the outbound lands leaves no package
+    early = [FlightOption(120, "F3", "B", "2024-05-01 07:00", "A", "2024-05-01 09:00", 120)]
+    assert TripOptimizer(outbound, early, [hotel], NIGHTS, TRAVELERS).best() == []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_best_hotels_are_the_brute_force_front(seed):
+    rng = random.Random(seed)
+    options = hotels(rng, rng.randint(1, 12))
+    found = best_hotels(options, 1000)
+    rated = [hotel for hotel in options if hotel.nightly_rate is not None and hotel.rating is not None]
+    expected = brute_front([(-hotel.nightly_rate, hotel.rating) for hotel in rated])
+    assert sorted((-hotel.nightly_rate, hotel.rating) for hotel in found) == sorted(expected)
+    # Of hotels with the same rate and rating, the first listed is kept
+    for hotel in found:
+        earlier = options[:options.index(hotel)]
+        assert (hotel.nightly_rate, hotel.rating) not in [(other.nightly_rate, other.rating) for other in earlier]
+
+
+def test_best_hotels_edge_cases():
+    assert best_hotels([]) == []
+    assert best_hotels([HotelOption("Unrated", None, 90, None, None, 3, None)]) == []
+    only = HotelOption("Only", None, 90, 4.0, None, 3, None)
+    assert best_hotels([only]) == [only]
+    twin = HotelOption("Twin", None, 90, 4.0, None, 3, None)
+    assert best_hotels([only, twin]) == [only]
@@ -0,0 +1,95 @@
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from models import db, TripDraft
+
+# Every field a draft can hold; the wizard fills them in step by step
+TRIP_FIELDS = (
+    "start_date", "end_date", "departure_city", "arrival_city", "departure_codes", "arrival_codes",
+    "num_adults", "num_children",
+    "flight_needed", "car_needed", "hotel_stars", "budget", "keywords",
+    "departing_flight", "returning_flight", "hotel",
+)
+
+
+def empty_trip():
+    trip = {field: None for field in TRIP_FIELDS}
+    trip.update(departure_codes=[], arrival_codes=[], departing_flight={}, returning_flight={}, hotel={}, keywords="")
+    return trip
+
+
+class TripDraftStore:
+    """Trip drafts persisted in the trip_drafts table, with a bounded
+    in-process cache of recently read drafts. All access needs an app
+    context.
+
+    Several workers may cache the same draft, so update() only writes over
+    the version it read (by updated_at); if another worker saved the draft
+    since, it reloads it and applies the fields to that."""
+
+    def __init__(self, cache_size=512):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # trip id -> (user id, trip dict, updated_at)
+        self._lock = threading.Lock()
+
+    def create(self, user_id, **fields):
+        trip = empty_trip()
+        trip.update(fields)
+        trip_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        db.session.add(TripDraft(trip_id, user_id, json.dumps(trip), now))
+        db.session.commit()
+        self._remember(trip_id, user_id, trip, now)
+        return trip_id
+
+    def get(self, trip_id, user_id=None):
+        # Returns a copy of the trip dict, or None if missing or owned by someone else
+        loaded = self._load(trip_id)
+        if loaded is None:
+            return None
+        owner, trip, _ = loaded
+        if user_id is not None and owner != user_id:
+            return None
+        return dict(trip)
+
+    def update(self, trip_id, **fields):
+        # One UPDATE per wizard step; the current fields usually come from the cache, and are reloaded if stale
+        loaded = self._load(trip_id)
+        while loaded is not None:
+            owner, trip, updated_at = loaded
+            trip = dict(trip, **fields)
+            now = max(datetime.utcnow(), updated_at + timedelta(microseconds=1))
+            changed = TripDraft.query.filter_by(id=trip_id, updated_at=updated_at).update(
+                {"data": json.dumps(trip), "updated_at": now})
+            db.session.commit()
+            if changed:
+                self._remember(trip_id, owner, trip, now)
+                return dict(trip)
+            loaded = self._load(trip_id, fresh=True)
+        return None
+
+    def _load(self, trip_id, fresh=False):
+        # (user id, trip dict, updated_at) from the cache, or from the database if fresh or not cached
+        if not trip_id:
+            return None
+        with self._lock:
+            cached = None if fresh else self._cache.get(trip_id)
+            if cached is not None:
+                self._cache.move_to_end(trip_id)
+                return cached
+        draft = db.session.query(TripDraft).populate_existing().get(trip_id)
+        if draft is None:
+            return None
+        loaded = (draft.user_id, json.loads(draft.data), draft.updated_at)
+        self._remember(trip_id, *loaded)
+        return loaded
+
+    def _remember(self, trip_id, user_id, trip, updated_at):
+        with self._lock:
+            self._cache[trip_id] = (user_id, trip, updated_at)
+            self._cache.move_to_end(trip_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
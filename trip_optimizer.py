@@ -0,0 +1,162 @@
+import numpy as np
+
+# How much each objective counts when ranking the Pareto front, by the trip's budget level
+BUDGET_WEIGHTS = {
+    "low": {"cost": 0.6, "rating": 0.2, "hours": 0.2},
+    "medium": {"cost": 0.4, "rating": 0.3, "hours": 0.3},
+    "high": {"cost": 0.2, "rating": 0.5, "hours": 0.3},
+}
+DEFAULT_BUDGET = "medium"
+
+# Candidate packages compared at once in the final dominance check; bounds its memory to BLOCK x candidates
+BLOCK = 512
+
+
+def flight_times(flights, field):
+    # Minutes since the epoch for each flight's departure_time/arrival_time ("YYYY-MM-DD HH:MM"); NaN if missing
+    times = np.array([str(getattr(flight, field) or "NaT").replace(" ", "T") for flight in flights], dtype="datetime64[m]")
+    minutes = times.astype("int64").astype(float)
+    minutes[np.isnat(times)] = np.nan
+    return minutes
+
+
+def skyline(lower_better, higher_better):
+    """Indices of the points no other point beats on both values: lower
+    lower_better and higher higher_better. Ties keep the first point."""
+    order = np.lexsort((-higher_better, lower_better))
+    best_before = np.maximum.accumulate(higher_better[order])
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = higher_better[order][1:] > best_before[:-1]
+    return np.sort(order[keep])
+
+
+def pareto_front(cost, rating, hours):
+    """Indices of the packages not dominated on (lower cost, higher rating,
+    more hours): nothing else is at least as good on all three and better
+    on one. Identical packages all stay."""
+    front = []
+    for start in range(0, len(cost), BLOCK):
+        block = slice(start, start + BLOCK)
+        no_worse = ((cost[np.newaxis, :] <= cost[block, np.newaxis])
+                    & (rating[np.newaxis, :] >= rating[block, np.newaxis])
+                    & (hours[np.newaxis, :] >= hours[block, np.newaxis]))
+        better = ((cost[np.newaxis, :] < cost[block, np.newaxis])
+                  | (rating[np.newaxis, :] > rating[block, np.newaxis])
+                  | (hours[np.newaxis, :] > hours[block, np.newaxis]))
+        dominated = (no_worse & better).any(axis=1)
+        front.extend(start + np.flatnonzero(~dominated))
+    return np.array(front, dtype=int)
+
+
+class TripOptimizer:
+    """Outbound flight x return flight x hotel packages for a trip, compared
+    on total cost, hotel rating and hours at the destination (from the
+    outbound arrival to the return departure).
+
+    Flight prices are per traveler, as in the itinerary prompt; hotel rates
+    are per night. Options missing a price, rating or time are skipped.
+    Before any combination is formed, each leg is pruned to the options
+    that could appear in a Pareto-optimal package (for the outbound leg,
+    no cheaper flight arrives earlier), and the flight pairs to those no
+    cheaper pair beats on hours, so hundreds of options per leg shrink to
+    a few hundred candidate packages."""
+
+    def __init__(self, outbound, returning, hotels, nights, travelers):
+        self.nights = max(nights, 1)
+        self.travelers = max(travelers, 1)
+
+        out_price = np.array([flight.price if flight.price is not None else np.nan for flight in outbound], dtype=float)
+        out_arrival = flight_times(outbound, "arrival_time")
+        ok = ~np.isnan(out_price) & ~np.isnan(out_arrival)
+        self.outbound = [flight for flight, keep in zip(outbound, ok) if keep]
+        self.out_price, self.out_arrival = out_price[ok], out_arrival[ok]
+
+        ret_price = np.array([flight.price if flight.price is not None else np.nan for flight in returning], dtype=float)
+        ret_departure = flight_times(returning, "departure_time")
+        ok = ~np.isnan(ret_price) & ~np.isnan(ret_departure)
+        self.returning = [flight for flight, keep in zip(returning, ok) if keep]
+        self.ret_price, self.ret_departure = ret_price[ok], ret_departure[ok]
+
+        rate = np.array([hotel.nightly_rate if hotel.nightly_rate is not None else np.nan for hotel in hotels], dtype=float)
+        rating = np.array([hotel.rating if hotel.rating is not None else np.nan for hotel in hotels], dtype=float)
+        ok = ~np.isnan(rate) & ~np.isnan(rating)
+        self.hotels = [hotel for hotel, keep in zip(hotels, ok) if keep]
+        self.hotel_rate, self.hotel_rating = rate[ok], rating[ok]
+
+    def candidates(self, max_total=None):
+        """Arrays (outbound index, return index, hotel index, cost, rating,
+        hours) for every package that survives pruning and fits max_total."""
+        empty = tuple(np.empty(0, dtype=int) for _ in range(3)) + tuple(np.empty(0) for _ in range(3))
+        if not (self.outbound and self.returning and self.hotels):
+            return empty
+
+        # Per-leg pruning: cheaper and earlier arrivals, cheaper and later departures, cheaper and better rated
+        outs = skyline(self.out_price, -self.out_arrival)
+        rets = skyline(self.ret_price, self.ret_departure)
+        hotels = skyline(self.hotel_rate, self.hotel_rating)
+
+        # Flight pairs where the return leaves after the outbound lands, pruned on (fare, hours)
+        fare = (self.out_price[outs, np.newaxis] + self.ret_price[np.newaxis, rets]) * self.travelers
+        hours = (self.ret_departure[np.newaxis, rets] - self.out_arrival[outs, np.newaxis]) / 60
+        pair_out, pair_ret = np.nonzero(hours > 0)
+        pair_fare, pair_hours = fare[pair_out, pair_ret], hours[pair_out, pair_ret]
+        pairs = skyline(pair_fare, pair_hours)
+        pair_out, pair_ret, pair_fare, pair_hours = pair_out[pairs], pair_ret[pairs], pair_fare[pairs], pair_hours[pairs]
+
+        # Every remaining pair with every remaining hotel
+        cost = pair_fare[:, np.newaxis] + self.hotel_rate[np.newaxis, hotels] * self.nights
+        package_pair, package_hotel = np.nonzero(np.isfinite(cost) if max_total is None else cost <= max_total)
+        return (outs[pair_out[package_pair]], rets[pair_ret[package_pair]], hotels[package_hotel],
+                cost[package_pair, package_hotel], self.hotel_rating[hotels[package_hotel]],
+                pair_hours[package_pair])
+
+    def best(self, count=5, budget=None, max_total=None):
+        """Up to count Pareto-optimal packages, best first for the budget
+        level ("low", "medium" or "high"). Each is a dict with the three
+        records, the cost split and the rating and hours compared."""
+        out_idx, ret_idx, hotel_idx, cost, rating, hours = self.candidates(max_total)
+        if not len(cost):
+            return []
+        front = pareto_front(cost, rating, hours)
+
+        # Rank the front by budget level, each objective scored against the best on offer (ratings out of 5)
+        weights = BUDGET_WEIGHTS.get(budget, BUDGET_WEIGHTS[DEFAULT_BUDGET])
+        cost, rating, hours = cost[front], rating[front], hours[front]
+        score = (weights["cost"] * max(cost.min(), 1) / np.maximum(cost, 1) + weights["rating"] * rating / 5
+                 + weights["hours"] * hours / hours.max())
+        ranked = np.argsort(-score, kind="stable")[:count]
+
+        packages = []
+        for rank in ranked:
+            i = front[rank]
+            outbound, returning, hotel = self.outbound[out_idx[i]], self.returning[ret_idx[i]], self.hotels[hotel_idx[i]]
+            flight_cost = (outbound.price + returning.price) * self.travelers
+            packages.append({
+                "outbound": outbound,
+                "returning": returning,
+                "hotel": hotel,
+                "total_cost": round(float(cost[rank]), 2),
+                "flight_cost": round(float(flight_cost), 2),
+                "hotel_cost": round(float(hotel.nightly_rate * self.nights), 2),
+                "rating": float(rating[rank]),
+                "hours_at_destination": round(float(hours[rank]), 1),
+            })
+        return packages
+
+
+
+def best_hotels(hotels, count=5, budget=None):
+    """Up to count hotels no cheaper hotel out-rates, best first for the
+    budget level, for trips without flights. Scored like TripOptimizer.best
+    on nightly rate and rating alone."""
+    rate = np.array([hotel.nightly_rate if hotel.nightly_rate is not None else np.nan for hotel in hotels], dtype=float)
+    rating = np.array([hotel.rating if hotel.rating is not None else np.nan for hotel in hotels], dtype=float)
+    ok = np.flatnonzero(~np.isnan(rate) & ~np.isnan(rating))
+    if not len(ok):
+        return []
+    front = ok[skyline(rate[ok], rating[ok])]
+
+    weights = BUDGET_WEIGHTS.get(budget, BUDGET_WEIGHTS[DEFAULT_BUDGET])
+    rate, rating = rate[front], rating[front]
+    score = weights["cost"] * max(rate.min(), 1) / np.maximum(rate, 1) + weights["rating"] * rating / 5
+    return [hotels[front[rank]] for rank in np.argsort(-score, kind="stable")[:count]]